@@ -0,0 +1,113 @@
+"""
+Массовые операции над задачами: прежний путь (по запросу на задачу — add_task / close_task /
+delete_task в цикле, выборка по id через IN (?, ?, ...)) против текущего (add_tasks одним
+executemany, close_tasks / delete_tasks и get_tasks_by_ids одним запросом со списком id через json_each).
+
+Для каждого размера пачки выводятся время операции, число запросов к базе
+и коммитов. Пачки больше --max-per-row по задаче не прогоняются (каждая запись ждёт свой коммит),
+выборка — для всех: IN (?, ...) упирается в лимит параметров SQLite (SQLITE_MAX_VARIABLE_NUMBER,
+зависит от сборки: 32766 по умолчанию, 999 в старых; выводится перед таблицей), json_each — нет.
+
+    python benchmarks/bench_bulk.py [--sizes 10 100 1000 40000] [--max-per-row 1000] [--commit-delay-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import common
+from db import DB
+
+
+class LegacyDB(DB):
+    """Выборка по списку id через IN с параметром на каждый id — как до json_each."""
+
+    async def get_tasks_by_ids(self, tg_id: int, ids: list[int]):
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        return await self._fetchall(
+            "SELECT id, title, description, category, status, created_at FROM tasks "
+            f"WHERE user_telegram_id=? AND id IN ({marks})",
+            (tg_id, *ids)
+        )
+
+
+async def per_row(db: DB, op: str, user_id: int, ids: list[int]):
+    if op == "add":
+        for i in range(len(ids)):
+            await db.add_task(user_id, f"задача {i}", "development")
+    elif op == "close":
+        for task_id in ids:
+            await db.close_task(task_id, user_id)
+    elif op == "delete":
+        for task_id in ids:
+            await db.delete_task(task_id, user_id)
+    else:
+        await db.get_tasks_by_ids(user_id, ids)
+
+
+async def bulk(db: DB, op: str, user_id: int, ids: list[int]):
+    if op == "add":
+        await db.add_tasks(user_id, "development", [(f"задача {i}", "") for i in range(len(ids))])
+    elif op == "close":
+        await db.close_tasks(user_id, ids=ids)
+    elif op == "delete":
+        await db.delete_tasks(user_id, ids=ids)
+    else:
+        await db.get_tasks_by_ids(user_id, ids)
+
+
+async def measure(db: DB, run, op: str, user_id: int, size: int) -> dict:
+    if op != "add":
+        await db.add_tasks(user_id, "development", [(f"задача {i}", "") for i in range(size)])
+    ids = sorted(await db.get_task_ids(user_id)) if op != "add" else list(range(size))
+    with common.count_sql(db) as counts:
+        started = time.perf_counter()
+        try:
+            await run(db, op, user_id, ids)
+            elapsed = f"{(time.perf_counter() - started) * 1000:.1f}"
+        except sqlite3.OperationalError as e:
+            elapsed = f"error: {e}"
+    # BEGIN / SAVEPOINT / RELEASE — служебные запросы транзакции, их число не зависит от пути
+    queries = sum(n for kind, n in counts.items() if kind not in ("BEGIN", "SAVEPOINT", "RELEASE", "COMMIT"))
+    return {"ms": elapsed, "queries": queries, "commits": counts["COMMIT"]}
+
+
+async def run(sizes: list[int], max_per_row: int, commit_delay: float) -> list[dict]:
+    results = []
+    for path, db_class, run_op in (("per row / IN (?, ...)", LegacyDB, per_row), ("bulk / json_each", DB, bulk)):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = db_class(os.path.join(tmp, "tasks.db"), commit_delay=commit_delay)
+            await db.init()
+            try:
+                user_id = 0
+                for size in sizes:
+                    for op in ("add", "fetch", "close", "delete"):
+                        if run_op is per_row and op != "fetch" and size > max_per_row:
+                            continue
+                        user_id += 1
+                        results.append({
+                            "op": op, "tasks": size, "path": path,
+                            **await measure(db, run_op, op, user_id, size),
+                        })
+            finally:
+                await db.close()
+    results.sort(key=lambda r: (r["op"], r["tasks"]))
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 40000])
+    parser.add_argument("--max-per-row", type=int, default=1000)
+    parser.add_argument("--commit-delay-ms", type=float, default=5)
+    args = parser.parse_args()
+    print("SQLITE_MAX_VARIABLE_NUMBER:", sqlite3.connect(":memory:").getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER))
+    common.print_table(await run(args.sizes, args.max_per_row, args.commit_delay_ms / 1000))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+Конкурентные записи через group commit: --users пользователей одновременно добавляют, закрывают
+и удаляют задачи и читают список. Сравниваются три конфигурации:
+
+  single    — исходный DB: одно соединение для чтения и записи, журнал по умолчанию (DELETE),
+              коммит после каждой операции;
+  legacy    — WAL, пул читателей и group commit, но запросы прямо в общую транзакцию (коммит
+              по таймеру может попасть между запросами одной операции);
+  savepoint — текущий DB (_write: write lock и SAVEPOINT на операцию).
+
+Выводит операций в секунду и задержку операции p50 / p99.
+
+    python benchmarks/bench_db_concurrency.py [--users 1000] [--ops 5] [--commit-delay-ms 5]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import random
+import tempfile
+import time
+
+import aiosqlite
+
+import common
+from db import DB
+
+
+class SingleConnectionDB(DB):
+    """Исходная конфигурация: одно соединение без WAL, чтения на нём же, коммит на каждую запись."""
+
+    async def _connect(self, readonly: bool = False):
+        conn = await aiosqlite.connect(self.path)
+        await conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    async def init(self):
+        self.readers = 0
+        await super().init()
+
+    @contextlib.asynccontextmanager
+    async def _reader(self):
+        yield self.conn
+
+    @contextlib.asynccontextmanager
+    async def _write(self, savepoint: bool = True):
+        yield self.conn
+        await self.conn.commit()
+
+
+class LegacyDB(DB):
+    """Записи без write lock и SAVEPOINT — как до атомарных операций."""
+
+    @contextlib.asynccontextmanager
+    async def _write(self, savepoint: bool = True):
+        yield self.conn
+        await self._commit()
+
+
+async def user_session(db: DB, user_id: int, ops: int, rng: random.Random, latencies: list):
+    async def timed(coro):
+        started = time.perf_counter()
+        result = await coro
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    await timed(db.ensure_user(user_id, f"user{user_id}"))
+    for i in range(ops):
+        await timed(db.add_task(user_id, f"задача {i}", rng.choice(["development", "testing", "other"])))
+        rows = await timed(db.list_tasks(user_id, 10))
+        if rows and rng.random() < 0.3:
+            await timed(db.close_task(rows[0][0], user_id))
+        if rows and rng.random() < 0.1:
+            await timed(db.delete_task(rows[-1][0], user_id))
+
+
+async def run(db_class, users: int, ops: int, commit_delay: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db = db_class(os.path.join(tmp, "tasks.db"), commit_delay=commit_delay)
+        await db.init()
+        try:
+            latencies: list[float] = []
+            rng = random.Random(seed)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                user_session(db, user_id, ops, random.Random(rng.random()), latencies)
+                for user_id in range(1, users + 1)
+            ))
+            elapsed = time.perf_counter() - started
+            mismatches = await db.check_stats()
+        finally:
+            await db.close()
+    summary = common.latency_summary(latencies)
+    return {
+        "writes": CONFIGS[db_class],
+        "users": users,
+        "ops": len(latencies),
+        "ops_per_s": round(len(latencies) / elapsed),
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+        "stats_mismatches": len(mismatches),
+    }
+
+
+CONFIGS = {SingleConnectionDB: "single", LegacyDB: "legacy", DB: "savepoint"}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--ops", type=int, default=5, help="добавлений задач на пользователя")
+    parser.add_argument("--commit-delay-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    common.print_table([
+        await run(db_class, args.users, args.ops, args.commit_delay_ms / 1000, args.seed)
+        for db_class in CONFIGS
+    ])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Нагрузочный прогон очереди экспорта: тысячи заданий через ExportQueue поверх SQLite
+с заглушкой вместо экспорта (блокирующая пауза --work-ms в пуле экспорта, как запись в Sheets).
+
+Выводит пропускную способность (заданий в секунду) и задержку в очереди — от submit
+до начала выполнения задания — для нескольких значений EXPORT_WORKERS.
+
+    python benchmarks/bench_export_queue.py [--jobs 2000] [--workers 1 2 4 8] [--work-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import common
+from db import DB
+from export_queue import ExportQueue
+
+
+async def run_load(db: DB, jobs: int, concurrency: int, work: float, duplicates: int = 0) -> dict:
+    """
+    Ставит jobs заданий разных пользователей одновременно (и duplicates повторных нажатий тех же
+    пользователей, которые сливаются с ещё не начатым заданием) и ждёт, пока все выполнятся.
+    """
+    submitted: dict[int, float] = {}
+    waits: list[float] = []
+    runs: dict[int, int] = {}
+    done = asyncio.Event()
+
+    async def handler(user_id: int, username: str):
+        waits.append(time.perf_counter() - submitted[user_id])
+        if work:
+            await queue.run_blocking(time.sleep, work)
+        runs[user_id] = runs.get(user_id, 0) + 1
+        if len(runs) == jobs:
+            done.set()
+
+    queue = ExportQueue(db, handler, concurrency=concurrency, poll_interval=1.0)
+    await queue.start()
+    started = time.perf_counter()
+    for user_id in range(1, jobs + 1):
+        submitted[user_id] = started
+    # все пользователи нажимают «Экспорт» разом, первые duplicates — дважды
+    created = await asyncio.gather(*(
+        queue.submit(user_id, f"user{user_id}")
+        for user_id in [*range(1, jobs + 1), *range(1, duplicates + 1)]
+    ))
+    merged = created.count(False)
+    enqueued = time.perf_counter() - started
+    await done.wait()
+    elapsed = time.perf_counter() - started
+    await queue.stop()
+    return {
+        "jobs": jobs,
+        "workers": concurrency,
+        "merged": merged,
+        "enqueue_per_s": round(jobs / enqueued),
+        "jobs_per_s": round(jobs / elapsed),
+        "max_runs_per_user": max(runs.values()),
+        **{f"wait_{k}": v for k, v in common.latency_summary(waits).items() if k != "mean_ms"},
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--work-ms", type=float, default=5)
+    parser.add_argument("--commit-delay", type=float, default=0.005)
+    args = parser.parse_args()
+
+    results = []
+    for concurrency in args.workers:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = DB(os.path.join(tmp, "tasks.db"), commit_delay=args.commit_delay)
+            await db.init()
+            try:
+                results.append(await run_load(db, args.jobs, concurrency, args.work_ms / 1000, args.jobs // 10))
+            finally:
+                await db.close()
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,190 @@
+"""
+Память экспорта файлом (EXPORT_BACKEND=csv / xlsx) на --tasks задачах одного пользователя:
+потоковая запись export_tasks_to_file (порции по --chunk строк из курсора сразу дописываются
+в файл) против записи списком (get_all_tasks_for_user, все строки в памяти, одна запись в файл).
+
+Каждый путь выполняется в отдельном процессе, иначе пиковый RSS (ru_maxrss) первого прогона
+остался бы у всех следующих. Выводит RSS процесса до экспорта, пиковый RSS, прирост, время
+и размер файла. В RSS входят и страницы файла базы, прочитанные через mmap (PRAGMA mmap_size,
+до 256 МБ) — это кэш ОС, а не память процесса; поэтому отдельно выводится пик анонимной памяти
+(RssAnon из /proc/self/status, опрашивается фоновым потоком; только Linux).
+
+    python benchmarks/bench_file_export.py [--tasks 1000000] [--formats csv xlsx] [--chunk 1000] [--db /tmp/bench_export.db]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from db import DB
+from file_export import WRITERS, export_tasks_to_file
+from google_sheets import task_to_row
+
+USER = 1
+DATE_FORMAT = "%d.%m.%Y"
+INSERT = (
+    "INSERT INTO tasks (user_telegram_id, title, title_norm, description, category, status, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+async def populate(path: str, tasks: int):
+    db = DB(path)
+    await db.init()  # схема и миграции
+    await db.close()
+    now = int(time.time())
+    conn = sqlite3.connect(path)
+    started = time.perf_counter()
+    with conn:
+        conn.executemany(INSERT, (
+            (USER, f"задача номер {i}", f"задача номер {i}", f"описание задачи {i} " * 3, "development",
+             "done" if i % 3 else "open", now - i, now - i)
+            for i in range(tasks)
+        ))
+    conn.close()
+    print(f"{tasks} задач, заполнение {time.perf_counter() - started:.1f} с")
+
+
+async def list_based(db: DB, run_blocking, fmt: str, chunk: int) -> dict:
+    tasks = await db.get_all_tasks_for_user(USER)
+    rows = [task_to_row(t, DATE_FORMAT) for t in tasks]
+    fd, path = tempfile.mkstemp(suffix=WRITERS[fmt].suffix)
+    os.close(fd)
+
+    def write():
+        writer = WRITERS[fmt](path)
+        writer.write_rows(rows)
+        writer.close()
+
+    await run_blocking(write)
+    return {"path": path, "rows": len(rows)}
+
+
+async def streaming(db: DB, run_blocking, fmt: str, chunk: int) -> dict:
+    return await export_tasks_to_file(db, run_blocking, USER, fmt, chunk, DATE_FORMAT)
+
+
+PATHS = {"list": list_based, "streaming": streaming}
+
+
+class AnonPeak:
+    """Пик RssAnon процесса, пока открыт блок; None, если /proc недоступен."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak_mb = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def current_mb():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("RssAnon:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+        return None
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+
+    def __enter__(self):
+        self.peak_mb = self.current_mb()
+        if self.peak_mb is not None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.peak_mb is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak_mb = max(self.peak_mb, self.current_mb())
+
+
+async def child(db_path: str, path_name: str, fmt: str, chunk: int):
+    """Один прогон в этом процессе; результат — строка JSON в stdout."""
+    db = DB(db_path)
+    await db.init()
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    async def run_blocking(func, *args):
+        return await loop.run_in_executor(executor, func, *args)
+
+    try:
+        rss_before = common.peak_rss_mb()
+        anon_before = AnonPeak.current_mb()
+        started = time.perf_counter()
+        with AnonPeak() as anon:
+            result = await PATHS[path_name](db, run_blocking, fmt, chunk)
+        elapsed = time.perf_counter() - started
+        peak = common.peak_rss_mb()
+        size = os.path.getsize(result["path"])
+        os.remove(result["path"])
+    finally:
+        executor.shutdown()
+        await db.close()
+    print(json.dumps({
+        "format": fmt,
+        "path": path_name,
+        "rows": result["rows"],
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(peak, 1),
+        "growth_mb": round(peak - rss_before, 1),
+        "anon_growth_mb": round(anon.peak_mb - anon_before, 1) if anon.peak_mb is not None else "-",
+        "seconds": round(elapsed, 2),
+        "file_mb": round(size / 2**20, 1),
+    }))
+
+
+def run_child(db_path: str, path_name: str, fmt: str, chunk: int) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", path_name, "--formats", fmt,
+         "--chunk", str(chunk), "--db", db_path],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--formats", nargs="+", default=["csv", "xlsx"], choices=list(WRITERS))
+    parser.add_argument("--chunk", type=int, default=1000, help="EXPORT_FILE_CHUNK_ROWS")
+    parser.add_argument("--db", help="база для повторных прогонов; создаётся и заполняется, если её нет")
+    parser.add_argument("--child", choices=list(PATHS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        await child(args.db, args.child, args.formats[0], args.chunk)
+        return
+
+    tmp = None
+    path = args.db
+    if path is None:
+        tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp.name, "export.db")
+    try:
+        if not os.path.exists(path):
+            await populate(path, args.tasks)
+        common.print_table([
+            run_child(path, path_name, fmt, args.chunk) for fmt in args.formats for path_name in PATHS
+        ])
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+FSM-хранилища на --dialogs диалогах: MemoryStorage aiogram (как было до SQLiteStorage) против
+SQLiteStorage (кэш на --cache-size диалогов с отложенной записью в базу).
+
+Каждый диалог проходит шаги добавления задачи: set_state, update_data с названием, get_state,
+set_state, get_data — и остаётся незавершённым. Затем --revisits случайных диалогов
+возвращаются и завершаются (get_state, get_data, reset_state): у SQLiteStorage большинство
+из них уже вытеснены из кэша и читаются из базы.
+
+Каждое хранилище — в отдельном процессе, чтобы пиковый RSS одного прогона не достался другому.
+Выводит задержку каждой операции p50 / p95 / p99 и память: прирост RssAnon (только Linux), пока
+открыты все диалоги, и пиковый RSS процесса.
+
+    python benchmarks/bench_fsm_storage.py [--dialogs 100000] [--revisits 20000] [--cache-size 10000]
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from bench_file_export import AnonPeak
+from db import DB
+from fsm_storage import SQLiteStorage
+
+STORAGES = ("memory", "sqlite")
+
+
+async def dialogs(storage, count: int, revisits: int, timings: dict):
+    async def timed(op: str, coro):
+        started = time.perf_counter()
+        result = await coro
+        timings[op].append(time.perf_counter() - started)
+        return result
+
+    for user in range(1, count + 1):
+        await timed("set_state", storage.set_state(chat=user, user=user, state="AddTaskStates:waiting_for_title"))
+        await timed("update_data", storage.update_data(chat=user, user=user, data={"title": f"Задача пользователя {user}"}))
+        await timed("get_state", storage.get_state(chat=user, user=user))
+        await timed("set_state", storage.set_state(chat=user, user=user, state="AddTaskStates:waiting_for_category"))
+        await timed("get_data", storage.get_data(chat=user, user=user))
+
+    anon_open = AnonPeak.current_mb()
+    rng = random.Random(1)
+    for user in rng.sample(range(1, count + 1), min(revisits, count)):
+        await timed("get_state", storage.get_state(chat=user, user=user))
+        await timed("get_data", storage.get_data(chat=user, user=user))
+        await timed("reset_state", storage.reset_state(chat=user, user=user, with_data=True))
+    return anon_open
+
+
+async def child(kind: str, count: int, revisits: int, cache_size: int):
+    """Один прогон в этом процессе; результат — строка JSON в stdout."""
+    timings = collections.defaultdict(list)
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DB(os.path.join(tmp, "tasks.db"))
+        await db.init()
+        try:
+            if kind == "memory":
+                storage = MemoryStorage()
+            else:
+                storage = SQLiteStorage(db, cache_size=cache_size)
+                storage.start()
+            anon_before = AnonPeak.current_mb()
+            started = time.perf_counter()
+            anon_open = await dialogs(storage, count, revisits, timings)
+            elapsed = time.perf_counter() - started
+            await storage.close()
+            await storage.wait_closed()
+            rows = (await db._fetchone("SELECT COUNT(*) FROM fsm_states"))[0] if kind == "sqlite" else "-"
+        finally:
+            await db.close()
+    print(json.dumps({
+        "storage": kind,
+        "seconds": round(elapsed, 2),
+        "open_dialogs_anon_mb": round(anon_open - anon_before, 1) if anon_open is not None else "-",
+        "peak_rss_mb": round(common.peak_rss_mb(), 1),
+        "rows_in_db": rows,
+        "ops": {op: {"calls": len(values), **common.latency_summary(values)} for op, values in timings.items()},
+    }))
+
+
+def run_child(kind: str, args) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", kind, "--dialogs", str(args.dialogs),
+         "--revisits", str(args.revisits), "--cache-size", str(args.cache_size)],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dialogs", type=int, default=100_000)
+    parser.add_argument("--revisits", type=int, default=20_000, help="сколько диалогов вернуть и завершить")
+    parser.add_argument("--cache-size", type=int, default=10_000, help="FSM_CACHE_SIZE для SQLiteStorage")
+    parser.add_argument("--storages", nargs="+", default=list(STORAGES), choices=STORAGES)
+    parser.add_argument("--child", choices=STORAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args.child, args.dialogs, args.revisits, args.cache_size))
+        return
+
+    results = [run_child(kind, args) for kind in args.storages]
+    print(f"{args.dialogs} диалогов, {args.revisits} возвратов, кэш SQLiteStorage {args.cache_size}")
+    common.print_table([{k: v for k, v in r.items() if k != "ops"} for r in results])
+    print()
+    common.print_table([
+        {"storage": r["storage"], "op": op, **{k: v for k, v in s.items() if k != "mean_ms"}}
+        for r in results for op, s in sorted(r["ops"].items())
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Fuzzy-ранжирование: process.extract по словарю заголовков (как было до ранжирования по индексу
+строки) против find_similar_titles (cdist пачками по BATCH_SIZE) на 1k..1M заголовков,
+в один поток и с SEARCH_WORKERS потоками. Строка cached — повторный поиск по TitleIndex из кэша
+DB.search_tasks: заголовки уже нормализованы, остаётся только cdist.
+
+    python benchmarks/bench_fuzzy.py [--sizes 1000 10000 100000 1000000] [--workers 1 -1]
+"""
+import argparse
+import os
+import random
+import time
+
+import common
+from rapidfuzz import fuzz, process
+
+from search import TitleIndex, find_similar_titles
+
+WORDS = "отчёт план релиз сервер клиент оплата встреча договор макет тест баг бюджет дизайн миграция кэш".split()
+
+
+def extract_by_title(query: str, rows: list, limit: int = 5, score_cutoff: int = 60):
+    """Прежняя реализация: одинаковые заголовки схлопывались в словаре."""
+    titles = [r[1] for r in rows]
+    mapping = {r[1]: r for r in rows}
+    results = process.extract(query, titles, scorer=fuzz.WRatio, limit=limit)
+    return [(mapping[r[0]], r[1]) for r in results if r[1] >= score_cutoff]
+
+
+def best_of(runs: int, func) -> float:
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, -1])
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    print(f"CPU: {os.cpu_count()}")
+    results = []
+    for n in args.sizes:
+        rows = [
+            (i, " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))), "", "other", "open", 0)
+            for i in range(n)
+        ]
+        query = rows[n // 2][1][:-1]
+        runs = 3 if n <= 100_000 else 1
+        results.append({"titles": n, "path": "extract", "ms": round(best_of(runs, lambda: extract_by_title(query, rows)) * 1000, 1)})
+        for workers in args.workers:
+            elapsed = best_of(runs, lambda: find_similar_titles(query, rows, workers=workers))
+            results.append({"titles": n, "path": f"cdist workers={workers}", "ms": round(elapsed * 1000, 1)})
+        index = TitleIndex(rows)
+        index.titles  # нормализуется один раз, при первом поиске после сброса кэша
+        elapsed = best_of(runs, lambda: find_similar_titles(query, index))
+        results.append({"titles": n, "path": "cdist cached", "ms": round(elapsed * 1000, 1)})
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    main()
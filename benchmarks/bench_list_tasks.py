@@ -0,0 +1,101 @@
+"""
+«📋 Мои задачи»: прежний вывод (все задачи, по сообщению с кнопками на каждую) против
+одной страницы render_tasks_page с инлайн-навигацией.
+
+Для каждого размера списка выводится время чтения из БД и сборки сообщений (реальное),
+число вызовов sendMessage и через сколько секунд пользователь получит последнее сообщение
+при лимите Telegram ~1 сообщение/с в чат (SendScheduler на виртуальных часах, --latency-ms на вызов API).
+
+    python benchmarks/bench_list_tasks.py [--sizes 10 100 1000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import common
+import virtual_time
+
+common.bot_env(os.path.join(tempfile.mkdtemp(), "tasks.db"))
+
+import bot  # noqa: E402
+from aiogram import types  # noqa: E402
+from sender import SendScheduler  # noqa: E402
+
+
+async def old_messages(user_id: int) -> list:
+    """Прежний list_tasks: все задачи пользователя, по сообщению с кнопками на каждую."""
+    messages = []
+    for task_id, title, desc, category, status, created in await bot.db.get_all_tasks_for_user(user_id):
+        text = (
+            f"#{task_id} — {title}\nКатегория: {bot.CATEGORY_RU.get(category, category)}\n"
+            f"Статус: {'Готово' if status == 'done' else 'Открыто'}\n{desc or ''}"
+        )
+        kb = types.InlineKeyboardMarkup()
+        if status != "done":
+            kb.add(types.InlineKeyboardButton("✅ Закрыть", callback_data=f"close_{task_id}"))
+        kb.add(types.InlineKeyboardButton("❌ Удалить", callback_data=f"delete_{task_id}"))
+        messages.append((text, kb))
+    return messages
+
+
+async def new_messages(user_id: int) -> list:
+    return [await bot.render_tasks_page(user_id)]
+
+
+def delivery_seconds(messages: list, latency: float) -> float:
+    """Когда уйдёт последнее сообщение в один чат через SendScheduler с лимитами по умолчанию."""
+    async def scenario():
+        loop = asyncio.get_running_loop()
+
+        async def send(chat_id, text, **kwargs):
+            await asyncio.sleep(latency)
+
+        scheduler = SendScheduler(
+            send, global_rate=bot.TG_GLOBAL_RATE, chat_rate=bot.TG_CHAT_RATE, chat_burst=bot.TG_CHAT_BURST,
+            clock=loop.time,
+        )
+        await asyncio.gather(*(scheduler.submit(1, text, reply_markup=kb) for text, kb in messages))
+        await scheduler.stop(0)
+        return loop.time()
+
+    return virtual_time.run(scenario())
+
+
+async def build_all(sizes: list[int]) -> list:
+    """[(tasks, path, секунд на сборку, сообщения)]."""
+    await bot.db.init()
+    built = []
+    try:
+        for user_id, size in enumerate(sizes, start=1):
+            await bot.db.add_tasks(user_id, "development", [(f"Задача {i}", f"описание {i}") for i in range(size)])
+            for name, build in (("message per task", old_messages), ("paginated", new_messages)):
+                started = time.perf_counter()
+                messages = await build(user_id)
+                built.append((size, name, time.perf_counter() - started, messages))
+    finally:
+        await bot.db.close()
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    # отправка моделируется отдельным циклом на виртуальных часах, поэтому после asyncio.run
+    common.print_table([
+        {
+            "tasks": size,
+            "path": name,
+            "build_ms": round(elapsed * 1000, 1),
+            "send_calls": len(messages),
+            "last_message_s": round(delivery_seconds(messages, args.latency_ms / 1000), 2),
+        }
+        for size, name, elapsed, messages in asyncio.run(build_all(args.sizes))
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Сквозной нагрузочный прогон: настоящий dp из src/bot.py в этом процессе, Bot API — заглушка
+fake_telegram.py (апдейты через getUpdates или POST на вебхук с секретом, --mode), Google Sheets —
+fake_gspread.py (EXPORT_BACKEND=sheets) или файл, отправленный sendDocument (csv / xlsx).
+
+Перед прогоном база заполняется: --users пользователей по --tasks задач. Затем все пользователи
+одновременно выполняют по --actions действий, выбранных по весам --mix генератором с --seed:
+add — диалог добавления задачи (меню, категория, название, описание, срок), list — список и
+иногда следующая страница, search — поиск по слову из названий или по названию с опечаткой,
+stats — статистика, export — постановка в очередь и ожидание результата (export_done).
+Как у живого пользователя, следующий апдейт подаётся после ответа бота на предыдущий.
+
+Отчёт — JSON (в stdout или --output): действий и апдейтов в секунду, ошибки в логе, задержка
+от подачи апдейта до ответа бота p50 / p95 / p99 по каждому действию и в целом, пиковый RSS
+процесса, SQL-запросы по видам и на действие (common.count_sql), вызовы Bot API и Sheets API.
+
+С --baseline отчёт сравнивается с сохранённым отчётом той же конфигурации: если действий в секунду
+стало меньше, а p95 какого-либо действия, пиковый RSS или SQL-запросов на действие — больше, чем
+на --tolerance, или ошибок больше, чем в базовом, нарушения выводятся в stderr и процесс
+завершается с кодом 1.
+
+    python benchmarks/bench_load.py [--users 100] [--tasks 100] [--actions 20] [--mode polling]
+        [--mix add=25,list=30,search=20,stats=15,export=10] [--export-backend sheets] [--seed 1]
+        [--output report.json] [--baseline report.json] [--tolerance 0.25]
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+import common
+from fake_gspread import FakeClient
+from fake_telegram import Delivery, FakeTelegram, TelegramLimits, free_port
+
+SECRET = "load-secret"
+WEBHOOK_PATH = "/webhook"
+DEFAULT_MIX = "add=25,list=30,search=20,stats=15,export=10"
+# задержки в единицы миллисекунд шумят от прогона к прогону — рост p95 меньше этого не считается регрессией
+LATENCY_SLACK_MS = 5
+
+VERBS = ["починить", "написать", "проверить", "обновить", "настроить", "разобрать", "купить", "позвонить"]
+NOUNS = ["отчёт", "сервер", "тесты", "документацию", "релиз", "бэкап", "счёт", "клиента", "дашборд", "миграцию"]
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ACTIONS:
+            raise argparse.ArgumentTypeError(f"неизвестное действие {name!r}, есть: {', '.join(ACTIONS)}")
+        mix[name] = float(weight)
+    return mix
+
+
+def task_title(rng: random.Random) -> str:
+    return f"{rng.choice(VERBS)} {rng.choice(NOUNS)}"
+
+
+def search_query(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return rng.choice(NOUNS)
+    title = task_title(rng)
+    typo = rng.randrange(len(title))
+    return title[:typo] + title[typo + 1:]
+
+
+def next_page_data(record: dict) -> str | None:
+    """callback_data кнопки «▶️» из клавиатуры сообщения со списком."""
+    markup = json.loads(record.get("reply_markup") or "{}")
+    for row in markup.get("inline_keyboard", []):
+        for button in row:
+            if button.get("callback_data", "").startswith("list:n:"):
+                return button["callback_data"]
+    return None
+
+
+class ErrorCounter(logging.Handler):
+    """Считает записи лога уровня ERROR и выше: исключения в хендлерах, упавшие задания экспорта."""
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        self.count += 1
+
+
+class Load:
+    """Подача апдейтов от имени пользователей и учёт задержек ответов бота."""
+
+    def __init__(self, telegram: FakeTelegram, deliver: Delivery, timeout: float):
+        self.telegram = telegram
+        self.deliver = deliver
+        self.timeout = timeout
+        self.latencies: dict[str, list[float]] = collections.defaultdict(list)
+        self.updates = 0
+        self.actions: collections.Counter = collections.Counter()
+
+    async def step(self, action: str, user_id: int, update: dict, follow_up: bool = False) -> tuple:
+        """
+        Подаёт апдейт и ждёт ответа бота в чат пользователя. follow_up — ждать ещё и второе
+        сообщение (результат экспорта): его future создаётся до подачи, чтобы не пропустить.
+        """
+        reply = self.telegram.next_reply(user_id)
+        second = self.telegram.next_reply(user_id) if follow_up else None
+        submitted = time.perf_counter()
+        await self.deliver(update)
+        try:
+            record = await asyncio.wait_for(reply, self.timeout)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"бот не ответил пользователю {user_id} на {action}: {update}") from None
+        self.latencies[action].append(record["at"] - submitted)
+        self.updates += 1
+        return record, second, submitted
+
+    async def message(self, action: str, user_id: int, text: str) -> dict:
+        record, _, _ = await self.step(action, user_id, self.telegram.message(user_id, text))
+        return record
+
+
+# ====== Действия пользователя ======
+async def add(load: Load, user_id: int, rng: random.Random):
+    import bot
+
+    await load.message("add", user_id, "➕ Добавить задачу")
+    await load.message("add", user_id, bot.CATEGORY_RU[rng.choice(bot.CATEGORIES)])
+    await load.message("add", user_id, task_title(rng))
+    await load.message("add", user_id, f"описание {rng.randrange(10**6)}")
+    await load.message("add", user_id, "Без срока")
+
+
+async def list_tasks(load: Load, user_id: int, rng: random.Random):
+    record = await load.message("list", user_id, "📋 Мои задачи")
+    data = next_page_data(record)
+    if data and rng.random() < 0.5:
+        update = load.telegram.callback(user_id, data, message_id=record["message_id"])
+        await load.step("list", user_id, update)
+
+
+async def search(load: Load, user_id: int, rng: random.Random):
+    await load.message("search", user_id, "🔍 Поиск")
+    await load.message("search", user_id, search_query(rng))
+
+
+async def stats(load: Load, user_id: int, rng: random.Random):
+    await load.message("stats", user_id, "📊 Статистика")
+
+
+async def export(load: Load, user_id: int, rng: random.Random):
+    record, result, submitted = await load.step(
+        "export", user_id, load.telegram.message(user_id, "📤 Экспорт"), follow_up=True
+    )
+    if "запущен" not in record["text"]:
+        result.cancel()
+        return
+    done = await asyncio.wait_for(result, load.timeout)
+    load.latencies["export_done"].append(done["at"] - submitted)
+
+
+ACTIONS = {"add": add, "list": list_tasks, "search": search, "stats": stats, "export": export}
+
+
+async def user_session(load: Load, user_id: int, actions: int, mix: dict, rng: random.Random):
+    await load.message("start", user_id, "/start")
+    names, weights = list(mix), list(mix.values())
+    for name in rng.choices(names, weights, k=actions):
+        await ACTIONS[name](load, user_id, rng)
+        load.actions[name] += 1
+
+
+# ====== Прогон ======
+async def seed_tasks(db, users: int, tasks: int, rng: random.Random, categories: list[str]):
+    for user_id in range(1, users + 1):
+        by_category = collections.defaultdict(list)
+        for _ in range(tasks):
+            by_category[rng.choice(categories)].append((task_title(rng), ""))
+        for category, items in by_category.items():
+            await db.add_tasks(user_id, category, items)
+
+
+async def start_bot(bot, mode: str, port: int) -> web.AppRunner | asyncio.Task:
+    if mode == "webhook":
+        from aiogram.dispatcher.webhook import BOT_DISPATCHER_KEY
+
+        bot.BotWebhookHandler.secret_token = SECRET
+        app = web.Application()
+        app.router.add_route("*", WEBHOOK_PATH, bot.BotWebhookHandler)
+        app[BOT_DISPATCHER_KEY] = bot.dp
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await bot.on_startup_webhook(bot.dp)
+        await web.TCPSite(runner, "127.0.0.1", port).start()
+        return runner
+    await bot.on_startup(bot.dp)
+    return asyncio.create_task(bot.dp.start_polling(timeout=10))
+
+
+async def stop_bot(bot, mode: str, handle):
+    if mode == "webhook":
+        await handle.cleanup()
+        await bot.on_shutdown_webhook(bot.dp)
+    else:
+        bot.dp.stop_polling()
+        handle.cancel()  # getUpdates ждёт апдейтов до timeout — не дожидаемся
+        await asyncio.gather(handle, return_exceptions=True)
+        await bot.on_shutdown(bot.dp)
+    await (await bot.bot.get_session()).close()
+
+
+async def run(args) -> dict:
+    telegram = FakeTelegram(TelegramLimits() if args.real_limits else None)
+    api = await telegram.start()
+    port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+    rates = {} if args.real_limits else {"TG_GLOBAL_RATE": 1_000_000, "TG_CHAT_RATE": 1_000_000}
+    common.bot_env(
+        os.path.join(tmp.name, "tasks.db"),
+        BOT_MODE=args.mode,
+        TELEGRAM_API_SERVER=api,
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_HOST=f"http://127.0.0.1:{port}",
+        WEBHOOK_PATH=WEBHOOK_PATH,
+        EXPORT_BACKEND=args.export_backend,
+        SHEET_ID="load-test",
+        **rates,
+    )
+    # config читает окружение при импорте — бот импортируется после того, как оно задано
+    import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    errors = ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    rng = random.Random(args.seed)
+    sheets = FakeClient()
+    handle = await start_bot(bot, args.mode, port)
+    try:
+        with sheets.installed():
+            await seed_tasks(bot.db, args.users, args.tasks, rng, bot.CATEGORIES)
+            rss_before = common.peak_rss_mb()
+            async with aiohttp.ClientSession() as session:
+                deliver = Delivery(args.mode, telegram, f"http://127.0.0.1:{port}{WEBHOOK_PATH}", session, SECRET)
+                load = Load(telegram, deliver, args.timeout)
+                with common.count_sql(bot.db) as sql:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(
+                        user_session(load, user_id, args.actions, args.mix, random.Random(rng.random()))
+                        for user_id in range(1, args.users + 1)
+                    ))
+                    elapsed = time.perf_counter() - started
+    finally:
+        await stop_bot(bot, args.mode, handle)
+        await telegram.stop()
+        tmp.cleanup()
+        logging.getLogger().removeHandler(errors)
+
+    actions = sum(load.actions.values())
+    all_latencies = [s for name, values in load.latencies.items() if name != "export_done" for s in values]
+    return {
+        "config": {
+            "users": args.users, "tasks": args.tasks, "actions": args.actions, "mode": args.mode,
+            "mix": args.mix, "export_backend": args.export_backend, "seed": args.seed,
+            "real_limits": args.real_limits,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput": {
+            "actions_per_s": round(actions / elapsed, 1),
+            "updates_per_s": round(load.updates / elapsed, 1),
+        },
+        "actions": dict(load.actions),
+        "errors": errors.count,
+        "latency_ms": {
+            "all": common.latency_summary(all_latencies),
+            **{name: common.latency_summary(values) for name, values in sorted(load.latencies.items())},
+        },
+        "rss_before_run_mb": round(rss_before, 1),
+        "peak_rss_mb": round(common.peak_rss_mb(), 1),
+        "sql": {
+            "statements": sum(sql.values()),
+            "per_action": round(sum(sql.values()) / actions, 2),
+            "by_kind": dict(sql.most_common()),
+        },
+        "telegram": {"calls": dict(telegram.calls.most_common()), "rejected_429": telegram.rejected},
+        "sheets": {"requests": sheets.requests, "cells_written": sheets.cells_written},
+    }
+
+
+# ====== Регрессионный порог ======
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Чем отчёт хуже базового больше чем на tolerance (доля); пустой список — регрессий нет."""
+    if report["config"] != baseline["config"]:
+        return [f"конфигурация прогона {report['config']} не совпадает с базовой {baseline['config']}"]
+    problems = []
+
+    def check(name: str, value: float, base: float, higher_is_worse: bool = True, slack: float = 0.0):
+        limit = base * (1 + tolerance) + slack if higher_is_worse else base * (1 - tolerance) - slack
+        if value > limit if higher_is_worse else value < limit:
+            problems.append(f"{name}: {value} против {base} в базовом (порог {limit:.2f})")
+
+    if report["errors"] > baseline["errors"]:
+        problems.append(f"errors: {report['errors']} против {baseline['errors']} в базовом")
+    check("actions_per_s", report["throughput"]["actions_per_s"], baseline["throughput"]["actions_per_s"], False)
+    for action, base in baseline["latency_ms"].items():
+        if action in report["latency_ms"]:
+            check(f"{action} p95_ms", report["latency_ms"][action]["p95_ms"], base["p95_ms"], slack=LATENCY_SLACK_MS)
+    check("peak_rss_mb", report["peak_rss_mb"], baseline["peak_rss_mb"])
+    check("sql per_action", report["sql"]["per_action"], baseline["sql"]["per_action"])
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tasks", type=int, default=100, help="задач у каждого пользователя до прогона")
+    parser.add_argument("--actions", type=int, default=20, help="действий каждого пользователя")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default="polling")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="веса действий")
+    parser.add_argument("--export-backend", choices=["sheets", "csv", "xlsx"], default="sheets")
+    parser.add_argument("--real-limits", action="store_true", help="лимиты отправки Telegram в боте и заглушке")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=60, help="секунд на ответ бота")
+    parser.add_argument("--output", help="куда записать JSON-отчёт (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON-отчёт, с которым сравнить прогон")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = regressions(report, json.load(f), args.tolerance)
+        for problem in problems:
+            print("РЕГРЕССИЯ:", problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+ReminderScheduler на --tasks напоминаниях (по умолчанию 1M) на виртуальных часах (virtual_time):
+сутки ожидания проходят за время запросов к базе.
+
+Сценарии:
+  backlog — все сроки уже наступили (бот долго не работал): одно пробуждение и разбор очереди
+            пачками по --batch-size подряд;
+  spread  — сроки равномерно на --spread секунд вперёд с точностью до минуты (как их вводят
+            пользователи): цикл спит до ближайшего срока и забирает наступившие.
+
+Выводит число пробуждений и пачек на пробуждение (среднее и максимум), отправленные напоминания
+и сообщения, время и память: RssAnon (только Linux) после первой пачки, после 10% и 50% пачек
+и в конце. Планировщик держит в памяти не больше одной пачки; в начале растёт только страничный
+кэш SQLite (ограничен cache_size соединения), поэтому прирост за вторую половину (second_half_mb)
+должен оставаться около нуля при любом числе напоминаний.
+Каждый сценарий — в отдельном процессе.
+
+    python benchmarks/bench_reminders.py [--tasks 1000000] [--users 10000] [--batch-size 500] [--spread 86400]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+import virtual_time
+from bench_file_export import AnonPeak
+from db import DB
+from reminders import ReminderScheduler, wait_event
+
+START = 1_800_000_000  # виртуальное «сейчас», Unix-время
+SCENARIOS = ("backlog", "spread")
+INSERT = (
+    "INSERT INTO tasks (user_telegram_id, title, title_norm, description, category, status, created_at, updated_at, due_at) "
+    "VALUES (?, ?, ?, '', 'other', 'open', ?, ?, ?)"
+)
+
+
+async def populate(path: str, tasks: int, users: int, scenario: str, spread: int):
+    db = DB(path)
+    await db.init()  # схема и миграции
+    await db.close()
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(INSERT, (
+            (1 + i % users, f"задача {i}", f"задача {i}", START - 86400, START - 86400,
+             START - 60 - i % 3600 if scenario == "backlog" else START + 60 + (i * spread // tasks) // 60 * 60)
+            for i in range(tasks)
+        ))
+    conn.close()
+
+
+async def child(path: str, tasks: int, batch_size: int, max_sleep: float) -> dict:
+    loop = asyncio.get_running_loop()
+
+    def clock() -> float:
+        # виртуальные часы идут от нуля: у чисел порядка Unix-времени шаг float больше
+        # разрешения часов цикла, и таймер на несколько миллисекунд вперёд никогда бы не наступил
+        return START + loop.time()
+
+    db = DB(path)
+    await db.init()
+    stats = {"sent": 0, "messages": 0, "batches": 0, "wakeups": 0}
+    per_wakeup = [0]
+    anon = []
+    done = asyncio.Event()
+
+    async def send(user_id, text):
+        stats["messages"] += 1
+
+    async def sleep(event, timeout):
+        stats["wakeups"] += 1
+        per_wakeup.append(0)
+        await wait_event(event, timeout)
+
+    reminders = ReminderScheduler(db, send, batch_size=batch_size, max_sleep=max_sleep, clock=clock, sleep=sleep)
+    fire_due = reminders.fire_due
+
+    async def counted_fire_due():
+        fired = await fire_due()
+        if fired:
+            stats["batches"] += 1
+            per_wakeup[-1] += 1
+            stats["sent"] += fired
+            anon.append(AnonPeak.current_mb())
+            if stats["sent"] >= tasks:
+                done.set()
+        return fired
+
+    reminders.fire_due = counted_fire_due
+    started = time.perf_counter()
+    try:
+        reminders.start()
+        await done.wait()
+        await reminders.stop()
+    finally:
+        await db.close()
+    elapsed = time.perf_counter() - started
+    busy = [n for n in per_wakeup if n]
+    return {
+        "reminders": stats["sent"],
+        "messages": stats["messages"],
+        "virtual_h": round(loop.time() / 3600, 1),
+        "seconds": round(elapsed, 1),
+        "wakeups": stats["wakeups"],
+        "batches": stats["batches"],
+        "batches_per_wakeup": round(stats["batches"] / max(len(busy), 1), 1),
+        "max_per_wakeup": max(busy, default=0),
+        **anon_profile(anon),
+        "peak_rss_mb": round(common.peak_rss_mb(), 1),
+    }
+
+
+def anon_profile(anon: list) -> dict:
+    """RssAnon после первой пачки, после 10% и 50% пачек и в конце; прирост за вторую половину."""
+    if not anon or anon[0] is None:
+        return {"anon_first_mb": "-"}
+
+    def at(share: float) -> float:
+        return anon[min(len(anon) - 1, int(len(anon) * share))]
+
+    return {
+        "anon_first_mb": round(anon[0], 1),
+        "anon_10pct_mb": round(at(0.1), 1),
+        "anon_50pct_mb": round(at(0.5), 1),
+        "anon_end_mb": round(anon[-1], 1),
+        "second_half_mb": round(anon[-1] - at(0.5), 1),
+    }
+
+
+def run_child(scenario: str, args) -> dict:
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario, *sys.argv[1:]],
+        check=True, capture_output=True, text=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--batch-size", type=int, default=500, help="REMINDER_BATCH_SIZE")
+    parser.add_argument("--max-sleep", type=float, default=60, help="REMINDER_MAX_SLEEP")
+    parser.add_argument("--spread", type=int, default=86400, help="на сколько секунд вперёд раскиданы сроки в spread")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=SCENARIOS)
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not args.child:
+        common.print_table([{"scenario": s, **run_child(s, args)} for s in args.scenarios])
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "reminders.db")
+        started = time.perf_counter()
+        asyncio.run(populate(path, args.tasks, args.users, args.child, args.spread))
+        populated = time.perf_counter() - started
+        result = virtual_time.run(child(path, args.tasks, args.batch_size, args.max_sleep))
+    print(json.dumps({"populate_s": round(populated, 1), **result}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Маршрутизация апдейтов: один хендлер с поиском в MENU_ROUTES / CALLBACK_ROUTES (как сейчас)
+против цепочки хендлеров с lambda-фильтрами, которые aiogram проверяет по очереди (как было).
+
+Оба варианта собираются на отдельных Dispatcher с MemoryStorage из ключей настоящих таблиц
+маршрутов, хендлеры пустые — измеряется только выбор хендлера. Апдейты идут через
+dp.process_update: кнопки меню по кругу, текст не из меню (в цепочке проверяются все фильтры),
+инлайн-кнопки каждого префикса. Выводит микросекунды на апдейт: среднее, p50 и p99.
+
+    python benchmarks/bench_routing.py [--updates 20000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import common
+
+common.bot_env(os.path.join(tempfile.mkdtemp(), "tasks.db"))
+
+import bot  # noqa: E402
+from aiogram import Bot, Dispatcher, types  # noqa: E402
+from aiogram.contrib.fsm_storage.memory import MemoryStorage  # noqa: E402
+
+# по одному callback_data на каждый префикс CALLBACK_ROUTES, в формате кнопок бота
+CALLBACK_DATA = ["list:n:o-:10:5", "close_5", "delete_5", "uset:page_size:10", "pick_5:1", "bulk:close:1"]
+
+
+async def noop(*args):
+    pass
+
+
+def chain_dispatcher(bot_: Bot) -> Dispatcher:
+    """Прежняя схема: хендлер на каждую кнопку и каждый префикс, фильтры проверяются по порядку."""
+    dp = Dispatcher(bot_, storage=MemoryStorage())
+    for text in bot.MENU_ROUTES:
+        dp.register_message_handler(noop, lambda m, text=text: m.text == text)
+    menu = list(bot.MENU_ROUTES)
+    dp.register_message_handler(noop, lambda m: m.text not in menu)
+    for prefix in bot.CALLBACK_ROUTES:
+        dp.register_callback_query_handler(
+            noop, lambda c, prefix=prefix: c.data.startswith(prefix + ":") or c.data.startswith(prefix + "_"), state="*"
+        )
+    return dp
+
+
+def table_dispatcher(bot_: Bot) -> Dispatcher:
+    """Текущая схема: один хендлер сообщений и один callback, поиск в словаре."""
+    dp = Dispatcher(bot_, storage=MemoryStorage())
+    menu = dict.fromkeys(bot.MENU_ROUTES, noop)
+    callbacks = dict.fromkeys(bot.CALLBACK_ROUTES, noop)
+
+    async def route_message(message: types.Message):
+        await menu.get(message.text, noop)(message)
+
+    async def route_callback(callback: types.CallbackQuery):
+        prefix = bot.CALLBACK_PREFIX.match(callback.data or "")
+        await callbacks.get(prefix.group() if prefix else None, noop)(callback)
+
+    dp.register_message_handler(route_message)
+    dp.register_callback_query_handler(route_callback, state="*")
+    return dp
+
+
+def updates(kind: str) -> list:
+    """Содержимое апдейтов одного вида; make_update дописывает update_id, чат и пользователя."""
+    if kind == "menu":
+        payloads = [{"message": {"text": text}} for text in bot.MENU_ROUTES]
+    elif kind == "last menu button":
+        payloads = [{"message": {"text": list(bot.MENU_ROUTES)[-1]}}]
+    elif kind == "free text":
+        payloads = [{"message": {"text": "просто текст"}}]
+    else:
+        payloads = [{"callback_query": {"data": data}} for data in CALLBACK_DATA]
+    return payloads
+
+
+def make_update(i: int, payload: dict) -> types.Update:
+    user = {"id": 1000 + i % 1000, "is_bot": False, "first_name": "u"}
+    chat = {"id": user["id"], "type": "private"}
+    if "message" in payload:
+        return types.Update(update_id=i, message={
+            "message_id": i, "date": 0, "chat": chat, "from": user, **payload["message"],
+        })
+    return types.Update(update_id=i, callback_query={
+        "id": str(i), "chat_instance": "1", "from": user,
+        "message": {"message_id": 1, "date": 0, "chat": chat, "from": {"id": 1, "is_bot": True, "first_name": "b"}, "text": "."},
+        **payload["callback_query"],
+    })
+
+
+async def measure(dp: Dispatcher, batch: list) -> list:
+    timings = []
+    for update in batch:
+        # своя задача на апдейт, как при polling: StateFilter кэширует состояние в contextvar
+        started = time.perf_counter()
+        await asyncio.create_task(dp.process_update(update))
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=20_000, help="апдейтов каждого вида")
+    args = parser.parse_args()
+
+    bot_ = Bot("123456:TEST")
+    Bot.set_current(bot_)
+    dispatchers = {"if-chain": chain_dispatcher(bot_), "dict": table_dispatcher(bot_)}
+    results = []
+    for kind in ("menu", "last menu button", "free text", "callback"):
+        payloads = updates(kind)
+        batch = [make_update(i, payloads[i % len(payloads)]) for i in range(args.updates)]
+        for name, dp in dispatchers.items():
+            Dispatcher.set_current(dp)
+            await measure(dp, batch[:1000])  # прогрев
+            timings = await measure(dp, batch)
+            results.append({
+                "updates": kind,
+                "routing": name,
+                "mean_us": round(sum(timings) / len(timings) * 1e6, 1),
+                "p50_us": round(common.percentile(timings, 50) * 1e6, 1),
+                "p99_us": round(common.percentile(timings, 99) * 1e6, 1),
+            })
+    print(f"кнопок меню: {len(bot.MENU_ROUTES)}, префиксов callback: {len(bot.CALLBACK_ROUTES)}")
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
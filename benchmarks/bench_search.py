@@ -0,0 +1,119 @@
+"""
+Поиск задач: задержка одного запроса (кандидаты из БД + fuzzy-ранжирование) для пользователей
+со 100 / 10k / 100k задачами на фоне задач других пользователей.
+
+  scan   — как до trigram-индекса: все задачи пользователя + process.extract;
+  fts    — всегда через общий trigram-индекс (MATCH по задачам всех пользователей);
+  hybrid — текущий db.search_tasks: до SEARCH_SCAN_MAX задач — все задачи пользователя
+           по индексу, больше — короткий список из trigram-индекса. Небольшие списки после первого
+           поиска берутся из кэша (TitleIndex), поэтому это повторный поиск;
+  cold   — то же, но кэш пользователя сброшен перед каждым запросом (первый поиск после записи).
+
+    python benchmarks/bench_search.py [--sizes 100 10000 100000] [--background 100000] [--db /tmp/search.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import common
+from rapidfuzz import fuzz, process
+
+from db import DB, SEARCH_SCAN_MAX, SEARCH_SHORTLIST, fts_query
+from search import find_similar_titles
+
+WORDS = (
+    "отчёт план релиз сервер клиент оплата встреча договор макет тест баг задача бюджет "
+    "дизайн аналитика миграция индекс кэш очередь экспорт импорт команда спринт ревью"
+).split()
+BACKGROUND_USERS = 1000
+
+
+def make_title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + f" {rng.randint(1, 999)}"
+
+
+def typo(text: str, rng: random.Random) -> str:
+    i = rng.randrange(len(text))
+    return text[:i] + text[i + 1:]
+
+
+async def populate(db: DB, sizes: list[int], background: int, rng: random.Random):
+    per_user = max(1, background // BACKGROUND_USERS)
+    for user in range(BACKGROUND_USERS):
+        await db.add_tasks(10_000 + user, "other", [(make_title(rng), "") for _ in range(per_user)])
+    for user, size in enumerate(sizes, start=1):
+        for start in range(0, size, 10_000):
+            await db.add_tasks(user, "development", [(make_title(rng), "") for _ in range(min(10_000, size - start))])
+
+
+async def scan_search(db: DB, user: int, q: str):
+    rows = await db.get_all_tasks_for_user(user)
+    titles = [r[1] for r in rows]
+    mapping = {r[1]: r for r in rows}
+    return [(mapping[t], s) for t, s, _ in process.extract(q, titles, scorer=fuzz.WRatio, limit=5) if s >= 60]
+
+
+async def fts_search(db: DB, user: int, q: str):
+    rows = await db._fetchall(
+        "SELECT t.id, t.title, t.description, t.category, t.status, t.created_at "
+        "FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid "
+        "WHERE tasks_fts MATCH ? AND t.user_telegram_id=? ORDER BY bm25(tasks_fts) LIMIT ?",
+        (fts_query(q), user, SEARCH_SHORTLIST)
+    )
+    return find_similar_titles(q, rows)
+
+
+async def hybrid_search(db: DB, user: int, q: str):
+    return find_similar_titles(q, await db.search_tasks(user, q))
+
+
+async def cold_search(db: DB, user: int, q: str):
+    db._forget_search_index(user)
+    return await hybrid_search(db, user, q)
+
+
+PATHS = {"scan": scan_search, "fts": fts_search, "hybrid": hybrid_search, "cold": cold_search}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000])
+    parser.add_argument("--background", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--db", help="путь к базе; если файл уже есть — используется без наполнения")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    path = args.db or os.path.join(tempfile.mkdtemp(), "search.db")
+    fresh = not os.path.exists(path)
+    db = DB(path)
+    await db.init()
+    try:
+        if fresh:
+            started = time.perf_counter()
+            await populate(db, args.sizes, args.background, rng)
+            print(f"База заполнена за {time.perf_counter() - started:.1f} с")
+        results = []
+        for user, size in enumerate(args.sizes, start=1):
+            titles = [r[1] for r in await db.get_all_tasks_for_user(user)]
+            queries = [typo(rng.choice(titles), rng) for _ in range(args.queries)]
+            for name, run in PATHS.items():
+                await run(db, user, queries[0])  # прогрев страничного кэша
+                timings = []
+                for q in queries:
+                    started = time.perf_counter()
+                    await run(db, user, q)
+                    timings.append(time.perf_counter() - started)
+                summary = common.latency_summary(timings)
+                results.append({"tasks": size, "path": name, "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"]})
+        print(f"SEARCH_SCAN_MAX = {SEARCH_SCAN_MAX}, фон: {args.background} задач других пользователей")
+        common.print_table(results)
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+SendScheduler против заглушки Telegram с его лимитами (TelegramLimits: ~30 сообщений/с на бота,
+~1/с на чат, небольшой запас), на виртуальных часах — минуты отправки проходят за доли секунды.
+
+Сценарии: рассылка по одному сообщению в --chats чатов (напоминания, уведомления об экспорте)
+и по --per-chat сообщений в 100 чатов. Для каждого запаса общего bucket (--global-bursts; 30 —
+запас, равный скорости, как было раньше) выводятся сообщений в секунду, число ответов 429,
+время до последнего сообщения и процессорное время планировщика на сообщение.
+
+    python benchmarks/bench_sender.py [--chats 100 1000 10000] [--per-chat 10] [--global-bursts 1 3 30]
+"""
+import argparse
+import asyncio
+import logging
+import math
+import time
+
+import common
+import virtual_time
+from aiogram import types
+from aiogram.utils.exceptions import RetryAfter
+from fake_telegram import TelegramLimits
+
+from sender import SendScheduler
+
+INLINE = types.InlineKeyboardMarkup()  # сообщения с инлайн-кнопками не склеиваются — считаем каждое
+
+
+def simulate(messages: list[int], global_burst: float, latency: float) -> dict:
+    """messages — chat_id каждого сообщения по порядку постановки."""
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        limits = TelegramLimits(global_rate=30, chat_rate=1, global_burst=3, chat_burst=3, clock=loop.time)
+        delivered, rejected = [], 0
+
+        async def send(chat_id, text, **kwargs):
+            nonlocal rejected
+            await asyncio.sleep(latency)
+            wait = limits.check(chat_id)
+            if wait:
+                rejected += 1
+                raise RetryAfter(math.ceil(wait))
+            delivered.append(loop.time())
+
+        scheduler = SendScheduler(
+            send, global_rate=30, chat_rate=1, chat_burst=3, global_burst=global_burst, clock=loop.time,
+        )
+        started = time.process_time()
+        await asyncio.gather(*(scheduler.submit(chat, "x", reply_markup=INLINE) for chat in messages))
+        cpu = time.process_time() - started
+        await scheduler.stop(0)
+        return delivered, rejected, cpu
+
+    delivered, rejected, cpu = virtual_time.run(scenario())
+    return {
+        "messages": len(messages),
+        "global_burst": global_burst,
+        "msgs_per_s": round(len(delivered) / max(delivered), 1),
+        "429s": rejected,
+        "last_message_s": round(max(delivered), 1),
+        "cpu_us_per_msg": round(cpu / len(messages) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--per-chat", type=int, default=10)
+    parser.add_argument("--global-bursts", type=float, nargs="+", default=[1, 3, 30])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # предупреждения о 429 считаются в таблице
+
+    workloads = [(f"broadcast {n} chats", list(range(n))) for n in args.chats]
+    workloads.append((f"100 chats x {args.per_chat}", [chat for _ in range(args.per_chat) for chat in range(100)]))
+    results = []
+    for name, messages in workloads:
+        for burst in args.global_bursts:
+            results.append({"workload": name, **simulate(messages, burst, args.latency_ms / 1000)})
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    main()
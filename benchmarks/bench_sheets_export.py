@@ -0,0 +1,87 @@
+"""
+Экспорт в Google Sheets: построчный append_row (как было до пакетной записи) против
+export_tasks_to_sheet (values.update кусками по SHEETS_CHUNK_ROWS) на заглушке gspread.
+
+Сеть не используется, поэтому кроме собственного времени выводится оценка с задержкой
+API (--latency-ms на запрос) и с квотой Sheets API на запись (60 запросов в минуту на пользователя).
+
+    python benchmarks/bench_sheets_export.py [--rows 10 1000 10000] [--latency-ms 150]
+"""
+import argparse
+import datetime
+import time
+
+import common  # noqa: F401  (путь к src)
+from fake_gspread import FakeClient
+from google_sheets import CATEGORY_RU, HEADER, export_tasks_to_sheet
+
+WRITE_QUOTA_PER_MINUTE = 60
+
+
+def append_row_export(client, tasks, username):
+    """Прежний экспорт: вкладка на 100 строк и append_row на каждую задачу."""
+    doc = client.open_by_key("sheet")
+    try:
+        sheet = doc.worksheet(username)
+        sheet.clear()
+    except Exception:
+        sheet = doc.add_worksheet(title=username, rows="100", cols="20")
+    sheet.append_row(HEADER)
+    for task_id, title, desc, category, status, created in tasks:
+        created_str = datetime.datetime.utcfromtimestamp(created).strftime("%m/%d/%Y")
+        sheet.append_row([
+            task_id, title, CATEGORY_RU.get(category, category), desc,
+            "Открыто" if status == "open" else "Готово", created_str,
+        ])
+
+
+def make_tasks(n: int):
+    now = int(time.time())
+    return [
+        (i, f"Задача {i}", f"описание {i}", "development", "open" if i % 3 else "done", now - i)
+        for i in range(1, n + 1)
+    ]
+
+
+def measure(name: str, run, client: FakeClient, rows: int, latency: float) -> dict:
+    client.reset_counters()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    return {
+        "path": name,
+        "rows": rows,
+        "requests": client.requests,
+        "cells": client.cells_written,
+        "local_ms": round(elapsed * 1000, 1),
+        "est_latency_s": round(client.requests * latency, 1),
+        "est_quota_min": round(client.requests / WRITE_QUOTA_PER_MINUTE, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--chunk-rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.rows:
+        tasks = make_tasks(n)
+        client = FakeClient()
+        with client.installed():
+            results.append(measure(
+                "append_row", lambda: append_row_export(client, tasks, "old"), client, n, args.latency_ms / 1000
+            ))
+            results.append(measure(
+                "batched", lambda: export_tasks_to_sheet("sa.json", "sheet", tasks, "new", args.chunk_rows),
+                client, n, args.latency_ms / 1000,
+            ))
+        old, new = client.spreadsheet.worksheets["old"], client.spreadsheet.worksheets["new"]
+        assert old.get_all_values() == new.get_all_values(), "выгрузки различаются"
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+«📊 Статистика»: GROUP BY по tasks (как было до материализованных счётчиков) против чтения
+user_stats / user_daily_stats при --tasks задачах в базе, у «тяжёлого» пользователя --heavy из них,
+остальные — у пользователей примерно по 100 задач.
+
+Выводит задержку чтения p50 / p99 для тяжёлого и обычного пользователя и цену триггеров на запись:
+вставку пачки задач со счётчиками и без них.
+
+    python benchmarks/bench_stats.py [--tasks 1000000] [--heavy 100000] [--db /tmp/bench_stats.db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import common
+from db import DB
+
+CATEGORIES = ["development", "testing", "analytics", "other"]
+HEAVY_USER = 1
+WEEKS = 8
+
+OLD_BY_STATUS = "SELECT category, status, COUNT(*) FROM tasks WHERE user_telegram_id=? GROUP BY category, status"
+OLD_CLOSED_BY_DAY = (
+    "SELECT updated_at / 86400, COUNT(*) FROM tasks "
+    "WHERE user_telegram_id=? AND status='done' AND updated_at>=? GROUP BY 1"
+)
+
+
+def task_rows(count: int, users: int, heavy: int, now: int, rng: random.Random, offset: int = 0):
+    for i in range(count):
+        user = HEAVY_USER if i < heavy else 2 + (i + offset) % users
+        created = now - rng.randrange(365 * 86400)
+        status = "done" if rng.random() < 0.6 else "open"
+        updated = created + rng.randrange(30 * 86400) if status == "done" else created
+        yield user, f"задача {i + offset}", f"задача {i + offset}", "", rng.choice(CATEGORIES), status, created, min(updated, now)
+
+
+INSERT = (
+    "INSERT INTO tasks (user_telegram_id, title, title_norm, description, category, status, created_at, updated_at) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def populate(path: str, tasks: int, heavy: int, now: int):
+    conn = sqlite3.connect(path)
+    users = max(1, (tasks - heavy) // 100)
+    started = time.perf_counter()
+    with conn:
+        conn.executemany(INSERT, task_rows(tasks, users, heavy, now, random.Random(1)))
+    print(f"{tasks} задач, {users + 1} пользователей, заполнение {time.perf_counter() - started:.1f} с")
+    conn.close()
+
+
+def insert_cost(path: str, rows: int, now: int) -> list[dict]:
+    """Вставка rows задач одной транзакцией с триггерами счётчиков и без них (откатывается)."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    results = []
+    try:
+        for name in ("with triggers", "without triggers"):
+            batch = list(task_rows(rows, 1000, 0, now, random.Random(2), offset=10**8))
+            conn.execute("BEGIN")
+            if name == "without triggers":
+                for trigger in ("user_stats_ai", "user_stats_ad", "user_stats_au", "user_stats_closed"):
+                    conn.execute(f"DROP TRIGGER {trigger}")
+            started = time.perf_counter()
+            conn.executemany(INSERT, batch)
+            elapsed = time.perf_counter() - started
+            conn.execute("ROLLBACK")
+            results.append({"insert": name, "rows": rows, "rows_per_s": round(rows / elapsed)})
+    finally:
+        conn.close()
+    return results
+
+
+async def read_latency(db: DB, user: int, runs: int, now: int) -> list[dict]:
+    first_day = now // 86400 - WEEKS * 7 + 1
+
+    async def old():
+        await db._fetchall(OLD_BY_STATUS, (user,))
+        await db._fetchall(OLD_CLOSED_BY_DAY, (user, first_day * 86400))
+
+    async def new():
+        await db.stats_by_category_status(user)
+        await db.daily_stats(user, first_day)
+
+    results = []
+    for name, func in (("GROUP BY tasks", old), ("user_stats", new)):
+        latencies = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - started)
+        summary = common.latency_summary(latencies)
+        results.append({"path": name, "p50_ms": summary["p50_ms"], "p99_ms": summary["p99_ms"]})
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1_000_000)
+    parser.add_argument("--heavy", type=int, default=100_000, help="задач у одного пользователя")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--insert-rows", type=int, default=20_000)
+    parser.add_argument("--db", help="база для повторных прогонов; создаётся и заполняется, если её нет")
+    args = parser.parse_args()
+
+    now = int(time.time())
+    path = args.db or os.path.join(tempfile.mkdtemp(), "stats.db")
+    fresh = not os.path.exists(path)
+    db = DB(path)
+    await db.init()
+    try:
+        if fresh:
+            populate(path, args.tasks, args.heavy, now)
+        results = []
+        for label, user in (("heavy", HEAVY_USER), ("typical", HEAVY_USER + 1)):
+            count = await db.count_tasks(user)
+            for row in await read_latency(db, user, args.runs, now):
+                results.append({"user": label, "tasks": count, **row})
+        mismatches = await db.check_stats()
+    finally:
+        await db.close()
+    common.print_table(results)
+    print(f"расхождений user_stats с GROUP BY: {len(mismatches)}")
+    common.print_table(insert_cost(path, args.insert_rows, now))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Генератор нагрузки на приём апдейтов: запускает src/bot.py отдельным процессом против заглушки
+Bot API (fake_telegram.py) и подаёт --updates синтетических /start от разных пользователей —
+в режиме polling через getUpdates, в режиме webhook POST-запросами на вебхук бота с секретом.
+
+--rate задаёт открытую нагрузку (апдейтов в секунду), без него все апдейты подаются сразу:
+polling забирает их из очереди пачками, webhook — не больше --concurrency запросов одновременно.
+Выводит апдейтов в секунду (от первого отправленного апдейта до последнего ответа) и сквозную
+задержку — от подачи апдейта до sendMessage с ответом — p50 / p95 / p99. Лимиты отправки бота
+подняты, чтобы мерить приём и обработку, а не лимиты Telegram.
+
+    python benchmarks/bench_webhook.py [--updates 2000] [--rate 200] [--modes polling webhook] [--concurrency 40]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+import common
+from fake_telegram import Delivery, FakeTelegram, free_port
+
+SECRET = "bench-secret"
+WEBHOOK_PATH = "/webhook"
+PROBE_USER = 10**9  # не 0: aiogram считает пустой id отсутствующим и апдейт не обрабатывает
+
+
+def bot_environment(mode: str, api: str, port: int, db_path: str, workers: int) -> dict:
+    common.bot_env(
+        db_path,
+        BOT_MODE=mode,
+        BOT_WORKERS=workers,
+        TELEGRAM_API_SERVER=api,
+        WEBHOOK_SECRET=SECRET,
+        WEBHOOK_PATH=WEBHOOK_PATH,
+        WEBAPP_HOST="127.0.0.1",
+        WEBAPP_PORT=port,
+        TG_GLOBAL_RATE=1_000_000,
+        TG_CHAT_RATE=1_000_000,
+    )
+    return dict(os.environ)
+
+
+def tail(path: str, lines: int = 20) -> str:
+    with open(path, errors="replace") as f:
+        return "".join(f.readlines()[-lines:])
+
+
+async def wait_ready(deliver: Delivery, telegram: FakeTelegram, proc, log_path: str, timeout: float = 30):
+    """Шлёт пробный /start, пока бот не ответит."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.returncode is not None:
+            raise RuntimeError(f"бот завершился с кодом {proc.returncode}:\n{tail(log_path)}")
+        try:
+            await deliver(telegram.message(PROBE_USER, "/start"))
+            await telegram.wait_replies([PROBE_USER], timeout=1)
+            return
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"бот не ответил на пробный /start:\n{tail(log_path)}")
+
+
+async def run_mode(mode: str, updates: int, rate: float, concurrency: int, workers: int) -> dict:
+    telegram = FakeTelegram()
+    api = await telegram.start()
+    port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+    env = bot_environment(mode, api, port, os.path.join(tmp.name, "tasks.db"), workers)
+    log_path = os.path.join(tmp.name, "bot.log")
+    with open(log_path, "wb") as log:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(common.SRC, "bot.py"), env=env, stdout=log, stderr=log,
+        )
+    try:
+        async with aiohttp.ClientSession() as session:
+            deliver = Delivery(mode, telegram, f"http://127.0.0.1:{port}{WEBHOOK_PATH}", session, SECRET)
+            await wait_ready(deliver, telegram, proc, log_path)
+            rejected = await deliver(telegram.message(PROBE_USER, "/start"), secret="wrong") if mode == "webhook" else None
+
+            users = range(1, updates + 1)
+            submitted: dict[int, float] = {}
+            semaphore = asyncio.Semaphore(concurrency)
+            started = time.perf_counter()
+
+            async def send(user_id: int):
+                if rate:
+                    # открытая нагрузка: апдейт приходит по расписанию, а не когда освободится соединение
+                    await asyncio.sleep(max(0.0, started + (user_id - 1) / rate - time.perf_counter()))
+                async with semaphore:
+                    submitted[user_id] = time.perf_counter()
+                    await deliver(telegram.message(user_id, "/start"))
+
+            await asyncio.gather(*(send(u) for u in users))
+            await telegram.wait_replies(users, timeout=120)
+            elapsed = max(telegram.first_reply[u] for u in users) - started
+    finally:
+        if proc.returncode is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.wait(), 30)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        await telegram.stop()
+        tmp.cleanup()
+
+    latency = common.latency_summary([telegram.first_reply[u] - submitted[u] for u in users])
+    return {
+        "mode": mode,
+        "workers": workers,
+        "updates": updates,
+        "offered_per_s": rate or "max",
+        "updates_per_s": round(updates / elapsed),
+        **{k: v for k, v in latency.items() if k != "mean_ms"},
+        "bad_secret_status": rejected if rejected is not None else "-",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--modes", nargs="+", default=["polling", "webhook"], choices=["polling", "webhook"])
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду; 0 — сразу все")
+    parser.add_argument("--concurrency", type=int, default=40, help="одновременных POST (как max_connections)")
+    parser.add_argument("--workers", type=int, default=1, help="BOT_WORKERS")
+    args = parser.parse_args()
+    common.print_table([
+        await run_mode(mode, args.updates, args.rate, args.concurrency, args.workers) for mode in args.modes
+    ])
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
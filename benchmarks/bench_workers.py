@@ -0,0 +1,123 @@
+"""
+Масштабирование по процессам: src/bot.py с BOT_WORKERS = 1 / 2 / 4 / 8 и FSM в SQLite или Redis
+(заглушка fake_redis.py — настоящий сервер не нужен) против заглушки Bot API в режиме webhook.
+
+Каждый из --users пользователей проходит --dialogs диалогов поиска: «🔍 Поиск» ставит состояние FSM,
+запрос читает и сбрасывает его и ищет по заранее созданным задачам пользователя — нагрузка
+на общее хранилище состояний и на общую базу. Выводит апдейтов в секунду и задержку от подачи
+запроса до ответа p50 / p95 / p99. Прирост от воркеров ограничен числом ядер (cpus в таблице):
+на одном ядре процессы только делят его между собой.
+
+    python benchmarks/bench_workers.py [--workers 1 2 4 8] [--fsm sqlite redis] [--users 200] [--dialogs 5]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+import common
+from bench_webhook import SECRET, WEBHOOK_PATH, bot_environment, tail, wait_ready
+from db import DB
+from fake_redis import FakeRedis
+from fake_telegram import Delivery, FakeTelegram, free_port
+
+
+async def seed(db_path: str, users: int, tasks: int):
+    db = DB(db_path)
+    await db.init()
+    try:
+        for user_id in range(1, users + 1):
+            await db.add_tasks(user_id, "development", [(f"задача {user_id} номер {i}", "") for i in range(tasks)])
+    finally:
+        await db.close()
+
+
+async def run(workers: int, fsm: str, users: int, dialogs: int, tasks: int, concurrency: int) -> dict:
+    telegram = FakeTelegram()
+    api = await telegram.start()
+    redis = FakeRedis()
+    redis_url = await redis.start() if fsm == "redis" else ""
+    port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp.name, "tasks.db")
+    await seed(db_path, users, tasks)
+    env = bot_environment("webhook", api, port, db_path, workers)
+    env.update(FSM_STORAGE=fsm, REDIS_URL=redis_url)
+    log_path = os.path.join(tmp.name, "bot.log")
+    with open(log_path, "wb") as log:
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(common.SRC, "bot.py"), env=env, stdout=log, stderr=log,
+        )
+    latencies = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            deliver = Delivery("webhook", telegram, f"http://127.0.0.1:{port}{WEBHOOK_PATH}", session, SECRET)
+            await wait_ready(deliver, telegram, proc, log_path)
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def step(user_id: int, text: str) -> float:
+                reply = telegram.next_reply(user_id)
+                async with semaphore:
+                    sent = time.perf_counter()
+                    await deliver(telegram.message(user_id, text))
+                await asyncio.wait_for(reply, 60)
+                return time.perf_counter() - sent
+
+            async def user(user_id: int):
+                for i in range(dialogs):
+                    await step(user_id, "🔍 Поиск")
+                    latencies.append(await step(user_id, f"задача {user_id} номер {i}"))
+
+            started = time.perf_counter()
+            try:
+                await asyncio.gather(*(user(u) for u in range(1, users + 1)))
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"бот не ответил за 60 с:\n{tail(log_path)}") from None
+            elapsed = time.perf_counter() - started
+    finally:
+        if proc.returncode is None:
+            proc.send_signal(signal.SIGINT)
+            try:
+                await asyncio.wait_for(proc.wait(), 30)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+        await telegram.stop()
+        await redis.stop()
+        tmp.cleanup()
+
+    latency = common.latency_summary(latencies)
+    return {
+        "workers": workers,
+        "fsm": fsm,
+        "cpus": os.cpu_count(),
+        "updates": users * dialogs * 2,
+        "updates_per_s": round(users * dialogs * 2 / elapsed),
+        **{k: v for k, v in latency.items() if k != "mean_ms"},
+        "redis_commands": redis.commands if fsm == "redis" else "-",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--fsm", nargs="+", default=["sqlite", "redis"], choices=["sqlite", "redis"])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--dialogs", type=int, default=5)
+    parser.add_argument("--tasks", type=int, default=50, help="задач у каждого пользователя")
+    parser.add_argument("--concurrency", type=int, default=40, help="одновременных POST (как max_connections)")
+    args = parser.parse_args()
+    results = []
+    for fsm in args.fsm:
+        for workers in args.workers:
+            results.append(await run(workers, fsm, args.users, args.dialogs, args.tasks, args.concurrency))
+    common.print_table(results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,98 @@
+"""
+Общие помощники бенчмарков: путь к src, замер времени, перцентили, пиковый RSS, счётчик SQL, вывод таблицы.
+Бенчмарки запускаются из корня репозитория: python benchmarks/<name>.py
+"""
+import collections
+import contextlib
+import os
+import resource
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC = os.path.join(ROOT, "src")
+if SRC not in sys.path:
+    sys.path.insert(0, SRC)
+
+
+def bot_env(db_path: str, **extra):
+    """Окружение, при котором `import bot` не ходит в сеть: фиктивный токен, метрики выключены."""
+    os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+    os.environ["DB_PATH"] = db_path
+    os.environ.setdefault("METRICS_PORT", "0")
+    os.environ.update({k: str(v) for k, v in extra.items()})
+
+
+def percentile(values: list, p: float) -> float:
+    """p-й перцентиль (0..100) методом ближайшего ранга; 0 для пустого списка."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def latency_summary(seconds: list) -> dict:
+    """p50 / p95 / p99 / среднее в миллисекундах."""
+    return {
+        "p50_ms": round(percentile(seconds, 50) * 1000, 3),
+        "p95_ms": round(percentile(seconds, 95) * 1000, 3),
+        "p99_ms": round(percentile(seconds, 99) * 1000, 3),
+        "mean_ms": round(statistics.fmean(seconds) * 1000, 3) if seconds else 0.0,
+    }
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса (ru_maxrss в Linux — в килобайтах)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextlib.contextmanager
+def count_sql(db):
+    """
+    Считает запросы, которые DB отправляет в SQLite (execute / executemany по первому слову запроса,
+    commit() — как COMMIT), на пишущем и читающих соединениях. Трассировка SQLite здесь не годится:
+    она повторяет текст запроса на каждое срабатывание триггера, и счёт зависит от схемы.
+    """
+    counts: collections.Counter = collections.Counter()
+    conns = [db.conn, *db._read_conns]
+    for conn in conns:
+        # не async: execute aiosqlite возвращает объект, который и ждут, и используют в async with
+        def counted(method):
+            def call(sql, *args, **kwargs):
+                counts[sql.lstrip().split(None, 1)[0].upper()] += 1
+                return method(sql, *args, **kwargs)
+            return call
+
+        def commit(method=conn.commit):
+            counts["COMMIT"] += 1
+            return method()
+
+        conn.execute, conn.executemany, conn.commit = counted(conn.execute), counted(conn.executemany), commit
+    try:
+        yield counts
+    finally:
+        for conn in conns:
+            del conn.execute, conn.executemany, conn.commit
+
+
+class Timer:
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.started
+
+
+def print_table(rows: list[dict]):
+    """Список словарей с одинаковыми ключами — выровненной таблицей."""
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[str(r.get(c, "")) for c in columns] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
@@ -0,0 +1,130 @@
+"""
+Заглушка gspread для тестов и бенчмарков: таблица живёт в памяти, каждый вызов, который
+в настоящем gspread стал бы HTTP-запросом к Sheets API, учитывается в requests,
+записанные ячейки — в cells_written.
+
+    client = FakeClient()
+    with client.installed():          # gspread.service_account(...) вернёт client
+        export_tasks_to_sheet(...)
+    client.spreadsheet.worksheet("alice").rows
+"""
+import contextlib
+import re
+
+import gspread
+
+_A1 = re.compile(r"([A-Z]+)(\d+)")
+
+
+def _parse_cell(a1: str) -> tuple[int, int]:
+    """'B3' -> (3, 2): номер строки и колонки с единицы."""
+    letters, row = _A1.fullmatch(a1).groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - ord("A") + 1
+    return int(row), col
+
+
+class FakeWorksheet:
+    def __init__(self, client, title: str, rows: int, cols: int):
+        self._client = client
+        self.title = title
+        self.row_count = int(rows)
+        self.col_count = int(cols)
+        self.rows: list[list] = []  # значения строк с первой; короче row_count — остальные пустые
+
+    def _request(self, cells: int = 0):
+        self._client.requests += 1
+        self._client.cells_written += cells
+
+    def _write(self, row: int, col: int, values: list):
+        if row > self.row_count:
+            # как и Sheets API, запись за пределы сетки не расширяет лист
+            raise gspread.exceptions.GSpreadException(f"row {row} is out of grid ({self.row_count})")
+        while len(self.rows) < row:
+            self.rows.append([])
+        line = self.rows[row - 1]
+        while len(line) < col - 1 + len(values):
+            line.append("")
+        line[col - 1:col - 1 + len(values)] = list(values)
+
+    def clear(self):
+        self._request()
+        self.rows = []
+
+    def resize(self, rows=None, cols=None):
+        self._request()
+        if rows is not None:
+            self.row_count = int(rows)
+            del self.rows[self.row_count:]
+        if cols is not None:
+            self.col_count = int(cols)
+
+    def append_row(self, values: list):
+        self._request(len(values))
+        last = len(self.rows) + 1
+        if last > self.row_count:
+            self.row_count = last  # append, в отличие от update, растит лист
+        self._write(last, 1, values)
+
+    def update(self, values: list = None, range_name: str = "A1"):
+        self._request(sum(len(v) for v in values))
+        row, col = _parse_cell(range_name.split(":")[0])
+        for i, line in enumerate(values):
+            self._write(row + i, col, line)
+
+    def batch_update(self, data: list):
+        self._request(sum(len(v) for item in data for v in item["values"]))
+        for item in data:
+            row, col = _parse_cell(item["range"].split(":")[0])
+            for i, line in enumerate(item["values"]):
+                self._write(row + i, col, line)
+
+    def get_all_values(self) -> list[list]:
+        return [list(r) for r in self.rows]
+
+
+class FakeSpreadsheet:
+    def __init__(self, client):
+        self._client = client
+        self.worksheets: dict[str, FakeWorksheet] = {}
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self._client.requests += 1
+        if title not in self.worksheets:
+            raise gspread.WorksheetNotFound(title)
+        return self.worksheets[title]
+
+    def add_worksheet(self, title: str, rows, cols) -> FakeWorksheet:
+        self._client.requests += 1
+        sheet = self.worksheets[title] = FakeWorksheet(self._client, title, rows, cols)
+        return sheet
+
+    def del_worksheet(self, sheet: FakeWorksheet):
+        self._client.requests += 1
+        self.worksheets.pop(sheet.title, None)
+
+
+class FakeClient:
+    def __init__(self):
+        self.requests = 0
+        self.cells_written = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self.requests += 1
+        return self.spreadsheet
+
+    def reset_counters(self):
+        self.requests = 0
+        self.cells_written = 0
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Подменяет gspread.service_account на время блока."""
+        original = gspread.service_account
+        gspread.service_account = lambda *args, **kwargs: self
+        try:
+            yield self
+        finally:
+            gspread.service_account = original
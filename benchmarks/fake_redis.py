@@ -0,0 +1,102 @@
+"""
+Заглушка Redis для нагрузочных прогонов FSM_STORAGE=redis без настоящего сервера: asyncio-сервер
+протокола RESP2 с командами, которые использует RedisStorage2 aiogram (GET, SET с EX, DEL, KEYS,
+FLUSHDB) и redis-py при подключении (PING, SELECT, AUTH, CLIENT). Ключи общие для всех соединений,
+как у одного сервера Redis; срок жизни ключей проверяется при чтении.
+
+    server = FakeRedis()
+    url = await server.start()  # redis://127.0.0.1:<port>/0 — для REDIS_URL
+"""
+import asyncio
+import fnmatch
+import time
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands = 0
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{port}/0"
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await self._read_command(reader)
+                if command is None:
+                    break
+                self.commands += 1
+                writer.write(self._execute(command))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):  # inline-команда (redis-cli, telnet)
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    def _get(self, key: bytes) -> bytes | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _execute(self, command: list[bytes]) -> bytes:
+        name, args = command[0].upper(), command[1:]
+        if name == b"GET":
+            return _bulk(self._get(args[0]))
+        if name == b"SET":
+            expires = None
+            options = [a.upper() for a in args[2:]]
+            if b"EX" in options:
+                expires = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+            elif b"PX" in options:
+                expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+            self.data[args[0]] = (args[1], expires)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args)
+            return b":%d\r\n" % removed
+        if name == b"KEYS":
+            pattern = args[0].decode()
+            keys = [k for k in list(self.data) if self._get(k) is not None and fnmatch.fnmatchcase(k.decode(), pattern)]
+            return b"*%d\r\n" % len(keys) + b"".join(_bulk(k) for k in keys)
+        if name == b"FLUSHDB":
+            self.data.clear()
+            return b"+OK\r\n"
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"SELECT", b"AUTH", b"CLIENT"):
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % name
+
+
+def _bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
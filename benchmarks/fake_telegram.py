@@ -0,0 +1,280 @@
+"""
+Заглушка Telegram Bot API для нагрузочных прогонов: aiohttp-сервер, который бот видит как
+TELEGRAM_API_SERVER. Отдаёт апдейты через getUpdates (long polling), принимает sendMessage /
+editMessageText / sendDocument и прочие методы, записывает, что и когда отправлено в каждый чат,
+и, если заданы лимиты, как Telegram отвечает 429 с retry_after при их превышении.
+
+    telegram = FakeTelegram(TelegramLimits(global_rate=30, chat_rate=1))
+    base = await telegram.start()           # http://127.0.0.1:<port>, передать боту в TELEGRAM_API_SERVER
+    telegram.push(telegram.message(user_id, "/start"))
+    await telegram.wait_replies([user_id])
+    await telegram.stop()
+
+Delivery подаёт апдейты боту так, как это делает Telegram в выбранном режиме: очередью getUpdates
+(polling) или POST на вебхук с секретом. next_reply(chat_id) — следующее сообщение бота в чат.
+"""
+import asyncio
+import collections
+import itertools
+import math
+import socket
+import time
+
+import aiohttp
+from aiohttp import web
+from aiogram.utils import json
+
+import common  # noqa: F401  (src в sys.path)
+from sender import TokenBucket
+from webhook import SECRET_HEADER
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Tasks", "username": "tasks_bot"}
+
+
+class TelegramLimits:
+    """
+    Лимиты отправки, как у Telegram: global_rate сообщений в секунду на весь бот и chat_rate на чат
+    (None — без лимита), global_burst / chat_burst — сколько можно отправить разом.
+    """
+
+    def __init__(
+        self,
+        global_rate: float | None = 30,
+        chat_rate: float | None = 1,
+        global_burst: float = 3,
+        chat_burst: float = 3,
+        clock=time.monotonic,
+    ):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        self._global = TokenBucket(global_rate, global_burst, clock()) if global_rate else None
+        self._chats: dict[int, TokenBucket] = {}
+
+    def check(self, chat_id: int | None) -> float:
+        """0 — можно отправлять (токены списаны), иначе через сколько секунд повторить."""
+        now = self._clock()
+        buckets = [self._global] if self._global else []
+        if chat_id is not None and self.chat_rate:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+            buckets.append(bucket)
+        wait = max((b.wait_time(now) for b in buckets), default=0.0)
+        if wait:
+            return wait
+        for bucket in buckets:
+            bucket.consume(now)
+        return 0.0
+
+
+class FakeTelegram:
+    """limits — TelegramLimits, при превышении которых отвечать 429; None — без лимитов."""
+
+    def __init__(self, limits: TelegramLimits | None = None):
+        self.limits = limits
+        self._pending: collections.deque = collections.deque()
+        self._arrived = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._replied: dict[int, asyncio.Event] = collections.defaultdict(asyncio.Event)
+        self._waiters: dict[int, list[asyncio.Future]] = collections.defaultdict(list)
+        self.calls: collections.Counter = collections.Counter()
+        # {"method", "chat_id", "message_id", "text", "reply_markup", "at"}; at — time.perf_counter()
+        self.sent: list[dict] = []
+        self.first_reply: dict[int, float] = {}
+        self.rejected = 0  # ответов 429
+        self.webhook_url = ""
+        self._runner: web.AppRunner | None = None
+
+    # ====== Апдейты ======
+    def message(self, user_id: int, text: str) -> dict:
+        """Апдейт с текстовым сообщением пользователя в личном чате (команда — с entity bot_command)."""
+        update_id = next(self._update_ids)
+        message = {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return {"update_id": update_id, "message": message}
+
+    def callback(self, user_id: int, data: str, message_id: int = 1) -> dict:
+        update_id = next(self._update_ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "chat_instance": str(user_id),
+                "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "...",
+                },
+                "data": data,
+            },
+        }
+
+    def push(self, update: dict):
+        """Ставит апдейт в очередь getUpdates (режим polling)."""
+        self._pending.append(update)
+        self._arrived.set()
+
+    def forget_replies(self, chat_ids):
+        """Сбрасывает отметки об ответах, чтобы снова ждать ответа в этих чатах."""
+        for chat_id in chat_ids:
+            self.first_reply.pop(chat_id, None)
+            self._replied.pop(chat_id, None)
+
+    async def wait_replies(self, chat_ids, timeout: float = 60):
+        """Ждёт первого сообщения бота в каждый из чатов."""
+        await asyncio.wait_for(
+            asyncio.gather(*(self._replied[chat_id].wait() for chat_id in chat_ids)), timeout
+        )
+
+    def next_reply(self, chat_id: int) -> asyncio.Future:
+        """
+        Future со следующим сообщением бота в чат (запись, как в sent). Каждое сообщение достаётся
+        одному ожидающему, по порядку вызовов: два next_reply подряд — первое и второе сообщения.
+        Создаётся до подачи апдейта, на который ждут ответ, иначе быстрый ответ можно пропустить.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[chat_id].append(future)
+        return future
+
+    # ====== Сервер ======
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        handler = getattr(self, f"_api_{method}", None)
+        if handler is not None:
+            return await handler(params)
+        if method.startswith(("send", "edit")):
+            return await self._send(method, params)
+        return self._ok(True)
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
+
+    async def _send(self, method: str, params: dict) -> web.Response:
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        wait = self.limits.check(chat_id) if self.limits else 0.0
+        if wait:
+            self.rejected += 1
+            retry_after = math.ceil(wait)
+            return web.Response(
+                status=429,
+                text=json.dumps({
+                    "ok": False,
+                    "error_code": 429,
+                    "description": f"Too Many Requests: retry after {retry_after}",
+                    "parameters": {"retry_after": retry_after},
+                }),
+                content_type="application/json",
+            )
+        now = time.perf_counter()
+        text = params.get("text", params.get("caption", ""))
+        message_id = int(params.get("message_id") or next(self._message_ids))
+        record = {
+            "method": method, "chat_id": chat_id, "message_id": message_id, "text": text,
+            "reply_markup": params.get("reply_markup"), "at": now,
+        }
+        self.sent.append(record)
+        if chat_id is not None and chat_id not in self.first_reply:
+            self.first_reply[chat_id] = now
+            self._replied[chat_id].set()
+        waiters = self._waiters.get(chat_id)
+        while waiters:
+            future = waiters.pop(0)
+            if not future.done():
+                future.set_result(record)
+                break
+        return self._ok({
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id or 0, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        })
+
+    # ====== Методы API ======
+    async def _api_getMe(self, params):
+        return self._ok(BOT_USER)
+
+    async def _api_setWebhook(self, params):
+        self.webhook_url = params.get("url", "")
+        return self._ok(True)
+
+    async def _api_getWebhookInfo(self, params):
+        return self._ok({"url": self.webhook_url, "has_custom_certificate": False, "pending_update_count": len(self._pending)})
+
+    async def _api_deleteWebhook(self, params):
+        self.webhook_url = ""
+        return self._ok(True)
+
+    async def _api_getUpdates(self, params):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset < 0:
+            # skip_updates: getUpdates(offset=-1) — отдаём последний апдейт, остальные отбрасываем
+            last = self._pending[-1] if self._pending else None
+            self._pending.clear()
+            return self._ok([last] if last else [])
+        while self._pending and self._pending[0]["update_id"] < offset:
+            self._pending.popleft()
+        if not self._pending and timeout:
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._ok(list(itertools.islice(self._pending, limit)))
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Delivery:
+    """Подача апдейтов боту: очередь getUpdates заглушки (polling) или POST на вебхук с секретом."""
+
+    def __init__(self, mode: str, telegram: FakeTelegram, url: str, session: aiohttp.ClientSession, secret: str = ""):
+        self.mode = mode
+        self.telegram = telegram
+        self.url = url
+        self.session = session
+        self.secret = secret
+
+    async def __call__(self, update: dict, secret: str | None = None) -> int:
+        if self.mode == "polling":
+            self.telegram.push(update)
+            return 200
+        headers = {SECRET_HEADER: self.secret if secret is None else secret}
+        async with self.session.post(self.url, json=update, headers=headers) as response:
+            return response.status
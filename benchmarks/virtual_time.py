@@ -0,0 +1,56 @@
+"""
+Цикл событий с виртуальными часами: loop.time() стоит на месте, пока есть готовая работа,
+а когда ждать больше нечего, кроме таймеров, часы сразу переводятся к ближайшему таймеру.
+asyncio.sleep(60), wait_for(..., timeout) и call_later выполняются мгновенно, но в том же
+порядке и с теми же интервалами, что и в реальном времени.
+
+Подходит для кода без потоков (планировщик отправки, token bucket): работа в потоках
+(aiosqlite, run_in_executor) виртуального времени не занимает, а часы могут уйти вперёд,
+пока поток ещё работает.
+
+    result = run(main())                        # main() видит виртуальное время
+    clock = asyncio.get_running_loop().time      # часы для SendScheduler(clock=...)
+"""
+import asyncio
+import selectors
+
+
+class _VirtualSelector:
+    def __init__(self, loop):
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events or timeout == 0:
+            return events
+        if timeout is None:
+            # таймеров нет — ждём настоящий ввод-вывод (например, call_soon_threadsafe из потока)
+            return self._selector.select(None)
+        self._loop.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, start: float = 0.0):
+        self._now = start
+        super().__init__(selector=_VirtualSelector(self))
+
+    def time(self) -> float:
+        return self._now
+
+    def advance(self, seconds: float):
+        self._now += seconds
+
+
+def run(coro, start: float = 0.0):
+    """asyncio.run для виртуального времени."""
+    loop = VirtualTimeLoop(start)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
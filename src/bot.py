@@ -1,22 +1,59 @@
 import asyncio
 import logging
+import os
+import re
+import signal
 import datetime
-import traceback
-from typing import Optional, Any
-from aiogram import Bot, Dispatcher, executor, types
-from aiogram.contrib.fsm_storage.memory import MemoryStorage
+import time
+from typing import Any
+from aiohttp import web
+from aiogram import Dispatcher, executor, types
+from aiogram.bot.api import TELEGRAM_PRODUCTION, TelegramAPIServer
 from aiogram.dispatcher import FSMContext
 from aiogram.dispatcher.filters.state import State, StatesGroup
-from config import BOT_TOKEN, DB_PATH, GOOGLE_SA_FILE, SHEET_ID, ADMIN_IDS
+from aiogram.utils.exceptions import BadRequest, MessageNotModified, NetworkError, RetryAfter, Unauthorized
+from config import (
+    BOT_TOKEN, DB_PATH, GOOGLE_SA_FILE, SHEET_ID, ADMIN_IDS, SHEETS_CHUNK_ROWS,
+    EXPORT_WORKERS, EXPORT_MAX_ATTEMPTS, EXPORT_RETRY_BACKOFF, EXPORT_LEASE, EXPORT_BACKEND, EXPORT_FILE_CHUNK_ROWS, SEARCH_DESCRIPTION_WEIGHT, SEARCH_SCAN_MAX, SEARCH_WORKERS, LIST_PAGE_SIZE,
+    DB_READERS, DB_COMMIT_DELAY, KNOWN_USERS_CACHE, SEARCH_CACHE_USERS, SETTINGS_POLL_INTERVAL,
+    SHEETS_SYNC_MODE, SHEETS_FULL_RESYNC_RATIO, REMINDER_BATCH_SIZE, REMINDER_MAX_SLEEP, REMINDER_RETRY_DELAY,
+    BOT_MODE, BOT_WORKERS, WEBHOOK_HOST, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_CONNECTIONS,
+    WEBAPP_HOST, WEBAPP_PORT, SHUTDOWN_TIMEOUT, TG_GLOBAL_RATE, TG_CHAT_RATE, TG_CHAT_BURST, TG_GLOBAL_BURST,
+    FSM_STORAGE, REDIS_URL, REDIS_POOL_SIZE, FSM_CACHE_SIZE, FSM_TTL, FSM_FLUSH_INTERVAL, FSM_SWEEP_INTERVAL,
+    METRICS_HOST, METRICS_PORT, PROFILE_SAMPLE_RATE, TELEGRAM_API_SERVER,
+)
 from db import DB
 from search import find_similar_titles
-from google_sheets import export_tasks_to_sheet
+from google_sheets import is_retryable_error
+from sheet_sync import sync_user_sheet
+from export_queue import ExportQueue
+from file_export import MAX_DOCUMENT_BYTES, export_tasks_to_file
+from webhook import BotWebhookHandler
+from sender import ScheduledBot, BACKGROUND
+from fsm_storage import SQLiteStorage, create_storage
+from reminders import MAX_DUE_YEARS, ReminderScheduler, format_due, parse_due
+from workers import ShardRouter, run_polling_front, webhook_front_app
+import metrics
 
 logging.basicConfig(level=logging.INFO)
 
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher(bot, storage=MemoryStorage())
-db = DB(DB_PATH)
+bot = ScheduledBot(
+    token=BOT_TOKEN,
+    server=TelegramAPIServer.from_base(TELEGRAM_API_SERVER) if TELEGRAM_API_SERVER else TELEGRAM_PRODUCTION,
+    global_rate=TG_GLOBAL_RATE,
+    chat_rate=TG_CHAT_RATE,
+    chat_burst=TG_CHAT_BURST,
+    global_burst=TG_GLOBAL_BURST,
+)
+db = DB(
+    DB_PATH, readers=DB_READERS, commit_delay=DB_COMMIT_DELAY, known_users=KNOWN_USERS_CACHE,
+    search_cache=SEARCH_CACHE_USERS,
+)
+storage = create_storage(
+    FSM_STORAGE, db, REDIS_URL, REDIS_POOL_SIZE,
+    cache_size=FSM_CACHE_SIZE, ttl=FSM_TTL, flush_interval=FSM_FLUSH_INTERVAL, sweep_interval=FSM_SWEEP_INTERVAL,
+)
+dp = Dispatcher(bot, storage=storage)
 
 CATEGORIES = ["development", "testing", "analytics", "other"]
 CATEGORY_RU = {
@@ -31,6 +68,10 @@ class AddTaskStates(StatesGroup):
     waiting_for_category = State()
     waiting_for_title = State()
     waiting_for_description = State()
+    waiting_for_due = State()
+
+class SearchStates(StatesGroup):
+    waiting_for_query = State()
 
 # ===== Helpers =====
 def is_back(text: str) -> bool:
@@ -40,7 +81,8 @@ def main_menu(user_id=None):
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("➕ Добавить задачу")
     kb.add("📋 Мои задачи", "📊 Статистика")
-    kb.add("🔍 Поиск", "📤 Экспорт в Google Sheets")
+    kb.add("🔍 Поиск", "📤 Экспорт")
+    kb.add("⚙️ Настройки")
     if user_id in ADMIN_IDS:
         kb.add("⚙️ Админка")
     return kb
@@ -53,16 +95,20 @@ def categories_keyboard():
     return kb
 
 async def safe_send(user_id: int, text: str, **kwargs: Any):
-    """Отправка сообщения пользователю с логированием ошибок — безопаснее вызывать внутри фоновых тасков."""
+    """
+    Отправка сообщения пользователю с логированием ошибок — безопаснее вызывать внутри фоновых тасков.
+    Идёт с фоновым приоритетом: ответы на действия пользователей планировщик отправит раньше.
+    """
     try:
-        await bot.send_message(user_id, text, **kwargs)
+        await bot.send_message(user_id, text, priority=BACKGROUND, **kwargs)
     except Exception:
+        metrics.SAFE_SEND_FAILURES.inc()
         logging.exception("Не удалось отправить сообщение пользователю %s", user_id)
 
 # ===== Start =====
 @dp.message_handler(commands=["start"])
 async def cmd_start(message: types.Message):
-    await db.init()
+    # db.init() выполняется один раз в on_startup
     await db.ensure_user(message.from_user.id, message.from_user.username)
     await message.reply(
         "Привет! Выберите действие:",
@@ -70,7 +116,6 @@ async def cmd_start(message: types.Message):
     )
 
 # ===== Add Task =====
-@dp.message_handler(lambda m: m.text == "➕ Добавить задачу")
 async def add_task_start(message: types.Message):
     await message.reply("Выберите категорию:", reply_markup=categories_keyboard())
     await AddTaskStates.waiting_for_category.set()
@@ -93,7 +138,7 @@ async def add_task_category(message: types.Message, state: FSMContext):
     # Кнопка назад к выбору категории при вводе заголовка
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("⬅️ Назад")
-    await message.reply("Введите название задачи:", reply_markup=kb)
+    await message.reply("Введите название задачи (несколько строк — несколько задач сразу):", reply_markup=kb)
     await AddTaskStates.waiting_for_title.set()
 
 @dp.message_handler(state=AddTaskStates.waiting_for_title)
@@ -103,31 +148,54 @@ async def add_task_title(message: types.Message, state: FSMContext):
         await add_task_start(message)
         return
 
+    titles = [line.strip() for line in message.text.splitlines() if line.strip()]
+    if len(titles) > 1:
+        # несколько строк — по задаче на строку, без описаний, одной транзакцией
+        data = await state.get_data()
+        category_ru = CATEGORY_RU.get(data["category"], data["category"])
+        try:
+            started = time.perf_counter()
+            count = await db.add_tasks(message.from_user.id, data["category"], [(t, "") for t in titles])
+            elapsed = (time.perf_counter() - started) * 1000
+            await message.reply(
+                f"Добавлено задач: {count} в категорию '{category_ru}' за {elapsed:.0f} мс.",
+                reply_markup=main_menu(message.from_user.id)
+            )
+        except Exception:
+            logging.exception("Ошибка при пакетном добавлении задач")
+            await message.reply("Ошибка при добавлении задач. Попробуйте ещё раз.", reply_markup=main_menu(message.from_user.id))
+        finally:
+            await state.finish()
+        return
+
     await state.update_data(title=message.text.strip())
+    await ask_description(message)
 
+async def ask_description(message: types.Message):
     # Кнопка оставить пустым под сообщением
     kb = types.InlineKeyboardMarkup()
     kb.add(types.InlineKeyboardButton("Оставить пустым", callback_data="desc_empty"))
     await message.reply("Введите описание (можно оставить пустым):", reply_markup=kb)
     await AddTaskStates.waiting_for_description.set()
 
+DUE_PROMPT = (
+    "Срок задачи (время UTC): ДД.ММ.ГГГГ ЧЧ:ММ, ДД.ММ или +30м / +2ч / +1д, "
+    f"не дальше {MAX_DUE_YEARS} лет. В срок придёт напоминание."
+)
+
+def due_keyboard():
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add("Без срока")
+    kb.add("⬅️ Назад")
+    return kb
+
 @dp.callback_query_handler(lambda c: c.data == "desc_empty", state=AddTaskStates.waiting_for_description)
 async def desc_empty_callback(callback: types.CallbackQuery, state: FSMContext):
-    try:
-        data = await state.get_data()
-        await db.add_task(callback.from_user.id, data["title"], data["category"], "")
-        await bot.edit_message_reply_markup(callback.from_user.id, callback.message.message_id, reply_markup=None)
-        await bot.send_message(
-            callback.from_user.id,
-            f"Задача '{data['title']}' добавлена в категорию '{CATEGORY_RU.get(data['category'], data['category'])}'.",
-            reply_markup=main_menu(callback.from_user.id)
-        )
-    except Exception:
-        logging.exception("Ошибка при добавлении задачи через callback desc_empty")
-        await bot.send_message(callback.from_user.id, "Ошибка при добавлении задачи. Попробуйте ещё раз.", reply_markup=main_menu(callback.from_user.id))
-    finally:
-        await state.finish()
-        await callback.answer()
+    await state.update_data(description="")
+    await bot.edit_message_reply_markup(callback.from_user.id, callback.message.message_id, reply_markup=None)
+    await bot.send_message(callback.from_user.id, DUE_PROMPT, reply_markup=due_keyboard())
+    await AddTaskStates.waiting_for_due.set()
+    await callback.answer()
 
 @dp.message_handler(state=AddTaskStates.waiting_for_description)
 async def add_task_desc(message: types.Message, state: FSMContext):
@@ -139,14 +207,44 @@ async def add_task_desc(message: types.Message, state: FSMContext):
         await AddTaskStates.waiting_for_title.set()
         return
 
+    await state.update_data(description=message.text.strip())
+    await message.reply(DUE_PROMPT, reply_markup=due_keyboard())
+    await AddTaskStates.waiting_for_due.set()
+
+@dp.message_handler(state=AddTaskStates.waiting_for_due)
+async def add_task_due(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    if is_back(text):
+        # вернуться к вводу описания
+        await ask_description(message)
+        return
+    # кнопка меню вместо срока — выходим из диалога и выполняем её
+    if text in MENU_ROUTES:
+        await state.finish()
+        await MENU_ROUTES[text](message)
+        return
+
+    due_at = None
+    if text != "Без срока":
+        now = time.time()
+        due_at = parse_due(text, now)
+        if due_at is None:
+            await message.reply("Не удалось разобрать срок. " + DUE_PROMPT)
+            return
+        if due_at <= now:
+            await message.reply("Этот срок уже прошёл. Укажите время в будущем.")
+            return
+
     try:
         data = await state.get_data()
-        desc = message.text.strip()
-        await db.add_task(message.from_user.id, data["title"], data["category"], desc)
-        await message.reply(
-            f"Задача '{data['title']}' добавлена в категорию '{CATEGORY_RU.get(data['category'], data['category'])}'.",
-            reply_markup=main_menu(message.from_user.id)
-        )
+        # ответ собирается до записи: ошибка в нём не должна оставить добавленную задачу без ответа
+        text = f"Задача '{data['title']}' добавлена в категорию '{CATEGORY_RU.get(data['category'], data['category'])}'."
+        if due_at is not None:
+            text += f" Срок: {format_due(due_at)} (UTC)."
+        await db.add_task(message.from_user.id, data["title"], data["category"], data.get("description", ""), due_at)
+        if due_at is not None:
+            reminders.notify(due_at)
+        await message.reply(text, reply_markup=main_menu(message.from_user.id))
     except Exception:
         logging.exception("Ошибка при добавлении задачи")
         await message.reply("Ошибка при добавлении задачи. Попробуйте ещё раз.", reply_markup=main_menu(message.from_user.id))
@@ -154,56 +252,295 @@ async def add_task_desc(message: types.Message, state: FSMContext):
         await state.finish()
 
 # ===== List Tasks =====
-@dp.message_handler(lambda m: m.text == "📋 Мои задачи")
+# Список задач — одно сообщение на страницу, навигация и действия правят его на месте.
+# Состояние страницы живёт в callback_data (лимит Telegram — 64 байта):
+#   list:<mode>:<status>:<category>:<created_at>:<id>
+# mode: f — первая страница, a — страница, начиная с задачи (включительно),
+#       n — задачи старше курсора, p — задачи новее курсора.
+# status: a — все, o — открытые, d — готовые; category: ключ категории или "-".
+# Кнопки действий: close_<id>:<status>:<category>:<created_at>:<id> — после действия
+# перерисовывается та же страница (с её первой задачи).
+STATUS_FILTERS = {"a": None, "o": "open", "d": "done"}
+STATUS_FILTER_RU = {"a": "Все", "o": "Открытые", "d": "Готовые"}
+
+def shorten(text: str, limit: int) -> str:
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+def task_line(r, date_format: str) -> str:
+    task_id, title, desc, category, status, created = r
+    created_str = datetime.datetime.utcfromtimestamp(created).strftime(date_format)
+    line = (
+        f"{'✅' if status == 'done' else '🔸'} #{task_id} — {shorten(title, 100)}\n"
+        f"    {CATEGORY_RU.get(category, category)} · {created_str}"
+    )
+    if desc:
+        line += f"\n    {shorten(desc, 80)}"
+    return line
+
+async def render_tasks_page(
+    user_id: int,
+    mode: str = "f",
+    status: str = "a",
+    category: str = "-",
+    cursor=None,
+    selected: set | None = None,
+    confirm_purge: bool = False,
+):
+    """
+    Возвращает (text, kb) для страницы списка задач.
+    selected — режим множественного выбора (id отмеченных задач), confirm_purge — запрос
+    подтверждения удаления готовых задач.
+    """
+    filters = dict(status=STATUS_FILTERS[status], category=None if category == "-" else category)
+    page_size = await db.get_user_setting(user_id, "page_size") or LIST_PAGE_SIZE
+    date_format = await db.get_user_setting(user_id, "date_format")
+    if mode == "n":
+        rows = await db.list_tasks(user_id, page_size, before=cursor, **filters)
+    elif mode == "p":
+        rows = await db.list_tasks(user_id, page_size, after=cursor, **filters)
+        if len(rows) < page_size:
+            # у начала списка — просто первая страница, чтобы она не была короткой
+            rows = await db.list_tasks(user_id, page_size, **filters)
+    elif mode == "a":
+        # (created_at, id) <= курсора — то же, что < (created_at, id + 1): id целые
+        rows = await db.list_tasks(user_id, page_size, before=(cursor[0], cursor[1] + 1), **filters)
+    else:
+        rows = await db.list_tasks(user_id, page_size, **filters)
+
+    kb = types.InlineKeyboardMarkup()
+    page_state = f"{status}:{category}"
+    anchor = f"{page_state}:0:0"
+    if rows:
+        first, last = (rows[0][5], rows[0][0]), (rows[-1][5], rows[-1][0])
+        anchor = f"{page_state}:{first[0]}:{first[1]}"
+        for r in rows:
+            task_id, status_ = r[0], r[4]
+            if selected is not None:
+                mark = "☑️" if task_id in selected else "⬜"
+                kb.row(types.InlineKeyboardButton(f"{mark} #{task_id}", callback_data=f"pick_{task_id}:{anchor}"))
+                continue
+            buttons = []
+            if status_ != "done":
+                buttons.append(types.InlineKeyboardButton(f"✅ #{task_id}", callback_data=f"close_{task_id}:{anchor}"))
+            buttons.append(types.InlineKeyboardButton(f"❌ #{task_id}", callback_data=f"delete_{task_id}:{anchor}"))
+            kb.row(*buttons)
+
+        has_prev = bool(await db.list_tasks(user_id, 1, after=first, **filters))
+        has_next = bool(await db.list_tasks(user_id, 1, before=last, **filters))
+        nav = []
+        if has_prev:
+            nav.append(types.InlineKeyboardButton("◀️", callback_data=f"list:p:{page_state}:{first[0]}:{first[1]}"))
+        if has_next:
+            nav.append(types.InlineKeyboardButton("▶️", callback_data=f"list:n:{page_state}:{last[0]}:{last[1]}"))
+        if nav:
+            kb.row(*nav)
+        text = "Ваши задачи:\n\n" + "\n".join(task_line(r, date_format) for r in rows)
+    else:
+        text = "Нет задач с таким фильтром."
+
+    kb.row(*[
+        types.InlineKeyboardButton(("• " if k == status else "") + v, callback_data=f"list:f:{k}:{category}:0:0")
+        for k, v in STATUS_FILTER_RU.items()
+    ])
+    # повторное нажатие на выбранную категорию снимает фильтр
+    kb.row(*[
+        types.InlineKeyboardButton(
+            ("• " if c == category else "") + CATEGORY_RU[c],
+            callback_data=f"list:f:{status}:{'-' if c == category else c}:0:0"
+        )
+        for c in CATEGORIES
+    ])
+
+    # массовые действия: bulk:<action>:<status>:<category>:<created_at>:<id>
+    if selected is not None:
+        kb.row(
+            types.InlineKeyboardButton(f"✅ Закрыть ({len(selected)})", callback_data=f"bulk:close:{anchor}"),
+            types.InlineKeyboardButton(f"❌ Удалить ({len(selected)})", callback_data=f"bulk:delete:{anchor}"),
+        )
+        kb.row(types.InlineKeyboardButton("Отмена", callback_data=f"bulk:cancel:{anchor}"))
+    elif confirm_purge:
+        kb.row(
+            types.InlineKeyboardButton("Да, удалить все готовые", callback_data=f"bulk:purge_ok:{anchor}"),
+            types.InlineKeyboardButton("Отмена", callback_data=f"bulk:cancel:{anchor}"),
+        )
+    else:
+        kb.row(
+            types.InlineKeyboardButton("☑️ Выбрать", callback_data=f"bulk:select:{anchor}"),
+            types.InlineKeyboardButton("🧹 Удалить готовые", callback_data=f"bulk:purge:{anchor}"),
+        )
+        if category != "-":
+            kb.row(types.InlineKeyboardButton(
+                f"✅ Закрыть все: {CATEGORY_RU[category]}", callback_data=f"bulk:close_cat:{anchor}"
+            ))
+    return text, kb
+
+def parse_page_state(parts: list):
+    """[status, category, created_at, id] из callback_data -> (status, category, cursor)."""
+    status, category, created, task_id = parts
+    if status not in STATUS_FILTERS or (category != "-" and category not in CATEGORY_RU):
+        raise ValueError(f"bad page state: {parts}")
+    return status, category, (int(created), int(task_id))
+
+async def get_selection(state: FSMContext) -> set | None:
+    """id задач, отмеченных в режиме выбора, или None, если режим выключен."""
+    selected = (await state.get_data()).get("selected")
+    return None if selected is None else set(selected)
+
+async def set_selection(state: FSMContext, selected: set | None):
+    data = await state.get_data()
+    new = sorted(selected) if selected is not None else None
+    if data.get("selected") == new:
+        return  # «📋 Мои задачи» и листание без выбора не трогают FSM
+    data.pop("selected", None)
+    if new is not None:
+        data["selected"] = new
+    await state.set_data(data)
+
 async def list_tasks(message: types.Message):
+    await set_selection(dp.current_state(), None)
     try:
-        rows = await db.list_tasks(message.from_user.id)
+        if not await db.list_tasks(message.from_user.id, 1):
+            await message.reply("У вас пока нет задач.", reply_markup=main_menu(message.from_user.id))
+            return
+        text, kb = await render_tasks_page(message.from_user.id)
     except Exception:
         logging.exception("Ошибка при получении задач пользователя %s", message.from_user.id)
         await message.reply("Не удалось получить список задач. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
         return
+    await message.reply(text, reply_markup=kb)
 
-    if not rows:
-        await message.reply("У вас пока нет задач.", reply_markup=main_menu(message.from_user.id))
-        return
-    for r in rows:
-        task_id, title, desc, category, status, created = r
-        created_str = datetime.datetime.fromisoformat(created).strftime("%m/%d/%Y")
-        text = (
-            f"#{task_id} — {title}\n"
-            f"Категория: {CATEGORY_RU.get(category, category)}\n"
-            f"Статус: {'Готово' if status=='done' else 'Открыто'}\n"
-            f"Создано: {created_str}\n"
-            f"{desc or ''}"
-        )
-        kb = types.InlineKeyboardMarkup()
-        if status != "done":
-            kb.add(types.InlineKeyboardButton("✅ Закрыть", callback_data=f"close_{task_id}"))
-        kb.add(types.InlineKeyboardButton("❌ Удалить", callback_data=f"delete_{task_id}"))
-        await message.reply(text, reply_markup=kb)
+async def edit_page(message: types.Message, text: str, kb: types.InlineKeyboardMarkup):
+    try:
+        await message.edit_text(text, reply_markup=kb)
+    except MessageNotModified:
+        pass
+
+async def list_page(callback: types.CallbackQuery):
+    try:
+        _, mode, *state = callback.data.split(":")
+        status, category, cursor = parse_page_state(state)
+        selected = await get_selection(dp.current_state())
+        text, kb = await render_tasks_page(callback.from_user.id, mode, status, category, cursor, selected)
+        await edit_page(callback.message, text, kb)
+    except Exception:
+        logging.exception("Ошибка при переключении страницы %s", callback.data)
+        await callback.message.edit_text("Не удалось получить список задач. Попробуйте позже.")
+    finally:
+        await callback.answer()
 
-@dp.callback_query_handler(lambda c: c.data.startswith("close_") or c.data.startswith("delete_"))
 async def task_action(callback: types.CallbackQuery):
+    notice = None
     try:
-        action, task_id = callback.data.split("_", 1)
+        action, rest = callback.data.split("_", 1)
+        task_id, *state = rest.split(":")
         task_id = int(task_id)
         if action == "close":
             await db.close_task(task_id, callback.from_user.id)
-            await callback.message.edit_text(f"✅ Задача #{task_id} закрыта.")
+            notice = f"✅ Задача #{task_id} закрыта."
         elif action == "delete":
             await db.delete_task(task_id, callback.from_user.id)
-            await callback.message.edit_text(f"🗑️ Задача #{task_id} удалена.")
+            notice = f"🗑️ Задача #{task_id} удалена."
+
+        if state:
+            status, category, cursor = parse_page_state(state)
+            text, kb = await render_tasks_page(callback.from_user.id, "a", status, category, cursor)
+            await edit_page(callback.message, text, kb)
+        else:
+            # кнопки из старых сообщений (по одной задаче на сообщение)
+            await callback.message.edit_text(notice)
+            notice = None
     except Exception:
         logging.exception("Ошибка при действии над задачей %s", callback.data)
         await callback.message.edit_text("Ошибка при обработке операции с задачей.")
+    finally:
+        await callback.answer(notice)
+
+async def pick_task(callback: types.CallbackQuery):
+    """Отметка задачи в режиме выбора: pick_<id>:<status>:<category>:<created_at>:<id>."""
+    try:
+        task_id, *page = callback.data[len("pick_"):].split(":")
+        status, category, cursor = parse_page_state(page)
+        state = dp.current_state()
+        selected = await get_selection(state) or set()
+        selected ^= {int(task_id)}
+        await set_selection(state, selected)
+        text, kb = await render_tasks_page(callback.from_user.id, "a", status, category, cursor, selected)
+        await edit_page(callback.message, text, kb)
+    except Exception:
+        logging.exception("Ошибка при выборе задачи %s", callback.data)
+        await callback.message.edit_text("Ошибка при обработке операции с задачей.")
     finally:
         await callback.answer()
 
+async def bulk_action(callback: types.CallbackQuery):
+    """
+    Массовые действия над списком: close / delete — отмеченные задачи, close_cat — все открытые
+    в категории фильтра, purge / purge_ok — удаление всех готовых (с подтверждением),
+    select / cancel — вход в режим выбора и выход из него.
+    Каждое действие — один UPDATE/DELETE; в ответе число затронутых задач и время.
+    """
+    notice = None
+    try:
+        _, action, *page = callback.data.split(":")
+        status, category, cursor = parse_page_state(page)
+        user_id = callback.from_user.id
+        state = dp.current_state()
+        selected = await get_selection(state)
+        confirm_purge = False
+        count = None
+
+        started = time.perf_counter()
+        if action == "select":
+            selected = set()
+        elif action == "cancel":
+            selected = None
+        elif action == "purge":
+            confirm_purge = True
+        elif action == "purge_ok":
+            count = await db.delete_tasks(user_id, status="done")
+            notice = f"🧹 Удалено готовых задач: {count}"
+        elif action == "close_cat" and category != "-":
+            count = await db.close_tasks(user_id, category=category)
+            notice = f"✅ Закрыто задач: {count}"
+        elif action in ("close", "delete") and not selected:
+            notice = "Сначала отметьте задачи."
+        elif action == "close":
+            count = await db.close_tasks(user_id, ids=sorted(selected))
+            notice = f"✅ Закрыто задач: {count}"
+            selected = None
+        elif action == "delete":
+            count = await db.delete_tasks(user_id, ids=sorted(selected))
+            notice = f"❌ Удалено задач: {count}"
+            selected = None
+        else:
+            raise ValueError(f"unknown bulk action: {callback.data}")
+        if count is not None:
+            notice += f" за {(time.perf_counter() - started) * 1000:.0f} мс."
+
+        await set_selection(state, selected)
+        mode = "f" if cursor == (0, 0) else "a"
+        text, kb = await render_tasks_page(user_id, mode, status, category, cursor, selected, confirm_purge)
+        await edit_page(callback.message, text, kb)
+    except Exception:
+        logging.exception("Ошибка при массовом действии %s", callback.data)
+        await callback.message.edit_text("Ошибка при обработке операции с задачами.")
+    finally:
+        await callback.answer(notice)
+
 # ===== Stats =====
-@dp.message_handler(lambda m: m.text == "📊 Статистика")
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+STATS_WEEKS = 8
+
+def sparkline(values: list) -> str:
+    top = max(values) or 1
+    return "".join(SPARK_CHARS[round(v / top * (len(SPARK_CHARS) - 1))] for v in values)
+
 async def stats(message: types.Message):
+    today = int(time.time()) // 86400
+    first_day = today - STATS_WEEKS * 7 + 1
     try:
-        rows = await db.stats_by_category(message.from_user.id)
+        rows = await db.stats_by_category_status(message.from_user.id)
+        daily = await db.daily_stats(message.from_user.id, first_day)
     except Exception:
         logging.exception("Ошибка при получении статистики для %s", message.from_user.id)
         await message.reply("Не удалось получить статистику. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
@@ -212,67 +549,154 @@ async def stats(message: types.Message):
     if not rows:
         await message.reply("Нет задач для статистики.", reply_markup=main_menu(message.from_user.id))
         return
+
+    by_category: dict = {}
+    open_count = done_count = 0
+    for category, status, count in rows:
+        by_category[category] = by_category.get(category, 0) + count
+        if status == "done":
+            done_count += count
+        else:
+            open_count += count
+
+    weekly = [0] * STATS_WEEKS
+    for day, _created, closed in daily:
+        weekly[(day - first_day) // 7] += closed
+
     text = "Статистика по категориям:\n"
-    for r in rows:
-        text += f"{CATEGORY_RU.get(r[0], r[0])}: {r[1]}\n"
+    for category, count in by_category.items():
+        text += f"{CATEGORY_RU.get(category, category)}: {count}\n"
+    text += (
+        f"\nОткрыто: {open_count}, готово: {done_count}\n"
+        f"Выполнено: {done_count * 100 // (open_count + done_count)}%\n"
+        f"Закрыто по неделям ({STATS_WEEKS} нед.): {sparkline(weekly)} ({weekly[-1]} за последнюю)\n"
+    )
     await message.reply(text, reply_markup=main_menu(message.from_user.id))
 
 # ===== Admin =====
-@dp.message_handler(lambda m: m.text == "⚙️ Админка")
 async def admin_menu(message: types.Message):
     if message.from_user.id not in ADMIN_IDS:
         await message.reply("Только админ может видеть это меню.")
         return
     kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
     kb.add("Отключить экспорт", "Включить экспорт")
+    kb.add("Включить профилирование", "Выключить профилирование")
     kb.add("⬅️ Назад")
     await message.reply("Меню администратора:", reply_markup=kb)
 
-@dp.message_handler(lambda m: m.text in ["Отключить экспорт", "Включить экспорт"])
 async def admin_toggle_export(message: types.Message):
     if message.from_user.id not in ADMIN_IDS:
         return
     try:
         if message.text == "Отключить экспорт":
-            await db.set_setting("export_enabled", "0")
+            await db.set_setting("export_enabled", False)
             await message.reply("Экспорт отключён для всех пользователей.", reply_markup=main_menu(message.from_user.id))
         else:
-            await db.set_setting("export_enabled", "1")
+            await db.set_setting("export_enabled", True)
             await message.reply("Экспорт включён для всех пользователей.", reply_markup=main_menu(message.from_user.id))
     except Exception:
         logging.exception("Ошибка при переключении настройки экспорта")
         await message.reply("Не удалось изменить настройку. Проверьте логи.", reply_markup=main_menu(message.from_user.id))
 
+async def admin_toggle_profiling(message: types.Message):
+    """Выборочный cProfile хендлеров (в этом процессе); при выключении админ получает отчёт."""
+    if message.from_user.id not in ADMIN_IDS:
+        return
+    if message.text == "Включить профилирование":
+        metrics.profiler.start()
+        await message.reply(
+            f"Профилирование включено: в выборку попадает {metrics.profiler.sample_rate:.0%} вызовов хендлеров.",
+            reply_markup=main_menu(message.from_user.id)
+        )
+        return
+    report = metrics.profiler.stop()
+    await message.reply(shorten(report, 4000), reply_markup=main_menu(message.from_user.id))
+
+# ===== User settings =====
+PAGE_SIZE_OPTIONS = [5, 10, 20]
+DATE_FORMAT_OPTIONS = {
+    "%m/%d/%Y": "MM/DD/YYYY",
+    "%d.%m.%Y": "DD.MM.YYYY",
+    "%Y-%m-%d": "YYYY-MM-DD",
+}
+
+async def user_settings_keyboard(user_id: int):
+    page_size = await db.get_user_setting(user_id, "page_size") or LIST_PAGE_SIZE
+    date_format = await db.get_user_setting(user_id, "date_format")
+    kb = types.InlineKeyboardMarkup()
+    kb.row(*[
+        types.InlineKeyboardButton(("• " if n == page_size else "") + f"{n} на странице", callback_data=f"uset:page_size:{n}")
+        for n in PAGE_SIZE_OPTIONS
+    ])
+    # формат даты передаётся индексом: "%" и "/" в callback_data лучше не гонять
+    kb.row(*[
+        types.InlineKeyboardButton(("• " if fmt == date_format else "") + label, callback_data=f"uset:date_format:{i}")
+        for i, (fmt, label) in enumerate(DATE_FORMAT_OPTIONS.items())
+    ])
+    return kb
+
+async def user_settings(message: types.Message):
+    try:
+        kb = await user_settings_keyboard(message.from_user.id)
+    except Exception:
+        logging.exception("Ошибка при чтении настроек пользователя %s", message.from_user.id)
+        await message.reply("Не удалось прочитать настройки. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
+        return
+    await message.reply("Настройки:", reply_markup=kb)
+
+async def user_settings_change(callback: types.CallbackQuery):
+    try:
+        _, key, value = callback.data.split(":", 2)
+        if key == "page_size" and int(value) in PAGE_SIZE_OPTIONS:
+            await db.set_user_setting(callback.from_user.id, key, int(value))
+        elif key == "date_format":
+            await db.set_user_setting(callback.from_user.id, key, list(DATE_FORMAT_OPTIONS)[int(value)])
+        else:
+            raise ValueError(f"unknown setting: {callback.data}")
+        await edit_page(callback.message, "Настройки:", await user_settings_keyboard(callback.from_user.id))
+    except Exception:
+        logging.exception("Ошибка при изменении настройки %s", callback.data)
+        await callback.message.edit_text("Не удалось изменить настройку. Попробуйте позже.")
+    finally:
+        await callback.answer()
+
 # ===== Search =====
-@dp.message_handler(lambda m: m.text == "🔍 Поиск")
 async def search_request(message: types.Message):
-    await message.reply("Введите текст для поиска:", reply_markup=types.ReplyKeyboardRemove())
-
-@dp.message_handler(lambda m: m.text not in ["➕ Добавить задачу","📋 Мои задачи","📊 Статистика","🔍","📤 Экспорт в Google Sheets"])
-async def search_process(message: types.Message):
+    kb = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    kb.add("⬅️ Назад")
+    await message.reply("Введите текст для поиска:", reply_markup=kb)
+    await SearchStates.waiting_for_query.set()
+
+@dp.message_handler(state=SearchStates.waiting_for_query)
+async def search_process(message: types.Message, state: FSMContext):
+    await state.finish()
+    # кнопка меню вместо запроса — выходим из поиска и выполняем её
+    if message.text in MENU_ROUTES:
+        await MENU_ROUTES[message.text](message)
+        return
     q = message.text.strip()
     if not q:
         return
     try:
-        tasks = await db.search_tasks(message.from_user.id, q)
+        exact = await db.find_exact_task(message.from_user.id, q)
+        tasks = [] if exact else await db.search_tasks(message.from_user.id, q, scan_max=SEARCH_SCAN_MAX)
     except Exception:
         logging.exception("Ошибка при поиске в БД для пользователя %s", message.from_user.id)
         await message.reply("Ошибка при поиске. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
         return
 
-    exact = [r for r in tasks if r[1].lower() == q.lower()]
     if exact:
-        r = exact[0]
         await message.reply(
-            f"Найдена задача: #{r[0]} — {r[1]}\n{r[2]}",
+            f"Найдена задача: #{exact[0]} — {exact[1]}\n{exact[2]}",
             reply_markup=main_menu(message.from_user.id)
         )
         return
 
     try:
-        # Для простого ТЗ достаточно fuzzy поиска через find_similar_titles.
-        # В проде лучше использовать полнотекстовый поиск (pg_trgm / elastic).
-        matches = find_similar_titles(q, tasks, limit=5, score_cutoff=60)
+        # у больших списков кандидаты уже отобраны trigram-индексом, fuzzy ранжирует только их
+        matches = find_similar_titles(
+            q, tasks, limit=5, score_cutoff=60, description_weight=SEARCH_DESCRIPTION_WEIGHT, workers=SEARCH_WORKERS
+        )
     except Exception:
         logging.exception("Ошибка при работе с find_similar_titles")
         await message.reply("Ошибка при обработке запроса поиска.", reply_markup=main_menu(message.from_user.id))
@@ -288,74 +712,280 @@ async def search_process(message: types.Message):
     await message.reply(text, reply_markup=main_menu(message.from_user.id))
 
 # ===== Export =====
-async def export_worker(user_id: int, username: str, tasks: list):
+async def export_worker(user_id: int, username: str):
     """
-    Фоновая задача экспорта.
-    В проде: вынести в отдельный воркер (Celery / RQ) с Redis/Broker — чтобы не блокировать процесс и не терять задания при рестарте.
-    Здесь: запускаем в event loop и используем to_thread для вызова blocking-IO кода.
+    Обработчик задания из очереди экспорта (см. ExportQueue).
+    Задачи читаются в момент выполнения, а не в момент нажатия кнопки.
+    Исключения пробрасываются наверх — очередь сама решает, повторять ли задание.
     """
-    try:
-        result = await asyncio.to_thread(export_tasks_to_sheet, GOOGLE_SA_FILE, SHEET_ID, tasks, username)
-        sheet_url: Optional[str] = None
-        extra_info = None
-
-        if isinstance(result, str):
-            sheet_url = result
-        elif isinstance(result, dict):
-            sheet_url = result.get("url")
-            extra_info = result.get("tab") or result.get("gid") or result.get("tab_name")
-            if not sheet_url and SHEET_ID:
-                # если вернули gid или tab_name, соберём базовую ссылку на SHEET_ID
-                sheet_url = f"https://docs.google.com/spreadsheets/d/{SHEET_ID}/edit"
-                if extra_info and str(extra_info).isdigit():
-                    sheet_url += f"#gid={extra_info}"
-
-        # уведомляем пользователя о результате
-        if sheet_url:
-            text = f"✅ Экспорт завершён. Открыть таблицу: {sheet_url}"
-            if extra_info:
-                text += f"\nВкладка: {extra_info}"
-            await safe_send(user_id, text, reply_markup=main_menu(user_id))
-        else:
-            # если ничего не удалось извлечь
-            await safe_send(user_id, "✅ Экспорт завершён, но ссылка не получена. Проверьте Google Sheets.", reply_markup=main_menu(user_id))
+    if not await db.list_tasks(user_id, 1):
+        await safe_send(user_id, "Нет задач для экспорта.", reply_markup=main_menu(user_id))
+        return
+
+    date_format = await db.get_user_setting(user_id, "date_format")
+    if EXPORT_BACKEND != "sheets":
+        await export_file(user_id, date_format)
+        return
 
-    except Exception as e:
-        logging.exception("Ошибка при экспорте задач для пользователя %s: %s", user_id, traceback.format_exc())
-        await safe_send(user_id, f"❌ Ошибка при экспорте: {e}. Проверьте логи.", reply_markup=main_menu(user_id))
+    result = await sync_user_sheet(
+        db, export_queue.run_blocking, GOOGLE_SA_FILE, SHEET_ID, user_id, username,
+        SHEETS_CHUNK_ROWS, date_format,
+        incremental=SHEETS_SYNC_MODE == "incremental", full_resync_ratio=SHEETS_FULL_RESYNC_RATIO,
+    )
+    logging.info("Экспорт для %s: записано ячеек %s", user_id, result["cells"])
+    await safe_send(
+        user_id,
+        f"✅ Экспорт завершён. Открыть таблицу: {result['url']}\nВкладка: {result['tab']}",
+        reply_markup=main_menu(user_id),
+    )
 
-@dp.message_handler(lambda m: m.text == "📤 Экспорт в Google Sheets")
-async def export_tasks(message: types.Message):
+async def export_file(user_id: int, date_format: str):
+    """Выгрузка в CSV/XLSX (EXPORT_BACKEND): файл собирается во временном файле и отправляется документом."""
+    result = await export_tasks_to_file(
+        db, export_queue.run_blocking, user_id, EXPORT_BACKEND, EXPORT_FILE_CHUNK_ROWS, date_format
+    )
+    path = result["path"]
     try:
-        export_enabled = await db.get_setting("export_enabled")
-    except Exception:
-        logging.exception("Ошибка при чтении настройки export_enabled")
-        await message.reply("Не удалось прочитать настройку экспорта. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
-        return
+        size = os.path.getsize(path)
+        logging.info("Экспорт в файл для %s: строк %s, %s байт", user_id, result["rows"], size)
+        # свой сервер Bot API принимает файлы до 2 ГБ, публичный — до 50 МБ
+        if not TELEGRAM_API_SERVER and size > MAX_DOCUMENT_BYTES:
+            await safe_send(
+                user_id,
+                f"❌ Файл выгрузки слишком большой для Telegram ({size // 2**20} МБ).",
+                reply_markup=main_menu(user_id),
+            )
+            return
+        # у InputFile нет close(): файл открываем сами, чтобы дескриптор закрылся и при ошибке отправки
+        with open(path, "rb") as f:
+            await bot.send_document(
+                user_id, types.InputFile(f, filename=result["filename"]),
+                caption=f"✅ Экспорт завершён: {result['rows']} задач.",
+                reply_markup=main_menu(user_id),
+            )
+    finally:
+        os.remove(path)
+
+def is_retryable_export_error(exc: Exception) -> bool:
+    # флуд-контроль и сетевые ошибки при отправке файла тоже стоит повторить
+    return is_retryable_error(exc) or isinstance(exc, (RetryAfter, NetworkError))
+
+async def export_failed(user_id: int, e: Exception):
+    await safe_send(user_id, f"❌ Ошибка при экспорте: {e}. Проверьте логи.", reply_markup=main_menu(user_id))
+
+export_queue = ExportQueue(
+    db,
+    export_worker,
+    on_failure=export_failed,
+    is_retryable=is_retryable_export_error,
+    concurrency=EXPORT_WORKERS,
+    max_attempts=EXPORT_MAX_ATTEMPTS,
+    backoff=EXPORT_RETRY_BACKOFF,
+    lease=EXPORT_LEASE,
+)
+
+async def on_export_setting_changed(key: str, enabled: bool):
+    # пока экспорт отключён, задания остаются в очереди и выполнятся после включения
+    if enabled:
+        export_queue.resume()
+    else:
+        export_queue.pause()
+    logging.info("Экспорт %s", "включён" if enabled else "отключён")
+
+db.subscribe("export_enabled", on_export_setting_changed)
+
+# ===== Reminders =====
+# Напоминания о сроках уходят фоновым приоритетом: ответы пользователям важнее
+async def send_reminder(user_id: int, text: str):
+    # в отличие от safe_send ошибки пробрасываются: планировщик вернёт напоминания в очередь
+    await bot.send_message(user_id, text, priority=BACKGROUND)
+
+def is_retryable_reminder_error(exc: Exception) -> bool:
+    # бот заблокирован пользователем, чат не найден — повтор не поможет
+    return not isinstance(exc, (Unauthorized, BadRequest))
+
+reminders = ReminderScheduler(
+    db,
+    send_reminder,
+    batch_size=REMINDER_BATCH_SIZE,
+    max_sleep=REMINDER_MAX_SLEEP,
+    retry_delay=REMINDER_RETRY_DELAY,
+    is_retryable=is_retryable_reminder_error,
+)
 
-    if export_enabled == "0":
+async def export_tasks(message: types.Message):
+    if not db.setting("export_enabled"):
         await message.reply("Экспорт отключён администратором.", reply_markup=main_menu(message.from_user.id))
         return
 
     try:
-        tasks = await db.get_all_tasks_for_user(message.from_user.id)
+        created = await export_queue.submit(message.from_user.id, message.from_user.username or str(message.from_user.id))
     except Exception:
-        logging.exception("Ошибка при получении задач для экспорта пользователя %s", message.from_user.id)
-        await message.reply("Не удалось получить задачи для экспорта. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
-        return
-
-    if not tasks:
-        await message.reply("Нет задач для экспорта.", reply_markup=main_menu(message.from_user.id))
+        logging.exception("Ошибка при постановке экспорта в очередь для пользователя %s", message.from_user.id)
+        await message.reply("Не удалось запустить экспорт. Попробуйте позже.", reply_markup=main_menu(message.from_user.id))
         return
 
     # экспорт в фоне — пользователь получит уведомление, когда экспорт завершится с ссылкой
-    await message.reply("Экспорт задач запущен в фоне. Я пришлю ссылку, когда всё будет готово.", reply_markup=main_menu(message.from_user.id))
+    if created:
+        await message.reply("Экспорт задач запущен в фоне. Я пришлю результат, когда всё будет готово.", reply_markup=main_menu(message.from_user.id))
+    else:
+        await message.reply("Экспорт уже стоит в очереди. Я пришлю результат, когда всё будет готово.", reply_markup=main_menu(message.from_user.id))
+
+# ===== Routing =====
+# Кнопки меню и callback_data разбираются одним поиском в словаре вместо цепочки
+# lambda-фильтров, которые aiogram проверял бы по очереди для каждого апдейта.
+async def back_to_menu(message: types.Message):
+    await message.reply("Возврат в главное меню.", reply_markup=main_menu(message.from_user.id))
+
+MENU_ROUTES = {
+    "➕ Добавить задачу": add_task_start,
+    "📋 Мои задачи": list_tasks,
+    "📊 Статистика": stats,
+    "🔍 Поиск": search_request,
+    "📤 Экспорт": export_tasks,
+    "📤 Экспорт в Google Sheets": export_tasks,  # кнопка из клавиатур, отправленных до переименования
+    "⚙️ Настройки": user_settings,
+    "⚙️ Админка": admin_menu,
+    "Отключить экспорт": admin_toggle_export,
+    "Включить экспорт": admin_toggle_export,
+    "Включить профилирование": admin_toggle_profiling,
+    "Выключить профилирование": admin_toggle_profiling,
+    "⬅️ Назад": back_to_menu,
+}
 
-    # в проде: запустить задание в очереди (Celery/RQ). Здесь — легковесный фон внутри процесса:
-    asyncio.create_task(export_worker(message.from_user.id, message.from_user.username or str(message.from_user.id), tasks))
+# префикс callback_data (до первого ":" или "_") -> обработчик
+CALLBACK_ROUTES = {
+    "list": list_page,
+    "close": task_action,
+    "delete": task_action,
+    "uset": user_settings_change,
+    "pick": pick_task,
+    "bulk": bulk_action,
+}
+CALLBACK_PREFIX = re.compile(r"[a-z]+")
+
+# регистрируются последними: команды и шаги диалогов (со своими state) проверяются раньше
+@dp.message_handler()
+async def route_message(message: types.Message):
+    handler = MENU_ROUTES.get(message.text)
+    if handler is None:
+        await message.reply("Выберите действие в меню. Для поиска нажмите «🔍 Поиск».", reply_markup=main_menu(message.from_user.id))
+        return
+    await handler(message)
+
+# инлайн-кнопки относятся к своему сообщению, а не к диалогу, поэтому работают в любом состоянии
+@dp.callback_query_handler(state="*")
+async def route_callback(callback: types.CallbackQuery):
+    prefix = CALLBACK_PREFIX.match(callback.data or "")
+    handler = CALLBACK_ROUTES.get(prefix.group() if prefix else None)
+    if handler is None:
+        await callback.answer()
+        return
+    await handler(callback)
+
+# ===== Metrics =====
+# Хендлеры оборачиваются после регистрации: и зарегистрированные в dp, и вызываемые через таблицы маршрутов.
+# Сами маршрутизаторы не оборачиваются, чтобы время не считалось дважды.
+for routes in (MENU_ROUTES, CALLBACK_ROUTES):
+    for key, handler in routes.items():
+        routes[key] = metrics.instrument_handler(handler)
+metrics.instrument_dispatcher(dp, skip={route_message, route_callback})
+metrics.instrument_db(db)
+metrics.profiler.sample_rate = PROFILE_SAMPLE_RATE
+if isinstance(storage, SQLiteStorage):
+    metrics.Gauge("bot_fsm_dialogs_active", "Незавершённые диалоги FSM в кэше", fn=storage.active_dialogs)
+metrics.Gauge("bot_send_queue_depth", "Сообщения, ожидающие отправки", fn=bot.scheduler.pending)
+metrics.Gauge("bot_export_paused", "Очередь экспорта на паузе", fn=lambda: int(export_queue.paused))
+metrics_runner = None
 
 # ===== Main =====
+async def on_startup(_):
+    global metrics_runner
+    await db.init()
+    db.start_settings_watch(SETTINGS_POLL_INTERVAL)
+    reminders.start()
+    if isinstance(storage, SQLiteStorage):
+        storage.start()
+    if METRICS_PORT:
+        metrics_runner = await metrics.start_server(METRICS_HOST, METRICS_PORT)
+    if not db.setting("export_enabled"):
+        export_queue.pause()
+    await export_queue.start()
+
+async def on_shutdown(_):
+    await reminders.stop()
+    await export_queue.stop()
+    # executor закрывает storage только после on_shutdown, а к тому моменту БД уже закрыта
+    await storage.close()
+    await db.close()
+    await bot.scheduler.stop(SHUTDOWN_TIMEOUT)
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+async def on_startup_webhook(dp_):
+    await on_startup(dp_)
+    await bot.set_webhook(
+        WEBHOOK_HOST + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+    )
+
+async def on_shutdown_webhook(dp_):
+    # вебхук не снимаем: пока бот перезапускается, Telegram копит апдейты у себя
+    await BotWebhookHandler.drain(SHUTDOWN_TIMEOUT)
+    await on_shutdown(dp_)
+
+async def run_sharded():
+    """
+    Фронт мульти-процессного режима (BOT_WORKERS > 1): сам апдейты не обрабатывает,
+    а раздаёт их воркерам по from_user.id. Каждый воркер запускает on_startup/on_shutdown у себя.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    router = ShardRouter(BOT_WORKERS, SHUTDOWN_TIMEOUT)
+    router.start()
+    try:
+        if BOT_MODE == "webhook":
+            runner = web.AppRunner(webhook_front_app(router, WEBHOOK_PATH, WEBHOOK_SECRET))
+            await runner.setup()
+            await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+            await bot.set_webhook(
+                WEBHOOK_HOST + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+            )
+            await stop.wait()
+            await runner.cleanup()
+        else:
+            polling = asyncio.create_task(run_polling_front(bot, router))
+            await stop.wait()
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+    finally:
+        await router.stop()
+        await (await bot.get_session()).close()
+
 if __name__ == "__main__":
-    async def on_startup(_):
-        await db.init()
-    executor.start_polling(dp, skip_updates=True, on_startup=on_startup)
\ No newline at end of file
+    if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+        # без секрета любой, кто знает адрес вебхука, может слать боту апдейты от имени пользователей
+        raise SystemExit("BOT_MODE=webhook требует WEBHOOK_SECRET")
+    if BOT_WORKERS > 1:
+        asyncio.run(run_sharded())
+    elif BOT_MODE == "webhook":
+        BotWebhookHandler.secret_token = WEBHOOK_SECRET
+        # executor.start_webhook не принимает свой request_handler, поэтому собираем Executor вручную
+        webhook_executor = executor.Executor(dp, skip_updates=False)
+        webhook_executor.on_startup(on_startup_webhook, polling=False)
+        webhook_executor.on_shutdown(on_shutdown_webhook, polling=False)
+        webhook_executor.start_webhook(
+            WEBHOOK_PATH,
+            request_handler=BotWebhookHandler,
+            host=WEBAPP_HOST,
+            port=WEBAPP_PORT,
+            shutdown_timeout=SHUTDOWN_TIMEOUT,
+        )
+    else:
+        executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
@@ -8,4 +8,62 @@ DB_PATH = os.getenv("DB_PATH", "/data/tasks.db")
 GOOGLE_SA_FILE = os.getenv("GOOGLE_SA_FILE", "/secrets/google-sa.json")
 SHEET_ID = os.getenv("SHEET_ID")
 ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
-EXPORT_ENABLED_KEY = "export_enabled"
\ No newline at end of file
+EXPORT_ENABLED_KEY = "export_enabled"
+SHEETS_CHUNK_ROWS = int(os.getenv("SHEETS_CHUNK_ROWS", "5000"))
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))
+EXPORT_MAX_ATTEMPTS = int(os.getenv("EXPORT_MAX_ATTEMPTS", "5"))
+EXPORT_RETRY_BACKOFF = float(os.getenv("EXPORT_RETRY_BACKOFF", "10"))
+EXPORT_LEASE = float(os.getenv("EXPORT_LEASE", "60"))  # аренда задания экспорта, продлевается каждые lease/3
+EXPORT_BACKEND = os.getenv("EXPORT_BACKEND", "sheets")  # sheets / csv / xlsx
+EXPORT_FILE_CHUNK_ROWS = int(os.getenv("EXPORT_FILE_CHUNK_ROWS", "1000"))
+SEARCH_DESCRIPTION_WEIGHT = float(os.getenv("SEARCH_DESCRIPTION_WEIGHT", "0"))
+# потоков для cdist в fuzzy-поиске: кандидатов не больше SEARCH_SCAN_MAX, на таких объёмах потоки
+# окупаются только на многоядерной машине; -1 — по числу ядер
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "1"))
+SEARCH_SCAN_MAX = int(os.getenv("SEARCH_SCAN_MAX", "5000"))  # до скольких задач искать без trigram-индекса
+SEARCH_CACHE_USERS = int(os.getenv("SEARCH_CACHE_USERS", "1000"))  # для скольких пользователей держать задачи для поиска
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "10"))
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+DB_COMMIT_DELAY = float(os.getenv("DB_COMMIT_DELAY", "0.005"))
+KNOWN_USERS_CACHE = int(os.getenv("KNOWN_USERS_CACHE", "100000"))
+SETTINGS_POLL_INTERVAL = float(os.getenv("SETTINGS_POLL_INTERVAL", "5"))
+SHEETS_SYNC_MODE = os.getenv("SHEETS_SYNC_MODE", "incremental")  # incremental / full
+SHEETS_FULL_RESYNC_RATIO = float(os.getenv("SHEETS_FULL_RESYNC_RATIO", "0.5"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))  # напоминаний за одно пробуждение
+REMINDER_MAX_SLEEP = float(os.getenv("REMINDER_MAX_SLEEP", "60"))
+REMINDER_RETRY_DELAY = float(os.getenv("REMINDER_RETRY_DELAY", "30"))  # пауза после ошибки отправки напоминаний
+
+# Состояния FSM (незавершённые диалоги): sqlite — в той же БД, redis — в Redis-совместимом хранилище
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_TTL = float(os.getenv("FSM_TTL", "86400"))  # через сколько секунд брошенный диалог удаляется
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "600"))
+
+# Свой сервер Bot API (self-hosted telegram-bot-api или локальная заглушка для нагрузочных прогонов)
+TELEGRAM_API_SERVER = os.getenv("TELEGRAM_API_SERVER", "")  # например http://localhost:8081
+
+# Лимиты исходящих сообщений Telegram (сообщений в секунду)
+TG_GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "30"))
+TG_CHAT_RATE = float(os.getenv("TG_CHAT_RATE", "1"))
+TG_CHAT_BURST = float(os.getenv("TG_CHAT_BURST", "3"))
+TG_GLOBAL_BURST = float(os.getenv("TG_GLOBAL_BURST", "1"))  # сколько сообщений разом после паузы
+
+# Метрики в формате Prometheus: http://METRICS_HOST:METRICS_PORT/metrics, порт 0 — выключено
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9090"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0.01"))  # доля хендлеров под cProfile
+
+# Режим работы: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# > 1 — фронт-процесс раздаёт апдейты BOT_WORKERS процессам по from_user.id
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "")  # публичный https-адрес, например https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
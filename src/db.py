@@ -1,5 +1,13 @@
+import asyncio
+import contextlib
 import aiosqlite
+from cachetools import LRUCache
 import datetime
+import json
+import logging
+import time
+
+from search import TitleIndex
 
 CREATE_USERS = """
 CREATE TABLE IF NOT EXISTS users (
@@ -10,6 +18,7 @@ CREATE TABLE IF NOT EXISTS users (
 );
 """
 
+# Исходная схема (версия 0); все дальнейшие изменения — через MIGRATIONS ниже
 CREATE_TASKS = """
 CREATE TABLE IF NOT EXISTS tasks (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -29,86 +38,1093 @@ CREATE TABLE IF NOT EXISTS settings (
 );
 """
 
+CREATE_EXPORT_JOBS = """
+CREATE TABLE IF NOT EXISTS export_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_telegram_id INTEGER,
+    username TEXT,
+    status TEXT DEFAULT 'queued',
+    attempts INTEGER DEFAULT 0,
+    run_after REAL DEFAULT 0,
+    error TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_export_jobs_queue ON export_jobs (status, run_after);
+"""
+
+# Полнотекстовый индекс (trigram) по заголовку и описанию задач.
+# external content: текст хранится только в tasks, индекс синхронизируется триггерами.
+CREATE_TASKS_FTS = """
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    user_telegram_id UNINDEXED,
+    title,
+    description,
+    content='tasks',
+    content_rowid='id',
+    tokenize='trigram'
+)
+"""
+
+TASKS_FTS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, user_telegram_id, title, description)
+        VALUES (new.id, new.user_telegram_id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, user_telegram_id, title, description)
+        VALUES ('delete', old.id, old.user_telegram_id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF user_telegram_id, title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, user_telegram_id, title, description)
+        VALUES ('delete', old.id, old.user_telegram_id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, user_telegram_id, title, description)
+        VALUES (new.id, new.user_telegram_id, new.title, new.description);
+    END
+    """,
+]
+
+# Сколько кандидатов из индекса отдавать в fuzzy-ранжирование
+SEARCH_SHORTLIST = 200
+# До скольких задач пользователя поиск ранжирует все его задачи, минуя trigram-индекс
+SEARCH_SCAN_MAX = 5000
+
+
+def normalize_title(title: str) -> str:
+    """Нормализованный заголовок для точного поиска без учёта регистра (SQLite NOCASE не знает кириллицу)."""
+    return (title or "").strip().lower()
+
+
+def like_escape(text: str) -> str:
+    """Экранирует %, _ и \\ для LIKE ... ESCAPE '\\': подстрока ищется буквально."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def fts_query(q: str) -> str | None:
+    """Запрос к trigram-индексу: OR по всем триграммам строки, чтобы находить и варианты с опечатками."""
+    q = q.strip().lower()
+    grams = dict.fromkeys(q[i:i + 3] for i in range(len(q) - 2))
+    grams = [g for g in grams if g.strip()]
+    if not grams:
+        return None
+    return " OR ".join('"' + g.replace('"', '""') + '"' for g in grams)
+
+
+# ====== Миграции ======
+# Версия схемы хранится в PRAGMA user_version. Миграция N переводит базу из версии N-1 в N;
+# каждая выполняется в своей транзакции вместе с обновлением user_version.
+# Новые миграции — только в конец списка, уже выпущенные не меняем.
+
+async def _migrate_search(conn):
+    """v1: колонка title_norm для точного поиска и trigram FTS-индекс (с заполнением для старых баз)."""
+    cur = await conn.execute("PRAGMA table_info(tasks)")
+    columns = {r[1] for r in await cur.fetchall()}
+    if "title_norm" not in columns:
+        await conn.execute("ALTER TABLE tasks ADD COLUMN title_norm TEXT")
+        cur = await conn.execute("SELECT id, title FROM tasks")
+        rows = await cur.fetchall()
+        await conn.executemany(
+            "UPDATE tasks SET title_norm=? WHERE id=?",
+            [(normalize_title(title), task_id) for task_id, title in rows]
+        )
+
+    cur = await conn.execute("SELECT 1 FROM sqlite_master WHERE name='tasks_fts'")
+    fts_exists = await cur.fetchone() is not None
+    await conn.execute(CREATE_TASKS_FTS)
+    for trigger in TASKS_FTS_TRIGGERS:
+        await conn.execute(trigger)
+    if not fts_exists:
+        await conn.execute("INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')")
+
+
+async def _migrate_epoch_and_indexes(conn):
+    """
+    v2: created_at хранится как INTEGER (unix epoch) вместо ISO-строки
+    и составные индексы под запросы по пользователю.
+    Тип колонки в SQLite не поменять через ALTER, поэтому таблица пересоздаётся.
+    """
+    await conn.execute("""
+        CREATE TABLE tasks_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_telegram_id INTEGER,
+            title TEXT,
+            title_norm TEXT,
+            description TEXT,
+            category TEXT,
+            status TEXT DEFAULT 'open',
+            created_at INTEGER
+        )
+    """)
+    await conn.execute("""
+        INSERT INTO tasks_new (id, user_telegram_id, title, title_norm, description, category, status, created_at)
+        SELECT id, user_telegram_id, title, title_norm, description, category, status,
+               CAST(strftime('%s', created_at) AS INTEGER)
+        FROM tasks
+    """)
+    await conn.execute("DROP TABLE tasks")
+    await conn.execute("ALTER TABLE tasks_new RENAME TO tasks")
+    # триггеры и индексы удалились вместе со старой таблицей; id сохранены, поэтому FTS пересобирать не нужно
+    for trigger in TASKS_FTS_TRIGGERS:
+        await conn.execute(trigger)
+    await conn.execute("CREATE INDEX idx_tasks_user_title_norm ON tasks (user_telegram_id, title_norm)")
+    await conn.execute("CREATE INDEX idx_tasks_user_created ON tasks (user_telegram_id, created_at)")
+    await conn.execute("CREATE INDEX idx_tasks_user_status_category ON tasks (user_telegram_id, status, category)")
+
+
+async def _migrate_list_filter_indexes(conn):
+    """v3: индексы под постраничный список с фильтром по статусу или категории."""
+    await conn.execute("CREATE INDEX idx_tasks_user_status_created ON tasks (user_telegram_id, status, created_at)")
+    await conn.execute("CREATE INDEX idx_tasks_user_category_created ON tasks (user_telegram_id, category, created_at)")
+
+
+async def _migrate_user_settings(conn):
+    """v4: персональные настройки пользователей."""
+    await conn.execute("""
+        CREATE TABLE user_settings (
+            user_telegram_id INTEGER,
+            key TEXT,
+            value TEXT,
+            PRIMARY KEY (user_telegram_id, key)
+        )
+    """)
+
+
+async def _migrate_sheet_sync(conn):
+    """v5: updated_at у задач и состояние инкрементальной синхронизации с Google Sheets."""
+    await conn.execute("ALTER TABLE tasks ADD COLUMN updated_at INTEGER")
+    await conn.execute("UPDATE tasks SET updated_at = created_at")
+    await conn.execute("CREATE INDEX idx_tasks_user_updated ON tasks (user_telegram_id, updated_at)")
+    # watermark — момент последней синхронизации; всё, что изменилось позже, уходит в следующую
+    await conn.execute("""
+        CREATE TABLE sheet_sync (
+            user_telegram_id INTEGER PRIMARY KEY,
+            tab TEXT,
+            date_format TEXT,
+            watermark INTEGER
+        )
+    """)
+    # в какой строке вкладки лежит задача
+    await conn.execute("""
+        CREATE TABLE sheet_rows (
+            user_telegram_id INTEGER,
+            task_id INTEGER,
+            row_num INTEGER,
+            PRIMARY KEY (user_telegram_id, task_id)
+        )
+    """)
+
+
+# Счётчики user_stats / user_daily_stats поддерживаются триггерами на tasks,
+# поэтому статистика читается за O(число категорий), а не GROUP BY по всей истории.
+# День — номер суток от эпохи (unixtime / 86400, UTC).
+USER_STATS_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO user_stats (user_telegram_id, category, status, count)
+        VALUES (new.user_telegram_id, new.category, new.status, 1)
+        ON CONFLICT (user_telegram_id, category, status) DO UPDATE SET count = count + 1;
+        INSERT INTO user_daily_stats (user_telegram_id, day, created, closed)
+        VALUES (new.user_telegram_id, new.created_at / 86400, 1, 0)
+        ON CONFLICT (user_telegram_id, day) DO UPDATE SET created = created + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_ad AFTER DELETE ON tasks BEGIN
+        UPDATE user_stats SET count = count - 1
+        WHERE user_telegram_id = old.user_telegram_id AND category IS old.category AND status IS old.status;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_au AFTER UPDATE OF user_telegram_id, category, status ON tasks BEGIN
+        UPDATE user_stats SET count = count - 1
+        WHERE user_telegram_id = old.user_telegram_id AND category IS old.category AND status IS old.status;
+        INSERT INTO user_stats (user_telegram_id, category, status, count)
+        VALUES (new.user_telegram_id, new.category, new.status, 1)
+        ON CONFLICT (user_telegram_id, category, status) DO UPDATE SET count = count + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS user_stats_closed AFTER UPDATE OF status ON tasks
+    WHEN new.status = 'done' AND old.status IS NOT 'done' BEGIN
+        INSERT INTO user_daily_stats (user_telegram_id, day, created, closed)
+        VALUES (new.user_telegram_id, COALESCE(new.updated_at, CAST(strftime('%s', 'now') AS INTEGER)) / 86400, 0, 1)
+        ON CONFLICT (user_telegram_id, day) DO UPDATE SET closed = closed + 1;
+    END
+    """,
+]
+
+REBUILD_USER_STATS = [
+    "DELETE FROM user_stats",
+    """
+    INSERT INTO user_stats (user_telegram_id, category, status, count)
+    SELECT user_telegram_id, category, status, COUNT(*) FROM tasks GROUP BY user_telegram_id, category, status
+    """,
+]
+
+
+async def _migrate_user_stats(conn):
+    """
+    v6: материализованная статистика. Дневные бакеты закрытия для старых задач
+    восстанавливаются приблизительно — по updated_at закрытых задач.
+    """
+    await conn.execute("""
+        CREATE TABLE user_stats (
+            user_telegram_id INTEGER,
+            category TEXT,
+            status TEXT,
+            count INTEGER,
+            PRIMARY KEY (user_telegram_id, category, status)
+        )
+    """)
+    await conn.execute("""
+        CREATE TABLE user_daily_stats (
+            user_telegram_id INTEGER,
+            day INTEGER,
+            created INTEGER,
+            closed INTEGER,
+            PRIMARY KEY (user_telegram_id, day)
+        )
+    """)
+    for sql in REBUILD_USER_STATS:
+        await conn.execute(sql)
+    await conn.execute("""
+        INSERT INTO user_daily_stats (user_telegram_id, day, created, closed)
+        SELECT user_telegram_id, day, SUM(created), SUM(closed) FROM (
+            SELECT user_telegram_id, created_at / 86400 AS day, 1 AS created, 0 AS closed FROM tasks
+            UNION ALL
+            SELECT user_telegram_id, updated_at / 86400, 0, 1 FROM tasks WHERE status = 'done'
+        ) GROUP BY user_telegram_id, day
+    """)
+    for trigger in USER_STATS_TRIGGERS:
+        await conn.execute(trigger)
+
+
+async def _migrate_fsm_states(conn):
+    """v7: состояния FSM (диалоги добавления задач) переживают перезапуск бота."""
+    await conn.execute("""
+        CREATE TABLE fsm_states (
+            chat_id INTEGER,
+            user_id INTEGER,
+            state TEXT,
+            data BLOB,
+            bucket BLOB,
+            updated_at INTEGER,
+            PRIMARY KEY (chat_id, user_id)
+        ) WITHOUT ROWID
+    """)
+    await conn.execute("CREATE INDEX idx_fsm_states_updated ON fsm_states (updated_at)")
+
+
+# Условие частичного индекса idx_tasks_pending_reminders (миграция v8). Запросы повторяют его
+# дословно — иначе SQLite не сможет доказать, что индекс подходит.
+PENDING_REMINDERS = "due_at IS NOT NULL AND reminded_at IS NULL AND status = 'open'"
+
+
+async def _migrate_due_dates(conn):
+    """
+    v8: срок задачи и напоминание о нём. Частичный индекс содержит только задачи, напоминание
+    по которым ещё впереди, поэтому ближайшее напоминание и пачка наступивших берутся из него
+    за O(log n) независимо от числа задач без срока, закрытых и уже напомненных.
+    """
+    await conn.execute("ALTER TABLE tasks ADD COLUMN due_at INTEGER")
+    await conn.execute("ALTER TABLE tasks ADD COLUMN reminded_at INTEGER")
+    await conn.execute(
+        "CREATE INDEX idx_tasks_pending_reminders ON tasks (due_at) "
+        "WHERE due_at IS NOT NULL AND reminded_at IS NULL AND status = 'open'"
+    )
+
+
+async def _migrate_export_leases(conn):
+    """
+    v9: аренда заданий экспорта. Воркер записывает в задание свой идентификатор и срок аренды
+    и продлевает её, пока выполняет задание. В очередь возвращаются только задания с истёкшей
+    арендой — брошенные упавшим процессом, а не выполняющиеся в соседнем воркере.
+    Задания, оставшиеся в running от старых версий, получают lease_until = 0 и считаются брошенными.
+    """
+    await conn.execute("ALTER TABLE export_jobs ADD COLUMN worker TEXT")
+    await conn.execute("ALTER TABLE export_jobs ADD COLUMN lease_until REAL DEFAULT 0")
+
+
+MIGRATIONS = [
+    _migrate_search,
+    _migrate_epoch_and_indexes,
+    _migrate_list_filter_indexes,
+    _migrate_user_settings,
+    _migrate_sheet_sync,
+    _migrate_user_stats,
+    _migrate_fsm_states,
+    _migrate_due_dates,
+    _migrate_export_leases,
+]
+
+# ====== Настройки ======
+# ключ -> (тип, значение по умолчанию); в таблицах значения хранятся строками
+SETTINGS_SCHEMA = {
+    "export_enabled": (bool, True),
+}
+
+# None — значение по умолчанию задаёт вызывающий код (например, LIST_PAGE_SIZE из конфига)
+USER_SETTINGS_SCHEMA = {
+    "page_size": (int, None),
+    "date_format": (str, "%m/%d/%Y"),
+}
+
+
+def encode_setting(value) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value)
+
+
+def decode_setting(schema: dict, key: str, raw: str | None):
+    kind, default = schema.get(key, (str, None))
+    if raw is None:
+        return default
+    if kind is bool:
+        return raw == "1"
+    try:
+        return kind(raw)
+    except ValueError:
+        logging.warning("Некорректное значение настройки %s=%r, используется значение по умолчанию", key, raw)
+        return default
+
+
+# Общие настройки соединений: WAL позволяет читать параллельно с записью,
+# synchronous=NORMAL в WAL-режиме безопасен и не делает fsync на каждый коммит.
+CONNECTION_PRAGMAS = [
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA cache_size = -20000",    # ~20 МБ страничного кэша на соединение
+    "PRAGMA mmap_size = 268435456",  # 256 МБ
+    "PRAGMA busy_timeout = 5000",
+]
+
+
 class DB:
-    def __init__(self, path):
+    """
+    Одно соединение на запись (self.conn) и пул соединений только для чтения.
+    Чтения идут параллельно в потоках читателей, записи от разных корутин
+    попадают в одну транзакцию и коммитятся пачкой (group commit) раз в commit_delay секунд.
+    Каждый метод записи — целостная операция (_write): в общую транзакцию она попадает целиком
+    или не попадает вовсе.
+    """
+
+    def __init__(
+        self, path, readers: int = 4, commit_delay: float = 0.005, known_users: int = 100_000, search_cache: int = 1000
+    ):
         self.path = path
         self.conn = None
+        self.readers = max(1, readers)
+        self.commit_delay = commit_delay
+        self._read_pool: asyncio.Queue | None = None
+        self._read_conns: list = []
+        self._commit_future: asyncio.Future | None = None
+        self._write_lock: asyncio.Lock | None = None
+        # telegram_id -> username уже записанных пользователей: повторный /start не ходит в БД
+        self._known_users = LRUCache(maxsize=known_users)
+        # (telegram_id, username) -> upsert в процессе: одновременные /start одного пользователя ждут его
+        self._pending_users: dict[tuple, asyncio.Task] = {}
+        # Кэш настроек: глобальные грузятся целиком при старте, пользовательские — по требованию.
+        # Обновляются в set_setting/set_user_setting, изменения из других процессов
+        # подхватывает watch_settings через PRAGMA data_version.
+        self._settings: dict[str, str] = {}
+        self._user_settings = LRUCache(maxsize=known_users)
+        # telegram_id -> все задачи пользователя с нормализованными заголовками (TitleIndex) для поиска
+        # по небольшим спискам; сбрасывается любой записью в задачи пользователя, а изменения из
+        # других процессов — вместе с настройками по PRAGMA data_version.
+        self._search_index = LRUCache(maxsize=search_cache) if search_cache > 0 else None
+        # растёт при каждом сбросе: чтение, начатое до записи, не положит в кэш устаревший список
+        self._search_epoch = 0
+        self._subscribers: dict[str, list] = {}
+        self._data_version: int | None = None
+        self._watch_task: asyncio.Task | None = None
+
+    async def _connect(self, readonly: bool = False):
+        if readonly:
+            conn = await aiosqlite.connect(f"file:{self.path}?mode=ro", uri=True)
+        else:
+            conn = await aiosqlite.connect(self.path)
+        # busy_timeout — первым: переключение в WAL тоже ждёт блокировку, если база занята другим процессом
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        if not readonly:
+            await conn.execute("PRAGMA journal_mode = WAL")
+            await conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
 
     async def init(self):
-        self.conn = await aiosqlite.connect(self.path)
-        await self.conn.execute("PRAGMA foreign_keys = ON;")
-        await self.conn.executescript(CREATE_USERS + CREATE_TASKS + CREATE_SETTINGS)
+        self._write_lock = asyncio.Lock()
+        self.conn = await self._connect()
+        await self.conn.executescript(CREATE_USERS + CREATE_TASKS + CREATE_SETTINGS + CREATE_EXPORT_JOBS)
         await self.conn.commit()
-        # настройка экспорта по умолчанию
-        cur = await self.conn.execute("SELECT value FROM settings WHERE key=?", ("export_enabled",))
-        row = await cur.fetchone()
-        if not row:
-            await self.conn.execute("INSERT INTO settings (key, value) VALUES (?, ?)", ("export_enabled", "1"))
-            await self.conn.commit()
+        await self._migrate()
+        # настройка экспорта по умолчанию (OR IGNORE — воркеры могут стартовать одновременно)
+        await self.conn.execute("INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)", ("export_enabled", "1"))
+        await self.conn.commit()
+        await self._load_settings()
+
+        # читатели открываются после миграций, чтобы сразу видеть актуальную схему
+        self._read_pool = asyncio.Queue()
+        self._read_conns = [await self._connect(readonly=True) for _ in range(self.readers)]
+        for conn in self._read_conns:
+            self._read_pool.put_nowait(conn)
+
+    async def close(self):
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+        if self._commit_future is not None:
+            await self._flush()
+        for conn in self._read_conns:
+            await conn.close()
+        self._read_conns = []
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    # ====== Пул чтения и group commit ======
+    @contextlib.asynccontextmanager
+    async def _reader(self):
+        conn = await self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put_nowait(conn)
+
+    async def _fetchall(self, sql: str, params=()):
+        async with self._reader() as conn:
+            cur = await conn.execute(sql, params)
+            return await cur.fetchall()
+
+    async def _fetchone(self, sql: str, params=()):
+        async with self._reader() as conn:
+            cur = await conn.execute(sql, params)
+            return await cur.fetchone()
+
+    @contextlib.asynccontextmanager
+    async def _write(self, savepoint: bool = True):
+        """
+        Одна операция записи (один или несколько запросов) внутри общей транзакции group commit.
+        Операции выполняются по очереди под write lock, и _flush коммитит только между ними,
+        поэтому коммит не разрежет операцию пополам. Операция из нескольких запросов — SAVEPOINT:
+        при исключении откатываются только её запросы, записи других корутин в той же транзакции
+        остаются. Одиночному запросу SAVEPOINT не нужен (SQLite и так откатывает упавший запрос),
+        такие операции передают savepoint=False. По выходу из блока ждёт коммита (см. _commit).
+        """
+        async with self._write_lock:
+            if not self.conn.in_transaction:
+                # без открытой транзакции SAVEPOINT начал бы свою, и RELEASE закоммитил бы её сразу
+                await self.conn.execute("BEGIN")
+            if not savepoint:
+                yield self.conn
+            else:
+                await self.conn.execute("SAVEPOINT op")
+                try:
+                    yield self.conn
+                except BaseException:
+                    await self.conn.execute("ROLLBACK TO op")
+                    await self.conn.execute("RELEASE op")
+                    raise
+                await self.conn.execute("RELEASE op")
+        await self._commit()
+
+    async def _commit(self):
+        """
+        Коммит записи через group commit: первая запись в окне планирует коммит через commit_delay,
+        остальные присоединяются к той же транзакции. Возвращает управление, когда данные закоммичены.
+        """
+        if self._commit_future is None:
+            loop = asyncio.get_running_loop()
+            self._commit_future = loop.create_future()
+            loop.call_later(self.commit_delay, lambda: asyncio.ensure_future(self._flush()))
+        await asyncio.shield(self._commit_future)
+
+    async def _flush(self):
+        future, self._commit_future = self._commit_future, None
+        if future is None:
+            return
+        async with self._write_lock:
+            try:
+                await self.conn.commit()
+            except Exception as e:
+                logging.exception("Ошибка group commit")
+                await self.conn.rollback()
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    async def _migrate(self):
+        # несколько процессов (BOT_WORKERS) могут стартовать одновременно: версия перечитывается
+        # под блокировкой записи (BEGIN IMMEDIATE), поэтому каждую миграцию выполняет только один
+        while True:
+            await self.conn.execute("BEGIN IMMEDIATE")
+            cur = await self.conn.execute("PRAGMA user_version")
+            version = (await cur.fetchone())[0]
+            if version >= len(MIGRATIONS):
+                await self.conn.rollback()
+                return
+            target = version + 1
+            try:
+                await MIGRATIONS[version](self.conn)
+                await self.conn.execute(f"PRAGMA user_version = {target}")
+                await self.conn.commit()
+            except Exception:
+                await self.conn.rollback()
+                raise
+            logging.info("Схема БД обновлена до версии %s", target)
 
     async def ensure_user(self, tg_id: int, username: str | None):
-        cur = await self.conn.execute("SELECT id FROM users WHERE telegram_id=?", (tg_id,))
-        row = await cur.fetchone()
-        if not row:
-            await self.conn.execute("INSERT INTO users (telegram_id, username) VALUES (?, ?)", (tg_id, username or ""))
-            await self.conn.commit()
+        """Регистрирует пользователя или обновляет его username одним upsert; известных пропускает без запроса."""
+        username = username or ""
+        if self._known_users.get(tg_id) == username:
+            return
+        key = (tg_id, username)
+        task = self._pending_users.get(key)
+        if task is None:
+            task = self._pending_users[key] = asyncio.ensure_future(self._upsert_user(tg_id, username))
+            task.add_done_callback(lambda _: self._pending_users.pop(key, None))
+        await asyncio.shield(task)
 
-    async def add_task(self, tg_id: int, title: str, category: str, description: str = ""):
-        created = datetime.datetime.utcnow().isoformat()
-        await self.conn.execute(
-            "INSERT INTO tasks (user_telegram_id, title, description, category, status, created_at) VALUES (?, ?, ?, ?, 'open', ?)",
-            (tg_id, title, description, category, created)
-        )
-        await self.conn.commit()
+    async def _upsert_user(self, tg_id: int, username: str):
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "INSERT INTO users (telegram_id, username) VALUES (?, ?) "
+                "ON CONFLICT(telegram_id) DO UPDATE SET username=excluded.username",
+                (tg_id, username)
+            )
+        self._known_users[tg_id] = username
 
-    async def list_tasks(self, tg_id: int):
-        cur = await self.conn.execute(
-            "SELECT id, title, description, category, status, created_at FROM tasks WHERE user_telegram_id=? ORDER BY created_at DESC",
-            (tg_id,)
+    def _forget_search_index(self, tg_id: int | None = None):
+        """Сбрасывает кэш поиска пользователя (или всех, если tg_id не задан)."""
+        if self._search_index is None:
+            return
+        self._search_epoch += 1
+        if tg_id is None:
+            self._search_index.clear()
+        else:
+            self._search_index.pop(tg_id, None)
+
+    async def add_task(self, tg_id: int, title: str, category: str, description: str = "", due_at: int | None = None):
+        created = int(time.time())
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "INSERT INTO tasks (user_telegram_id, title, title_norm, description, category, status, created_at, updated_at, due_at) "
+                "VALUES (?, ?, ?, ?, ?, 'open', ?, ?, ?)",
+                (tg_id, title, normalize_title(title), description, category, created, created, due_at)
+            )
+        self._forget_search_index(tg_id)
+
+    async def add_tasks(self, tg_id: int, category: str, items: list) -> int:
+        """Добавляет пачку задач [(title, description), ...] одной транзакцией."""
+        created = int(time.time())
+        async with self._write() as conn:
+            await conn.executemany(
+                "INSERT INTO tasks (user_telegram_id, title, title_norm, description, category, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'open', ?, ?)",
+                [(tg_id, title, normalize_title(title), desc, category, created, created) for title, desc in items]
+            )
+        self._forget_search_index(tg_id)
+        return len(items)
+
+    async def list_tasks(
+        self,
+        tg_id: int,
+        limit: int | None = None,
+        before: tuple[int, int] | None = None,
+        after: tuple[int, int] | None = None,
+        status: str | None = None,
+        category: str | None = None,
+    ):
+        """
+        Задачи пользователя от новых к старым, с keyset-пагинацией по (created_at, id).
+        before — задачи старше курсора, after — новее курсора (ближайшие к нему limit штук).
+        Результат всегда отсортирован от новых к старым.
+        """
+        where = ["user_telegram_id=?"]
+        params: list = [tg_id]
+        if status:
+            where.append("status=?")
+            params.append(status)
+        if category:
+            where.append("category=?")
+            params.append(category)
+        if before:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(before)
+        if after:
+            where.append("(created_at, id) > (?, ?)")
+            params.extend(after)
+        order = "ASC" if after else "DESC"
+        sql = (
+            "SELECT id, title, description, category, status, created_at FROM tasks "
+            f"WHERE {' AND '.join(where)} ORDER BY created_at {order}, id {order}"
         )
-        return await cur.fetchall()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = await self._fetchall(sql, params)
+        if after:
+            rows.reverse()
+        return rows
 
     async def get_all_tasks_for_user(self, tg_id: int):
-        cur = await self.conn.execute(
+        return await self._fetchall(
             "SELECT id, title, description, category, status, created_at FROM tasks WHERE user_telegram_id=?",
             (tg_id,)
         )
-        return await cur.fetchall()
+
+    async def iter_tasks_for_user(self, tg_id: int, chunk_size: int = 1000):
+        """
+        Те же строки, что get_all_tasks_for_user, но порциями по chunk_size (fetchmany) —
+        для выгрузок, которым не нужен весь список в памяти. Порядок — по индексу
+        (user_telegram_id, created_at): ORDER BY id заставил бы SQLite сначала отсортировать
+        все строки во временном B-tree. Читающее соединение занято до конца итерации.
+        """
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT id, title, description, category, status, created_at FROM tasks "
+                "WHERE user_telegram_id=? ORDER BY created_at, id",
+                (tg_id,)
+            ) as cur:
+                while True:
+                    rows = await cur.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
 
     async def stats_by_category(self, tg_id: int):
-        cur = await self.conn.execute(
-            "SELECT category, COUNT(*) FROM tasks WHERE user_telegram_id=? GROUP BY category",
+        return await self._fetchall(
+            "SELECT category, SUM(count) FROM user_stats WHERE user_telegram_id=? "
+            "GROUP BY category HAVING SUM(count) > 0",
             (tg_id,)
         )
-        return await cur.fetchall()
 
-    async def search_tasks(self, tg_id: int, q: str):
-        cur = await self.conn.execute(
-            "SELECT id, title, description, category, status, created_at FROM tasks WHERE user_telegram_id=?",
+    async def stats_by_category_status(self, tg_id: int):
+        """[(category, status, count), ...] из материализованных счётчиков."""
+        return await self._fetchall(
+            "SELECT category, status, count FROM user_stats WHERE user_telegram_id=? AND count > 0",
             (tg_id,)
         )
-        return await cur.fetchall()
 
-    async def close_task(self, task_id: int, tg_id: int):
-        await self.conn.execute(
-            "UPDATE tasks SET status='done' WHERE id=? AND user_telegram_id=?",
-            (task_id, tg_id)
+    async def daily_stats(self, tg_id: int, since_day: int):
+        """[(day, created, closed), ...] начиная с since_day (номер суток от эпохи)."""
+        return await self._fetchall(
+            "SELECT day, created, closed FROM user_daily_stats WHERE user_telegram_id=? AND day>=? ORDER BY day",
+            (tg_id, since_day)
         )
-        await self.conn.commit()
+
+    async def check_stats(self, rebuild: bool = False):
+        """
+        Сверяет user_stats с пересчётом по tasks. Возвращает расхождения
+        [(tg_id, category, status, materialized, actual), ...]; при rebuild=True пересобирает счётчики.
+        """
+        # сверка и пересборка — одна операция: между ними не вклинится запись, меняющая счётчики
+        async with self._write() as conn:
+            cur = await conn.execute("""
+                SELECT user_telegram_id, category, status, SUM(m), SUM(a) FROM (
+                    SELECT user_telegram_id, category, status, count AS m, 0 AS a FROM user_stats
+                    UNION ALL
+                    SELECT user_telegram_id, category, status, 0, COUNT(*) FROM tasks
+                    GROUP BY user_telegram_id, category, status
+                ) GROUP BY user_telegram_id, category, status HAVING SUM(m) != SUM(a)
+            """)
+            mismatches = await cur.fetchall()
+            if mismatches and rebuild:
+                for sql in REBUILD_USER_STATS:
+                    await conn.execute(sql)
+        return mismatches
+
+    async def find_exact_task(self, tg_id: int, q: str):
+        """Задача с точно таким заголовком (без учёта регистра) — по индексу, без перебора."""
+        return await self._fetchone(
+            "SELECT id, title, description, category, status, created_at FROM tasks "
+            "WHERE user_telegram_id=? AND title_norm=? ORDER BY id LIMIT 1",
+            (tg_id, normalize_title(q))
+        )
+
+    async def count_tasks(self, tg_id: int) -> int:
+        """Число задач пользователя из материализованных счётчиков user_stats."""
+        row = await self._fetchone("SELECT COALESCE(SUM(count), 0) FROM user_stats WHERE user_telegram_id=?", (tg_id,))
+        return row[0]
+
+    async def search_tasks(self, tg_id: int, q: str, limit: int = SEARCH_SHORTLIST, scan_max: int = SEARCH_SCAN_MAX):
+        """
+        Кандидаты для fuzzy-поиска. Trigram-индекс общий для всех пользователей: MATCH перебирает
+        совпадения во всех задачах и только потом отбрасывает чужие, поэтому пользователю с
+        небольшим списком (не больше scan_max задач) выгоднее отдать все его задачи по индексу
+        пользователя; этот список кэшируется как TitleIndex до следующей записи в задачи пользователя.
+        Для больших списков — не больше limit лучших по bm25 кандидатов из индекса.
+        Для запросов короче трёх символов триграмм нет — ищем подстроку в заголовке.
+        """
+        match = fts_query(q)
+        if match is None:
+            return await self._fetchall(
+                "SELECT id, title, description, category, status, created_at FROM tasks "
+                "WHERE user_telegram_id=? AND title_norm LIKE ? ESCAPE '\\' LIMIT ?",
+                (tg_id, f"%{like_escape(normalize_title(q))}%", limit)
+            )
+        cached = self._search_index.get(tg_id) if self._search_index is not None else None
+        if cached is not None and len(cached) <= scan_max:
+            return cached
+        epoch = self._search_epoch
+        if await self.count_tasks(tg_id) <= scan_max:
+            rows = TitleIndex(await self.get_all_tasks_for_user(tg_id))
+            if self._search_index is not None and epoch == self._search_epoch:
+                self._search_index[tg_id] = rows
+            return rows
+        return await self._fetchall(
+            "SELECT t.id, t.title, t.description, t.category, t.status, t.created_at "
+            "FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid "
+            "WHERE tasks_fts MATCH ? AND t.user_telegram_id=? "
+            "ORDER BY bm25(tasks_fts) LIMIT ?",
+            (match, tg_id, limit)
+        )
+
+    async def close_task(self, task_id: int, tg_id: int):
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "UPDATE tasks SET status='done', updated_at=? WHERE id=? AND user_telegram_id=?",
+                (int(time.time()), task_id, tg_id)
+            )
+        self._forget_search_index(tg_id)
+
+    # ====== Напоминания ======
+    async def next_reminder_at(self) -> int | None:
+        """Срок ближайшего неотправленного напоминания (MIN по индексу) или None."""
+        row = await self._fetchone(f"SELECT MIN(due_at) FROM tasks WHERE {PENDING_REMINDERS}")
+        return row[0] if row else None
+
+    async def claim_due_reminders(self, now: int, limit: int):
+        """
+        Забирает до limit наступивших напоминаний (due_at <= now), самые ранние первыми, и помечает
+        их отправленными одним UPDATE ... RETURNING. Несколько процессов не получат одну задачу дважды.
+        Возвращает [(id, user_telegram_id, title, due_at)]. Неотправленные из-за ошибки возвращаются
+        в очередь release_reminders; если процесс упал после claim, напоминание не повторяется.
+        """
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute(
+                f"UPDATE tasks SET reminded_at=? WHERE id IN ("
+                f"SELECT id FROM tasks WHERE {PENDING_REMINDERS} AND due_at <= ? ORDER BY due_at LIMIT ?"
+                f") RETURNING id, user_telegram_id, title, due_at",
+                (now, now, limit)
+            )
+            rows = await cur.fetchall()
+        return rows
+
+    async def release_reminders(self, ids: list[int]):
+        """Возвращает забранные claim_due_reminders напоминания в очередь (отправка не удалась)."""
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "UPDATE tasks SET reminded_at=NULL WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(ids),)
+            )
 
     async def delete_task(self, task_id: int, tg_id: int):
-        await self.conn.execute(
-            "DELETE FROM tasks WHERE id=? AND user_telegram_id=?",
-            (task_id, tg_id)
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "DELETE FROM tasks WHERE id=? AND user_telegram_id=?",
+                (task_id, tg_id)
+            )
+        self._forget_search_index(tg_id)
+
+    async def close_tasks(self, tg_id: int, ids: list[int] | None = None, category: str | None = None) -> int:
+        """
+        Закрывает открытые задачи пользователя одним UPDATE: по списку ids и/или по категории.
+        Возвращает число закрытых задач.
+        """
+        where, params = ["user_telegram_id=?", "status!='done'"], [tg_id]
+        if ids is not None:
+            # json_each вместо IN (?, ?, ...) — без ограничения на число параметров
+            where.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(ids))
+        if category is not None:
+            where.append("category=?")
+            params.append(category)
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute(
+                f"UPDATE tasks SET status='done', updated_at=? WHERE {' AND '.join(where)}",
+                (int(time.time()), *params)
+            )
+        self._forget_search_index(tg_id)
+        return cur.rowcount
+
+    async def delete_tasks(self, tg_id: int, ids: list[int] | None = None, status: str | None = None) -> int:
+        """Удаляет задачи пользователя одним DELETE: по списку ids и/или по статусу. Возвращает число удалённых."""
+        where, params = ["user_telegram_id=?"], [tg_id]
+        if ids is not None:
+            where.append("id IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(ids))
+        if status is not None:
+            where.append("status=?")
+            params.append(status)
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute(f"DELETE FROM tasks WHERE {' AND '.join(where)}", params)
+        self._forget_search_index(tg_id)
+        return cur.rowcount
+
+    async def get_task_ids(self, tg_id: int) -> set[int]:
+        rows = await self._fetchall("SELECT id FROM tasks WHERE user_telegram_id=?", (tg_id,))
+        return {r[0] for r in rows}
+
+    async def get_tasks_updated_since(self, tg_id: int, since: int):
+        return await self._fetchall(
+            "SELECT id, title, description, category, status, created_at FROM tasks "
+            "WHERE user_telegram_id=? AND updated_at>=?",
+            (tg_id, since)
         )
-        await self.conn.commit()
+
+    async def get_tasks_by_ids(self, tg_id: int, ids: list[int]):
+        if not ids:
+            return []
+        return await self._fetchall(
+            "SELECT id, title, description, category, status, created_at FROM tasks "
+            "WHERE user_telegram_id=? AND id IN (SELECT value FROM json_each(?))",
+            (tg_id, json.dumps(ids))
+        )
+
+    # ====== Синхронизация с Google Sheets ======
+    async def get_sheet_sync(self, tg_id: int):
+        """Состояние последней синхронизации: (tab, date_format, watermark, {task_id: row_num}) или None."""
+        row = await self._fetchone(
+            "SELECT tab, date_format, watermark FROM sheet_sync WHERE user_telegram_id=?", (tg_id,)
+        )
+        if not row:
+            return None
+        rows = await self._fetchall("SELECT task_id, row_num FROM sheet_rows WHERE user_telegram_id=?", (tg_id,))
+        return (*row, dict(rows))
+
+    async def save_sheet_sync(
+        self,
+        tg_id: int,
+        tab: str,
+        date_format: str,
+        watermark: int,
+        rows: dict[int, int],
+        removed: set[int] = frozenset(),
+        full: bool = False,
+    ):
+        """
+        Сохраняет состояние синхронизации. rows — изменившиеся позиции задач (или все при full),
+        removed — задачи, которых больше нет на вкладке.
+        """
+        async with self._write() as conn:
+            if full:
+                await conn.execute("DELETE FROM sheet_rows WHERE user_telegram_id=?", (tg_id,))
+            await conn.execute(
+                "INSERT OR REPLACE INTO sheet_sync (user_telegram_id, tab, date_format, watermark) VALUES (?, ?, ?, ?)",
+                (tg_id, tab, date_format, watermark)
+            )
+            await conn.executemany(
+                "DELETE FROM sheet_rows WHERE user_telegram_id=? AND task_id=?",
+                [(tg_id, task_id) for task_id in removed]
+            )
+            await conn.executemany(
+                "INSERT OR REPLACE INTO sheet_rows (user_telegram_id, task_id, row_num) VALUES (?, ?, ?)",
+                [(tg_id, task_id, row_num) for task_id, row_num in rows.items()]
+            )
 
     # ====== Настройки админа ======
+    async def _load_settings(self):
+        cur = await self.conn.execute("SELECT key, value FROM settings")
+        self._settings = dict(await cur.fetchall())
+        cur = await self.conn.execute("PRAGMA data_version")
+        self._data_version = (await cur.fetchone())[0]
+
+    def setting(self, key: str):
+        """Типизированное значение настройки из кэша, без обращения к БД."""
+        return decode_setting(SETTINGS_SCHEMA, key, self._settings.get(key))
+
     async def get_setting(self, key: str) -> str | None:
-        cur = await self.conn.execute("SELECT value FROM settings WHERE key=?", (key,))
-        row = await cur.fetchone()
-        return row[0] if row else None
+        return self._settings.get(key)
+
+    async def set_setting(self, key: str, value):
+        raw = encode_setting(value)
+        async with self._write(savepoint=False) as conn:
+            await conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, raw))
+        if self._settings.get(key) != raw:
+            self._settings[key] = raw
+            await self._notify(key)
+
+    def subscribe(self, key: str, callback):
+        """callback(key, value) — корутина, вызывается после изменения настройки (в т.ч. другим процессом)."""
+        self._subscribers.setdefault(key, []).append(callback)
+
+    async def _notify(self, key: str):
+        value = self.setting(key)
+        for callback in self._subscribers.get(key, []):
+            try:
+                await callback(key, value)
+            except Exception:
+                logging.exception("Ошибка в подписчике настройки %s", key)
+
+    def start_settings_watch(self, interval: float = 5.0):
+        """Фоновая проверка PRAGMA data_version: если базу изменил другой процесс, настройки перечитываются."""
+        self._watch_task = asyncio.create_task(self._watch_settings(interval))
+
+    async def _watch_settings(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                cur = await self.conn.execute("PRAGMA data_version")
+                version = (await cur.fetchone())[0]
+                if version == self._data_version:
+                    continue
+                old = self._settings
+                await self._load_settings()
+                self._user_settings.clear()
+                self._forget_search_index()
+                for key in old.keys() | self._settings.keys():
+                    if old.get(key) != self._settings.get(key):
+                        await self._notify(key)
+            except Exception:
+                logging.exception("Ошибка при проверке изменений настроек")
+
+    # ====== Настройки пользователя ======
+    async def get_user_setting(self, tg_id: int, key: str):
+        values = self._user_settings.get(tg_id)
+        if values is None:
+            rows = await self._fetchall("SELECT key, value FROM user_settings WHERE user_telegram_id=?", (tg_id,))
+            values = self._user_settings[tg_id] = dict(rows)
+        return decode_setting(USER_SETTINGS_SCHEMA, key, values.get(key))
+
+    async def set_user_setting(self, tg_id: int, key: str, value):
+        raw = encode_setting(value)
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "INSERT INTO user_settings (user_telegram_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_telegram_id, key) DO UPDATE SET value=excluded.value",
+                (tg_id, key, raw)
+            )
+        values = self._user_settings.get(tg_id)
+        if values is not None:
+            values[key] = raw
+
+    # ====== Очередь экспорта ======
+    async def enqueue_export(self, tg_id: int, username: str) -> bool:
+        """
+        Ставит экспорт в очередь. Если у пользователя уже есть задание в статусе queued —
+        новое не создаётся (повторные нажатия сливаются в одно задание).
+        Возвращает True, если задание создано, False — если слито с существующим.
+        """
+        created = datetime.datetime.utcnow().isoformat()
+        # проверка и вставка одним запросом, чтобы параллельные нажатия не создали два задания
+        async with self._write() as conn:
+            cur = await conn.execute(
+                "INSERT INTO export_jobs (user_telegram_id, username, status, run_after, created_at) "
+                "SELECT ?, ?, 'queued', 0, ? WHERE NOT EXISTS "
+                "(SELECT 1 FROM export_jobs WHERE user_telegram_id=? AND status='queued')",
+                (tg_id, username, created, tg_id)
+            )
+            inserted = cur.rowcount == 1
+            if not inserted:
+                await conn.execute(
+                    "UPDATE export_jobs SET username=? WHERE user_telegram_id=? AND status='queued'",
+                    (username, tg_id)
+                )
+        return inserted
+
+    async def claim_export_job(self, worker: str, lease: float):
+        """
+        Атомарно забирает готовое к запуску задание и берёт его в аренду на lease секунд: новые
+        (run_after = 0) — по порядку постановки, затем повторы — по времени готовности. Порядок
+        совпадает с индексом (status, run_after), поэтому готовые задания не сортируются.
+        Задания пользователя, у которого экспорт уже выполняется, пропускаются: повторное нажатие
+        во время экспорта ждёт его окончания, а не пишет в ту же таблицу параллельно.
+        Возвращает (id, tg_id, username, attempts) или None.
+        """
+        now = time.time()
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute(
+                "UPDATE export_jobs SET status='running', attempts=attempts+1, worker=?, lease_until=? "
+                "WHERE id = (SELECT id FROM export_jobs WHERE status='queued' AND run_after<=? "
+                "AND NOT EXISTS (SELECT 1 FROM export_jobs r "
+                "WHERE r.user_telegram_id = export_jobs.user_telegram_id AND r.status = 'running') "
+                "ORDER BY run_after, id LIMIT 1) "
+                "RETURNING id, user_telegram_id, username, attempts",
+                (worker, now + lease, now)
+            )
+            row = await cur.fetchone()
+        return row
+
+    async def renew_export_lease(self, job_id: int, worker: str, lease: float) -> bool:
+        """Продлевает аренду задания. False — задание уже не у этого воркера (аренда истекла и его забрали)."""
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute(
+                "UPDATE export_jobs SET lease_until=? WHERE id=? AND worker=? AND status='running'",
+                (time.time() + lease, job_id, worker)
+            )
+        return cur.rowcount == 1
+
+    # finish / retry / fail меняют задание, только пока оно у этого воркера: если аренда истекла
+    # и задание забрал другой, его результат не затирается
+    async def finish_export_job(self, job_id: int, worker: str):
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "UPDATE export_jobs SET status='done', error=NULL WHERE id=? AND worker=? AND status='running'",
+                (job_id, worker)
+            )
+
+    async def retry_export_job(self, job_id: int, worker: str, delay: float, error: str):
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "UPDATE export_jobs SET status='queued', run_after=?, error=? WHERE id=? AND worker=? AND status='running'",
+                (time.time() + delay, error, job_id, worker)
+            )
+
+    async def fail_export_job(self, job_id: int, worker: str, error: str):
+        async with self._write(savepoint=False) as conn:
+            await conn.execute(
+                "UPDATE export_jobs SET status='failed', error=? WHERE id=? AND worker=? AND status='running'",
+                (error, job_id, worker)
+            )
+
+    async def requeue_expired_exports(self) -> int:
+        """
+        Задания с истёкшей арендой (процесс воркера упал или был убит) снова ставятся в очередь.
+        Задания, аренду которых продлевают живые воркеры, не трогаются. Возвращает число возвращённых.
+        """
+        now = time.time()
+        async with self._write() as conn:
+            # если у пользователя уже есть новое задание в очереди — брошенное ему не нужно
+            await conn.execute(
+                "UPDATE export_jobs SET status='done' WHERE status='running' AND lease_until<? AND user_telegram_id IN "
+                "(SELECT user_telegram_id FROM export_jobs WHERE status='queued')",
+                (now,)
+            )
+            cur = await conn.execute(
+                "UPDATE export_jobs SET status='queued' WHERE status='running' AND lease_until<?", (now,)
+            )
+        return cur.rowcount
+
+    # ====== Состояния FSM ======
+    async def get_fsm_state(self, chat_id: int, user_id: int):
+        """(state, data, bucket, updated_at) или None."""
+        return await self._fetchone(
+            "SELECT state, data, bucket, updated_at FROM fsm_states WHERE chat_id=? AND user_id=?",
+            (chat_id, user_id)
+        )
+
+    async def save_fsm_states(self, rows: list, removed: list):
+        """rows — [(chat_id, user_id, state, data, bucket, updated_at)], removed — [(chat_id, user_id)]."""
+        if not rows and not removed:
+            return
+        async with self._write() as conn:
+            if rows:
+                await conn.executemany(
+                    "INSERT INTO fsm_states (chat_id, user_id, state, data, bucket, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (chat_id, user_id) DO UPDATE SET "
+                    "state=excluded.state, data=excluded.data, bucket=excluded.bucket, updated_at=excluded.updated_at",
+                    rows
+                )
+            if removed:
+                await conn.executemany("DELETE FROM fsm_states WHERE chat_id=? AND user_id=?", removed)
 
-    async def set_setting(self, key: str, value: str):
-        await self.conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-        await self.conn.commit()
\ No newline at end of file
+    async def expire_fsm_states(self, before: int) -> int:
+        """Удаляет диалоги, не менявшиеся с момента before. Возвращает число удалённых."""
+        async with self._write(savepoint=False) as conn:
+            cur = await conn.execute("DELETE FROM fsm_states WHERE updated_at < ?", (before,))
+        return cur.rowcount
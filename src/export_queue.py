@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+from db import DB
+from metrics import EXPORT_JOBS
+
+
+class ExportQueue:
+    """
+    Очередь экспорта поверх таблицы export_jobs в SQLite.
+    Задания переживают рестарт, выполняются ограниченным числом воркеров
+    в собственном пуле потоков, ошибки квоты повторяются с экспоненциальной задержкой.
+
+    Задание берётся в аренду на lease секунд и продлевается, пока выполняется. Задания с истёкшей
+    арендой (процесс упал) возвращаются в очередь при старте и периодически — несколько процессов
+    бота (BOT_WORKERS) работают с одной таблицей и не перезапускают задания друг друга.
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        handler: Callable[[int, str], Awaitable[None]],
+        on_failure: Optional[Callable[[int, Exception], Awaitable[None]]] = None,
+        is_retryable: Callable[[Exception], bool] = lambda e: False,
+        concurrency: int = 2,
+        max_attempts: int = 5,
+        backoff: float = 10.0,
+        poll_interval: float = 5.0,
+        lease: float = 60.0,
+    ):
+        self.db = db
+        self.handler = handler
+        self.on_failure = on_failure
+        self.is_retryable = is_retryable
+        self.concurrency = max(1, concurrency)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="export")
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+        # на паузе воркеры не забирают новые задания, очередь копится до resume()
+        self.paused = False
+
+    async def start(self):
+        await self._requeue_expired()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._workers.append(asyncio.create_task(self._reaper()))
+        self._wakeup.set()
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, user_id: int, username: str) -> bool:
+        """Ставит экспорт в очередь. False — у пользователя уже есть задание в очереди, запрос слит с ним."""
+        created = await self.db.enqueue_export(user_id, username)
+        self._wakeup.set()
+        return created
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+        self._wakeup.set()
+
+    async def run_blocking(self, func, *args):
+        """Выполняет blocking-IO код в пуле экспорта, а не в общем пуле asyncio.to_thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def _requeue_expired(self):
+        requeued = await self.db.requeue_expired_exports()
+        if requeued:
+            logging.warning("Возвращено в очередь заданий экспорта с истёкшей арендой: %s", requeued)
+            self._wakeup.set()
+
+    async def _reaper(self):
+        while True:
+            await asyncio.sleep(self.lease)
+            try:
+                await self._requeue_expired()
+            except Exception:
+                logging.exception("Не удалось вернуть в очередь задания экспорта с истёкшей арендой")
+
+    async def _heartbeat(self, job_id: int):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                if not await self.db.renew_export_lease(job_id, self.worker_id, self.lease):
+                    logging.warning("Аренда задания экспорта %s потеряна, его забрал другой воркер", job_id)
+                    return
+            except Exception:
+                logging.exception("Не удалось продлить аренду задания экспорта %s", job_id)
+
+    async def _worker(self):
+        while True:
+            job = None
+            if not self.paused:
+                try:
+                    job = await self.db.claim_export_job(self.worker_id, self.lease)
+                except Exception:
+                    logging.exception("Не удалось получить задание экспорта из очереди")
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run(*job)
+
+    async def _run(self, job_id: int, user_id: int, username: str, attempts: int):
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            await self.handler(user_id, username)
+        except asyncio.CancelledError:
+            # остановка бота: задание возвращается в очередь сразу, не дожидаясь истечения аренды
+            await asyncio.shield(self.db.retry_export_job(job_id, self.worker_id, 0, "прервано остановкой"))
+            raise
+        except Exception as e:
+            if self.is_retryable(e) and attempts < self.max_attempts:
+                delay = self.backoff * 2 ** (attempts - 1)
+                logging.warning("Экспорт для %s упёрся в квоту, повтор через %.0f с (попытка %s)", user_id, delay, attempts)
+                await self.db.retry_export_job(job_id, self.worker_id, delay, str(e))
+                EXPORT_JOBS.inc(result="retry")
+                return
+            logging.exception("Ошибка при экспорте задач для пользователя %s", user_id)
+            await self.db.fail_export_job(job_id, self.worker_id, str(e))
+            EXPORT_JOBS.inc(result="failed")
+            if self.on_failure:
+                await self.on_failure(user_id, e)
+            return
+        finally:
+            heartbeat.cancel()
+        await self.db.finish_export_job(job_id, self.worker_id)
+        EXPORT_JOBS.inc(result="done")
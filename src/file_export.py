@@ -0,0 +1,149 @@
+import csv
+import datetime
+import os
+import re
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from db import DB
+from google_sheets import HEADER, task_to_row
+from metrics import EXPORT_FILE_ROWS, EXPORT_FILE_SECONDS
+
+# Лимит Bot API на отправку файлов ботом (без собственного сервера Bot API)
+MAX_DOCUMENT_BYTES = 50 * 1024 * 1024
+
+# Символы, недопустимые в XML 1.0 (управляющие, кроме \t \n \r)
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class CsvWriter:
+    suffix = ".csv"
+
+    def __init__(self, path: str):
+        # utf-8-sig: Excel без BOM открывает кириллицу в CSV кракозябрами
+        self._file = open(path, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(HEADER)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class XlsxWriter:
+    """
+    Минимальный XLSX (один лист, строки inlineStr), который пишется потоково:
+    XML листа сразу уходит в сжатую запись zip-архива, в памяти держится только текущая порция.
+    """
+    suffix = ".xlsx"
+
+    _PARTS = {
+        "[Content_Types].xml": (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        ),
+        "_rels/.rels": (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="xl/workbook.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'
+        ),
+        "xl/workbook.xml": (
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="Задачи" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+            '</Relationships>'
+        ),
+    }
+    _XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+    def __init__(self, path: str):
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED)
+        # пока открыта запись листа, другие файлы в архив писать нельзя — служебные части идут первыми
+        for name, body in self._PARTS.items():
+            self._zip.writestr(name, self._XML_DECL + body)
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._sheet.write((
+            self._XML_DECL
+            + '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        ).encode())
+        self._row = 0
+        self.write_rows([HEADER])
+
+    @staticmethod
+    def _cell(value) -> str:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return f"<c><v>{value}</v></c>"
+        text = escape(_XML_ILLEGAL.sub("", "" if value is None else str(value)))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+    def write_rows(self, rows):
+        parts = []
+        for values in rows:
+            self._row += 1
+            parts.append(f'<row r="{self._row}">{"".join(self._cell(v) for v in values)}</row>')
+        self._sheet.write("".join(parts).encode())
+
+    def close(self):
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        self._zip.close()
+
+
+WRITERS = {"csv": CsvWriter, "xlsx": XlsxWriter}
+
+
+async def export_tasks_to_file(
+    db: DB,
+    run_blocking,
+    user_id: int,
+    fmt: str,
+    chunk_size: int = 1000,
+    date_format: str = "%m/%d/%Y",
+):
+    """
+    Выгружает задачи пользователя во временный файл fmt (csv / xlsx): строки читаются из БД
+    порциями по chunk_size и сразу дописываются в файл, весь список в памяти не собирается.
+    run_blocking(func, *args) — выполняет запись на диск (пул экспорта).
+    Возвращает dict: {'path': <путь к файлу>, 'filename': <имя для отправки>, 'rows': <строк задач>}.
+    Файл удаляет вызывающий.
+    """
+    writer_cls = WRITERS.get(fmt)
+    if writer_cls is None:
+        raise ValueError(f"unknown export format: {fmt}")
+
+    started = time.perf_counter()
+    fd, path = tempfile.mkstemp(prefix=f"tasks_{user_id}_", suffix=writer_cls.suffix)
+    os.close(fd)
+    rows = 0
+    try:
+        writer = await run_blocking(writer_cls, path)
+        try:
+            async for chunk in db.iter_tasks_for_user(user_id, chunk_size):
+                await run_blocking(writer.write_rows, [task_to_row(t, date_format) for t in chunk])
+                rows += len(chunk)
+        finally:
+            await run_blocking(writer.close)
+    except BaseException:
+        os.remove(path)
+        raise
+
+    EXPORT_FILE_SECONDS.observe(time.perf_counter() - started, format=fmt)
+    EXPORT_FILE_ROWS.inc(rows, format=fmt)
+    filename = f"tasks_{datetime.date.today():%Y-%m-%d}{writer_cls.suffix}"
+    return {"path": path, "filename": filename, "rows": rows}
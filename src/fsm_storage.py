@@ -0,0 +1,253 @@
+import asyncio
+import copy
+import logging
+import time
+import typing
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from aiogram.dispatcher.storage import BaseStorage
+from aiogram.utils import json
+
+# данные больше этого размера сжимаются zlib; JSON-объект начинается с "{", zlib-поток — с 0x78
+COMPRESS_MIN = 512
+
+
+def pack(value: dict) -> bytes | None:
+    """Компактная сериализация data/bucket: пустой словарь — NULL, крупный — zlib."""
+    if not value:
+        return None
+    raw = json.dumps(value).encode()
+    if len(raw) >= COMPRESS_MIN:
+        return zlib.compress(raw)
+    return raw
+
+
+def unpack(raw: bytes | None) -> dict:
+    if not raw:
+        return {}
+    if raw[0] == 0x78:
+        raw = zlib.decompress(raw)
+    return json.loads(raw)
+
+
+@dataclass(slots=True)
+class _Record:
+    state: str | None = None
+    data: dict = field(default_factory=dict)
+    bucket: dict = field(default_factory=dict)
+    updated_at: int = 0
+
+    def empty(self) -> bool:
+        return self.state is None and not self.data and not self.bucket
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в той же SQLite-базе, что и задачи (таблица fsm_states).
+    Перед базой стоит LRU-кэш на cache_size диалогов с отложенной записью: изменения
+    копятся в памяти и сбрасываются в базу одной транзакцией раз в flush_interval секунд
+    и при остановке. Диалоги, не менявшиеся дольше ttl секунд, считаются брошенными:
+    они не читаются и раз в sweep_interval удаляются из базы.
+    """
+
+    def __init__(
+        self,
+        db,
+        cache_size: int = 10_000,
+        ttl: float = 86400,
+        flush_interval: float = 1.0,
+        sweep_interval: float = 600,
+    ):
+        self.db = db
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self._cache: OrderedDict[tuple, _Record] = OrderedDict()
+        self._dirty: dict[tuple, _Record] = {}  # ещё не записанные, в т.ч. уже вытесненные из кэша
+        self._loading: dict[tuple, asyncio.Task] = {}  # чтения из базы в процессе: параллельные апдейты ждут их
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """Запускает фоновую запись и очистку. Вызывается после db.init()."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        self._cache.clear()
+
+    async def wait_closed(self):
+        pass
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        rows, removed = [], []
+        for (chat, user), record in dirty.items():
+            if record.empty():
+                removed.append((chat, user))
+            else:
+                rows.append((chat, user, record.state, pack(record.data), pack(record.bucket), record.updated_at))
+        try:
+            await self.db.save_fsm_states(rows, removed)
+        except Exception:
+            logging.exception("Не удалось сохранить состояния FSM")
+            # более свежие изменения, сделанные во время записи, не затираем
+            for key, record in dirty.items():
+                self._dirty.setdefault(key, record)
+
+    def active_dialogs(self) -> int:
+        """Незавершённые диалоги среди закэшированных и ещё не записанных."""
+        records = {**self._cache, **self._dirty}
+        return sum(1 for r in records.values() if r.state is not None)
+
+    async def sweep(self) -> int:
+        before = int(time.time() - self.ttl)
+        for key in [k for k, r in self._cache.items() if r.updated_at < before and k not in self._dirty]:
+            del self._cache[key]
+        return await self.db.expire_fsm_states(before)
+
+    async def _run(self):
+        last_sweep = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - last_sweep >= self.sweep_interval:
+                    last_sweep = time.monotonic()
+                    expired = await self.sweep()
+                    if expired:
+                        logging.info("Удалено брошенных диалогов FSM: %s", expired)
+            except Exception:
+                logging.exception("Ошибка фоновой записи FSM")
+
+    # ====== Кэш ======
+    def _key(self, chat, user) -> tuple:
+        chat, user = self.check_address(chat=chat, user=user)
+        return int(chat), int(user)
+
+    async def _get(self, chat, user) -> _Record:
+        key = self._key(chat, user)
+        record = self._cache.get(key)
+        if record is None:
+            record = self._dirty.get(key)
+        if record is None:
+            loading = self._loading.get(key)
+            if loading is None:
+                loading = self._loading[key] = asyncio.ensure_future(self.db.get_fsm_state(*key))
+                loading.add_done_callback(lambda _: self._loading.pop(key, None))
+            row = await asyncio.shield(loading)
+            # пока шёл запрос, запись могла появиться в кэше — она свежее прочитанной
+            record = self._cache.get(key) or self._dirty.get(key)
+            if record is None:
+                if row is None:
+                    record = _Record()
+                else:
+                    record = _Record(row[0], unpack(row[1]), unpack(row[2]), row[3])
+        if not record.empty() and record.updated_at < time.time() - self.ttl:
+            record = _Record()
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            # вытесненная грязная запись остаётся в _dirty до ближайшего flush
+            self._cache.popitem(last=False)
+        return record
+
+    async def _update(self, chat, user, **changes):
+        record = await self._get(chat, user)
+        for name, value in changes.items():
+            setattr(record, name, value)
+        record.updated_at = int(time.time())
+        self._dirty[self._key(chat, user)] = record
+
+    # ====== BaseStorage ======
+    async def get_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        default: typing.Optional[str] = None) -> typing.Optional[str]:
+        record = await self._get(chat, user)
+        return record.state if record.state is not None else self.resolve_state(default)
+
+    async def get_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       default: typing.Optional[dict] = None) -> typing.Dict:
+        record = await self._get(chat, user)
+        return copy.deepcopy(record.data or default or {})
+
+    async def set_state(self, *,
+                        chat: typing.Union[str, int, None] = None,
+                        user: typing.Union[str, int, None] = None,
+                        state: typing.AnyStr = None):
+        await self._update(chat, user, state=self.resolve_state(state))
+
+    async def set_data(self, *,
+                       chat: typing.Union[str, int, None] = None,
+                       user: typing.Union[str, int, None] = None,
+                       data: typing.Dict = None):
+        await self._update(chat, user, data=copy.deepcopy(data or {}))
+
+    async def update_data(self, *,
+                          chat: typing.Union[str, int, None] = None,
+                          user: typing.Union[str, int, None] = None,
+                          data: typing.Dict = None, **kwargs):
+        record = await self._get(chat, user)
+        merged = dict(record.data)
+        merged.update(data or {}, **kwargs)
+        await self._update(chat, user, data=copy.deepcopy(merged))
+
+    def has_bucket(self):
+        return True
+
+    async def get_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         default: typing.Optional[dict] = None) -> typing.Dict:
+        record = await self._get(chat, user)
+        return copy.deepcopy(record.bucket or default or {})
+
+    async def set_bucket(self, *,
+                         chat: typing.Union[str, int, None] = None,
+                         user: typing.Union[str, int, None] = None,
+                         bucket: typing.Dict = None):
+        await self._update(chat, user, bucket=copy.deepcopy(bucket or {}))
+
+    async def update_bucket(self, *,
+                            chat: typing.Union[str, int, None] = None,
+                            user: typing.Union[str, int, None] = None,
+                            bucket: typing.Dict = None, **kwargs):
+        record = await self._get(chat, user)
+        merged = dict(record.bucket)
+        merged.update(bucket or {}, **kwargs)
+        await self._update(chat, user, bucket=copy.deepcopy(merged))
+
+
+def create_storage(kind: str, db, redis_url: str = "", redis_pool_size: int = 50, **options) -> BaseStorage:
+    """
+    FSM-хранилище по настройке FSM_STORAGE: sqlite — SQLiteStorage в общей базе (options — его параметры),
+    redis — RedisStorage2 aiogram (нужен пакет redis; подходит любой Redis-совместимый сервер).
+    """
+    if kind == "redis":
+        from aiogram.contrib.fsm_storage.redis import RedisStorage2
+        from redis.asyncio import BlockingConnectionPool
+
+        # в пуле RedisStorage2 по умолчанию 10 соединений, и одиннадцатый одновременный апдейт
+        # падает с "Too many connections"; блокирующий пул вместо ошибки ждёт свободное соединение
+        pool = BlockingConnectionPool.from_url(
+            redis_url or "redis://localhost:6379/0", max_connections=redis_pool_size, decode_responses=True
+        )
+        ttl = int(options.get("ttl", 0)) or None
+        storage = RedisStorage2(connection_pool=pool, state_ttl=ttl, data_ttl=ttl, bucket_ttl=ttl)
+        storage._redis.auto_close_connection_pool = True  # пул закрывается вместе со storage.close()
+        return storage
+    if kind != "sqlite":
+        raise ValueError(f"unknown FSM storage: {kind}")
+    return SQLiteStorage(db, **options)
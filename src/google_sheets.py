@@ -1,5 +1,8 @@
 import gspread
 import datetime
+import time
+
+from metrics import observe_sheets_write
 
 CATEGORY_RU = {
     "development": "Разработка",
@@ -8,36 +11,121 @@ CATEGORY_RU = {
     "other": "Другое"
 }
 
-def export_tasks_to_sheet(sa_file, sheet_id, tasks, username):
+HEADER = ["id", "Заголовок", "Категория", "Описание", "Статус", "Создано"]
+
+# Сколько строк отправлять одним запросом values.update.
+# Один запрос на весь лист упирается в лимит размера тела, поэтому большие выгрузки режем на куски.
+DEFAULT_CHUNK_ROWS = 5000
+
+
+def is_retryable_error(exc: Exception) -> bool:
+    """Ошибки квоты (429) и временные ошибки сервера Google имеет смысл повторить позже."""
+    if isinstance(exc, gspread.exceptions.APIError):
+        return exc.code == 429 or exc.code >= 500
+    return False
+
+
+def task_to_row(t, date_format: str = "%m/%d/%Y"):
+    task_id, title, desc, category, status, created = t
+    status_str = "Открыто" if status == "open" else "Готово"
+    category_ru = CATEGORY_RU.get(category, category)
+    created_str = datetime.datetime.utcfromtimestamp(created).strftime(date_format)
+    return [task_id, title, category_ru, desc, status_str, created_str]
+
+
+def tab_name_for(username: str) -> str:
+    return f"{username[:25]}"  # max 25 символов
+
+
+def build_grid(tasks, date_format: str = "%m/%d/%Y"):
+    """Собирает всю таблицу (заголовок + строки задач) в памяти."""
+    return [HEADER] + [task_to_row(t, date_format) for t in tasks]
+
+
+def export_tasks_to_sheet(sa_file, sheet_id, tasks, username, chunk_size: int = DEFAULT_CHUNK_ROWS, date_format: str = "%m/%d/%Y"):
     """
     Экспорт задач пользователя в Google Sheet.
     Создаёт отдельную вкладку для username (если уже есть — использует её).
-    Возвращает dict: {'url': <URL на таблицу>, 'tab': <имя вкладки>}
+    Таблица собирается целиком в памяти и пишется одним запросом update
+    (или несколькими, по chunk_size строк), а не append_row на каждую задачу.
+    Возвращает dict: {'url': <URL на таблицу>, 'tab': <имя вкладки>, 'cells': <записано ячеек>}
     """
+    started = time.perf_counter()
+    grid = build_grid(tasks, date_format)
+    rows, cols = len(grid), len(HEADER)
+
     # Авторизация через современный gspread
     client = gspread.service_account(filename=sa_file)
 
     # Открываем таблицу
     sheet_doc = client.open_by_key(sheet_id)
 
-    # Вкладка для пользователя
-    tab_name = f"{username[:25]}"  # max 25 символов
+    # Вкладка для пользователя — сразу нужного размера
+    tab_name = tab_name_for(username)
     try:
         sheet = sheet_doc.worksheet(tab_name)
         sheet.clear()
+        sheet.resize(rows=rows, cols=cols)
     except gspread.WorksheetNotFound:
-        sheet = sheet_doc.add_worksheet(title=tab_name, rows="100", cols="20")
+        sheet = sheet_doc.add_worksheet(title=tab_name, rows=rows, cols=cols)
+
+    chunk_size = max(1, chunk_size)
+    for start in range(0, rows, chunk_size):
+        sheet.update(values=grid[start:start + chunk_size], range_name=f"A{start + 1}")
 
-    # Заголовки
-    sheet.append_row(["id", "Заголовок", "Категория", "Описание", "Статус", "Создано"])
+    observe_sheets_write("export_tasks_to_sheet", len(tasks), time.perf_counter() - started)
+    sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit"
+    return {"url": sheet_url, "tab": tab_name, "cells": rows * cols}
+
+
+def plan_incremental_sync(row_map: dict, current_ids: set, changed_ids: set):
+    """
+    План инкрементальной синхронизации вкладки (строка 1 — заголовок, задачи со 2-й).
+    Удалённые задачи вычёркиваются перестановкой: на место дыры переезжает последняя строка,
+    поэтому вкладка остаётся без пропусков и сдвигать строки не нужно.
+    Возвращает (new_row_map, {row_num: task_id} — строки для перезаписи, всего строк с заголовком).
+    """
+    row_map = dict(row_map)
+    by_row = {r: t for t, r in row_map.items()}
+    dirty = {t for t in changed_ids if t in current_ids}
+
+    for task_id in [t for t in row_map if t not in current_ids]:
+        hole = row_map.pop(task_id)
+        del by_row[hole]
+        last = len(row_map) + 2
+        if hole != last:
+            moved = by_row.pop(last)
+            row_map[moved] = hole
+            by_row[hole] = moved
+            dirty.add(moved)
+        dirty.discard(task_id)
+
+    for task_id in sorted(current_ids - row_map.keys()):
+        row_map[task_id] = len(row_map) + 2
+        dirty.add(task_id)
+
+    return row_map, {row_map[t]: t for t in dirty}, len(row_map) + 1
+
+
+def apply_sheet_changes(sa_file, sheet_id, tab_name: str, writes: list, total_rows: int):
+    """
+    Применяет план к существующей вкладке: при необходимости меняет размер
+    и перезаписывает только изменившиеся строки одним batch_update.
+    writes — [(row_num, values), ...]. Если вкладки нет — gspread.WorksheetNotFound.
+    Возвращает dict: {'url', 'tab', 'cells'}.
+    """
+    started = time.perf_counter()
+    client = gspread.service_account(filename=sa_file)
+    sheet = client.open_by_key(sheet_id).worksheet(tab_name)
 
-    # Данные
-    for t in tasks:
-        task_id, title, desc, category, status, created = t
-        status_str = "Открыто" if status == "open" else "Готово"
-        category_ru = CATEGORY_RU.get(category, category)
-        created_str = datetime.datetime.fromisoformat(created).strftime("%m/%d/%Y")
-        sheet.append_row([task_id, title, category_ru, desc, status_str, created_str])
+    if sheet.row_count != total_rows:
+        sheet.resize(rows=total_rows)
+    if writes:
+        last_col = chr(ord("A") + len(HEADER) - 1)
+        sheet.batch_update([
+            {"range": f"A{row}:{last_col}{row}", "values": [values]} for row, values in writes
+        ])
+    observe_sheets_write("apply_sheet_changes", len(writes), time.perf_counter() - started)
 
     sheet_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/edit"
-    return {"url": sheet_url, "tab": tab_name}
\ No newline at end of file
+    return {"url": sheet_url, "tab": tab_name, "cells": len(writes) * len(HEADER)}
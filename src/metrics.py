@@ -0,0 +1,297 @@
+import bisect
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import random
+import resource
+import sys
+import threading
+import time
+
+from aiohttp import web
+
+# Метрики в текстовом формате Prometheus, без внешних зависимостей.
+# Все метрики регистрируются в REGISTRY при создании и отдаются по /metrics.
+# Повторная регистрация имени заменяет метрику: в процессе-воркере модуль bot
+# импортируется дважды (как __mp_main__ и как bot), действует последняя.
+REGISTRY: dict = {}
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()  # экспорт наблюдает метрики из потоков пула
+        REGISTRY[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        return [f"{self.name}{_labels_text(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Значение выставляется через set() или вычисляется в момент запроса функцией fn()."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), fn=None):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple, float] = {}
+        self.fn = fn
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def _samples(self):
+        if self.fn is not None:
+            try:
+                return [f"{self.name} {self.fn()}"]
+            except Exception:
+                logging.exception("Ошибка вычисления метрики %s", self.name)
+                return []
+        return [f"{self.name}{_labels_text(self.labels, k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # ключ меток -> [счётчики по бакетам (последний — +Inf), сумма]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][i] += 1
+            entry[1] += value
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def _samples(self):
+        out = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                le = _labels_text((*self.labels, "le"), (*key, bound))
+                out.append(f"{self.name}_bucket{le} {cumulative}")
+            out.append(f"{self.name}_sum{_labels_text(self.labels, key)} {total}")
+            out.append(f"{self.name}_count{_labels_text(self.labels, key)} {cumulative}")
+        return out
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.started
+        self.histogram.observe(self.elapsed, **self.labels)
+
+
+def render() -> str:
+    lines = []
+    for metric in REGISTRY.values():
+        with metric._lock:
+            lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ====== Метрики бота ======
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Время обработки апдейта хендлером", ("handler",))
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Необработанные исключения в хендлерах", ("handler",))
+DB_SECONDS = Histogram("bot_db_query_seconds", "Время выполнения методов DB", ("query",))
+DB_ERRORS = Counter("bot_db_errors_total", "Ошибки методов DB", ("query",))
+TG_SEND_SECONDS = Histogram("bot_telegram_send_seconds", "Время вызова sendMessage")
+TG_SENDS = Counter("bot_telegram_send_total", "Отправки сообщений по результату (ok / retry_after / error)", ("result",))
+SAFE_SEND_FAILURES = Counter("bot_safe_send_failures_total", "Фоновые сообщения, которые не удалось доставить")
+SHEETS_SECONDS = Histogram("bot_sheets_call_seconds", "Время вызовов Google Sheets API", ("call",))
+SHEETS_ROWS = Counter("bot_sheets_rows_written_total", "Строк записано в Google Sheets")
+SHEETS_ROWS_PER_SECOND = Gauge("bot_sheets_last_rows_per_second", "Скорость записи последнего экспорта, строк/с")
+EXPORT_JOBS = Counter("bot_export_jobs_total", "Задания экспорта по результату (done / retry / failed)", ("result",))
+EXPORT_FILE_SECONDS = Histogram("bot_export_file_seconds", "Время выгрузки задач в файл", ("format",))
+EXPORT_FILE_ROWS = Counter("bot_export_file_rows_total", "Строк выгружено в файлы", ("format",))
+REMINDERS_SENT = Counter("bot_reminders_sent_total", "Отправленные напоминания о сроках задач")
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss — в килобайтах на Linux и в байтах на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+PEAK_RSS = Gauge("process_peak_rss_bytes", "Пиковый RSS процесса", fn=_peak_rss_bytes)
+CPU_SECONDS = Gauge("process_cpu_seconds", "Процессорное время процесса (user + system)", fn=_cpu_seconds)
+
+
+def observe_sheets_write(call: str, rows: int, seconds: float):
+    SHEETS_SECONDS.observe(seconds, call=call)
+    SHEETS_ROWS.inc(rows)
+    if seconds > 0:
+        SHEETS_ROWS_PER_SECOND.set(rows / seconds)
+
+
+# ====== Инструментирование ======
+class Profiler:
+    """
+    Выборочный cProfile для хендлеров: при включении профилируется примерно доля
+    sample_rate вызовов, не больше одного одновременно (cProfile — один на поток).
+    Профилируется всё, что выполняется в цикле событий за время хендлера.
+    """
+
+    def __init__(self, sample_rate: float = 0.01):
+        self.sample_rate = sample_rate
+        self.enabled = False
+        self.samples = 0
+        self._active = False
+        self._stats: pstats.Stats | None = None
+
+    def start(self):
+        self.enabled = True
+        self.samples = 0
+        self._stats = None
+
+    def stop(self, limit: int = 20) -> str:
+        """Выключает профилирование и возвращает топ функций по cumulative time."""
+        self.enabled = False
+        if self._stats is None:
+            return "Нет данных: ни один вызов не попал в выборку."
+        out = io.StringIO()
+        self._stats.stream = out
+        self._stats.sort_stats("cumulative").print_stats(limit)
+        self._stats = None
+        return f"Профиль по {self.samples} вызовам:\n{out.getvalue()}"
+
+    async def run(self, coro):
+        if not self.enabled or self._active or random.random() >= self.sample_rate:
+            return await coro
+        self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return await coro
+        finally:
+            profile.disable()
+            self._active = False
+            self.samples += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+
+
+profiler = Profiler()
+
+
+def instrument_handler(func):
+    """Оборачивает хендлер aiogram: латентность, ошибки и выборочный профиль."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with HANDLER_SECONDS.time(handler=name):
+            try:
+                return await profiler.run(func(*args, **kwargs))
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+    return wrapper
+
+
+def instrument_dispatcher(dp, skip=()):
+    """Оборачивает все зарегистрированные хендлеры сообщений и callback-ов (кроме skip)."""
+    for handlers in (dp.message_handlers, dp.callback_query_handlers):
+        for handler_obj in handlers.handlers:
+            if handler_obj.handler not in skip:
+                # spec хендлера уже вычислен при регистрации, обёртка его не меняет
+                handler_obj.handler = instrument_handler(handler_obj.handler)
+
+
+def instrument_db(db):
+    """Оборачивает публичные async-методы экземпляра DB: время и ошибки по имени метода."""
+    for name, method in inspect.getmembers(type(db), inspect.iscoroutinefunction):
+        if name.startswith("_") or name in ("init", "close"):
+            continue
+        setattr(db, name, _timed_method(getattr(db, name), name))
+
+
+def _timed_method(method, name: str):
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        with DB_SECONDS.time(query=name):
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                DB_ERRORS.inc(query=name)
+                raise
+    return wrapper
+
+
+# ====== HTTP ======
+async def start_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает отдельный HTTP-сервер с /metrics. Возвращает runner для остановки (runner.cleanup())."""
+    async def handle(_request):
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,214 @@
+import asyncio
+import datetime
+import logging
+import re
+import time
+
+from db import DB
+from metrics import REMINDERS_SENT
+from sender import MAX_MESSAGE_LENGTH
+
+DUE_FORMAT = "%d.%m.%Y %H:%M"
+_DUE_FORMATS = ("%d.%m.%Y %H:%M", "%d.%m.%Y")
+# без года: к дате дописывается год, и strptime проверяет дату в нём — 29.02 есть только
+# в високосных, поэтому годы перебираются вперёд (до 8 лет: 2096 -> 2104)
+_YEARLESS_FORMATS = ("%d.%m %H:%M", "%d.%m")
+_YEARS_AHEAD = 8
+REMINDER_HEADER = "⏰ Наступил срок задач:"
+_RELATIVE = re.compile(r"\+\s*(\d+)\s*([мmчhдd])", re.IGNORECASE)
+_UNITS = {"м": 60, "m": 60, "ч": 3600, "h": 3600, "д": 86400, "d": 86400}
+# сроки дальше этого не принимаются: «+9999999д» вышел бы за datetime.max, и format_due упал бы
+# уже после записи задачи
+MAX_DUE_YEARS = 10
+_MAX_DUE_AHEAD = MAX_DUE_YEARS * 366 * 86400
+
+
+def parse_due(text: str, now: float) -> int | None:
+    """
+    Срок задачи из текста пользователя (время — UTC, как и даты в списке задач):
+    ДД.ММ.ГГГГ ЧЧ:ММ, ДД.ММ.ГГГГ, ДД.ММ ЧЧ:ММ, ДД.ММ (без года — ближайшая такая дата)
+    или относительно сейчас: +30м, +2ч, +1д. Без времени — 09:00. None — не распознано
+    или дальше MAX_DUE_YEARS лет от now.
+    """
+    due_at = _parse_due(text.strip(), now)
+    if due_at is None or due_at > now + _MAX_DUE_AHEAD:
+        return None
+    return due_at
+
+
+def _parse_due(text: str, now: float) -> int | None:
+    match = _RELATIVE.fullmatch(text)
+    if match:
+        return int(now) + int(match.group(1)) * _UNITS[match.group(2).lower()]
+
+    today = datetime.datetime.utcfromtimestamp(now)
+    for fmt in _DUE_FORMATS:
+        try:
+            due = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if "%H" not in fmt:
+            due = due.replace(hour=9)
+        return _timestamp(due)
+
+    date, _, rest = text.partition(" ")
+    for fmt in _YEARLESS_FORMATS:
+        for year in range(today.year, today.year + _YEARS_AHEAD + 1):
+            try:
+                due = datetime.datetime.strptime(f"{date}.{year} {rest}".rstrip(), fmt.replace("%m", "%m.%Y"))
+            except ValueError:
+                continue
+            if "%H" not in fmt:
+                due = due.replace(hour=9)
+            if due >= today:
+                return _timestamp(due)
+    return None
+
+
+def _timestamp(due: datetime.datetime) -> int:
+    return int(due.replace(tzinfo=datetime.timezone.utc).timestamp())
+
+
+def format_due(due_at: int) -> str:
+    return datetime.datetime.utcfromtimestamp(due_at).strftime(DUE_FORMAT)
+
+
+def reminder_messages(rows) -> list[tuple[str, list[int]]]:
+    """
+    Сообщения одному пользователю о наступивших сроках rows [(id, title, due_at)]: строки задач
+    под общим заголовком, разбитые так, чтобы каждое сообщение укладывалось в лимит Telegram.
+    Возвращает [(текст, id задач в нём)].
+    """
+    messages, lines, ids = [], [], []
+    size = len(REMINDER_HEADER)
+    for task_id, title, due_at in rows:
+        line = f"#{task_id} {title} — срок {format_due(due_at)}"
+        line = line[:MAX_MESSAGE_LENGTH - len(REMINDER_HEADER) - 1]  # заголовок задачи бывает длинным
+        if lines and size + 1 + len(line) > MAX_MESSAGE_LENGTH:
+            messages.append(("\n".join([REMINDER_HEADER, *lines]), ids))
+            lines, ids, size = [], [], len(REMINDER_HEADER)
+        lines.append(line)
+        ids.append(task_id)
+        size += 1 + len(line)
+    if lines:
+        messages.append(("\n".join([REMINDER_HEADER, *lines]), ids))
+    return messages
+
+
+async def wait_event(event: asyncio.Event, timeout: float):
+    """Ждёт event не дольше timeout секунд — сон ReminderScheduler по умолчанию."""
+    try:
+        await asyncio.wait_for(event.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+
+
+class ReminderScheduler:
+    """
+    Напоминания о сроках задач. Один цикл спит до ближайшего срока (MIN(due_at) по частичному
+    индексу), затем забирает наступившие напоминания пачками по batch_size и отправляет их.
+    Очередь живёт в БД, поэтому после рестарта планировщик продолжает с того же места, а в
+    памяти держится не больше одной пачки, сколько бы напоминаний ни было запланировано.
+    notify(due_at) будит цикл, если новый срок раньше того, до которого он спит; max_sleep
+    ограничивает сон — так подхватываются сроки, добавленные другими процессами (BOT_WORKERS).
+
+    send должен пробрасывать ошибки отправки: напоминания из неотправленных сообщений
+    возвращаются в очередь (release_reminders) и повторяются не раньше чем через retry_delay,
+    кроме ошибок, для которых is_retryable(e) ложно (бот заблокирован, чат не найден).
+
+    clock и sleep(event, timeout) — часы и сон цикла: тесты и бенчмарки подставляют свои,
+    чтобы прогонять часы ожидания без настоящего времени.
+    """
+
+    def __init__(
+        self,
+        db: DB,
+        send,
+        batch_size: int = 500,
+        max_sleep: float = 60,
+        retry_delay: float = 30,
+        is_retryable=lambda e: True,
+        clock=time.time,
+        sleep=wait_event,
+    ):
+        self.db = db
+        self._send = send  # send(user_id, text) — корутина
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.retry_delay = retry_delay
+        self.is_retryable = is_retryable
+        self._retry_at = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._wakeup = asyncio.Event()
+        self._sleep_until: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def notify(self, due_at: int):
+        if self._sleep_until is None or due_at < self._sleep_until:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            # сбрасываем до запросов: notify, пришедший во время них, не потеряется
+            self._wakeup.clear()
+            self._sleep_until = None
+            try:
+                # после ошибок отправки пачки не забираются до _retry_at, иначе возвращённые
+                # напоминания крутились бы в цикле без пауз
+                if self._clock() >= self._retry_at:
+                    fired = await self.fire_due()
+                    if fired >= self.batch_size and self._clock() >= self._retry_at:
+                        continue  # наступивших больше пачки — забираем следующую сразу
+                due_at = await self.db.next_reminder_at()
+            except Exception:
+                logging.exception("Ошибка планировщика напоминаний")
+                due_at = None
+
+            now = self._clock()
+            if due_at is not None:
+                due_at = max(due_at, self._retry_at)
+            timeout = self.max_sleep if due_at is None else min(max(due_at - now, 0), self.max_sleep)
+            self._sleep_until = now + timeout
+            await self._sleep(self._wakeup, timeout)
+
+    async def fire_due(self) -> int:
+        """Отправляет одну пачку наступивших напоминаний. Возвращает её размер."""
+        rows = await self.db.claim_due_reminders(int(self._clock()), self.batch_size)
+        if not rows:
+            return 0
+        # одно сообщение на пользователя, а не на каждую задачу (длинные списки — несколько)
+        by_user: dict[int, list] = {}
+        for task_id, user_id, title, due_at in rows:
+            by_user.setdefault(user_id, []).append((task_id, title, due_at))
+        unsent = await asyncio.gather(*(self._send_user(user_id, tasks) for user_id, tasks in by_user.items()))
+        unsent = [task_id for ids in unsent for task_id in ids]
+        if unsent:
+            await self.db.release_reminders(unsent)
+            self._retry_at = self._clock() + self.retry_delay
+        REMINDERS_SENT.inc(len(rows) - len(unsent))
+        return len(rows)
+
+    async def _send_user(self, user_id: int, tasks: list) -> list[int]:
+        """Отправляет напоминания пользователю по порядку. Возвращает id, которые нужно повторить."""
+        messages = reminder_messages(tasks)
+        for i, (text, _) in enumerate(messages):
+            try:
+                await self._send(user_id, text)
+            except Exception as e:
+                if not self.is_retryable(e):
+                    logging.warning("Напоминания пользователю %s не доставлены: %s", user_id, e)
+                    return []
+                logging.warning("Не удалось отправить напоминания пользователю %s, повтор позже: %s", user_id, e)
+                return [task_id for _, ids in messages[i:] for task_id in ids]
+        return []
@@ -1,8 +1,64 @@
-from rapidfuzz import process, fuzz
-
-def find_similar_titles(query: str, rows: list, limit: int = 5, score_cutoff: int = 60):
-    titles = [r[1] for r in rows]
-    mapping = {r[1]: r for r in rows}
-    results = process.extract(query, titles, scorer=fuzz.WRatio, limit=limit)
-    filtered = [(mapping[r[0]], r[1]) for r in results if r[1] >= score_cutoff]
-    return filtered
\ No newline at end of file
+from functools import cached_property
+
+import numpy as np
+from rapidfuzz import process, fuzz, utils
+
+# Сколько строк скорить одним вызовом cdist — ограничивает размер матрицы в памяти
+BATCH_SIZE = 10000
+
+
+def _scores(query: str, choices: list, workers: int) -> np.ndarray:
+    """Оценки WRatio запроса против уже нормализованных строк, пачками по BATCH_SIZE."""
+    out = np.empty(len(choices), dtype=np.float64)
+    for start in range(0, len(choices), BATCH_SIZE):
+        batch = choices[start:start + BATCH_SIZE]
+        out[start:start + len(batch)] = process.cdist(
+            [query], batch, scorer=fuzz.WRatio, processor=None, dtype=np.float64, workers=workers
+        )[0]
+    return out
+
+
+class TitleIndex(list):
+    """
+    Строки задач вместе с нормализованными заголовками (и описаниями — при первом обращении).
+    DB.search_tasks кэширует такой список для пользователей с небольшим числом задач, и повторные
+    поиски не перечитывают и не нормализуют их заново. Для остальных кода это обычный список строк.
+    """
+
+    @cached_property
+    def titles(self) -> list[str]:
+        return [utils.default_process(r[1] or "") for r in self]
+
+    @cached_property
+    def descriptions(self) -> list[str]:
+        return [utils.default_process(r[2] or "") for r in self]
+
+
+def find_similar_titles(
+    query: str,
+    rows: list,
+    limit: int = 5,
+    score_cutoff: int = 60,
+    description_weight: float = 0.0,
+    workers: int = 1,
+):
+    """
+    Fuzzy-поиск по заголовкам задач. Возвращает [(row, score), ...] по убыванию score.
+    Результаты привязаны к индексу строки, поэтому задачи с одинаковыми заголовками не схлопываются.
+    description_weight > 0 включает поиск и по описанию: его оценка умножается на вес,
+    итог — максимум из оценки заголовка и взвешенной оценки описания.
+    rows — список строк или TitleIndex: у него нормализованные строки уже посчитаны.
+    """
+    if not rows:
+        return []
+    if not isinstance(rows, TitleIndex):
+        rows = TitleIndex(rows)
+    q = utils.default_process(query)
+    scores = _scores(q, rows.titles, workers)
+    if description_weight > 0:
+        desc_scores = _scores(q, rows.descriptions, workers)
+        scores = np.maximum(scores, desc_scores * description_weight)
+
+    # стабильная сортировка: при равном score порядок кандидатов сохраняется
+    order = np.argsort(-scores, kind="stable")[:limit]
+    return [(rows[i], float(scores[i])) for i in order if scores[i] >= score_cutoff]
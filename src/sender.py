@@ -0,0 +1,274 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+
+from aiogram import Bot, types
+from aiogram.utils.exceptions import RetryAfter
+
+from metrics import TG_SEND_SECONDS, TG_SENDS
+
+# Приоритеты: меньше — раньше
+INTERACTIVE = 0  # ответы на действия пользователя
+BACKGROUND = 1   # фоновые уведомления (экспорт и т.п.)
+
+MAX_MESSAGE_LENGTH = 4096
+# ожидание короче считается нулевым: таймеры asyncio срабатывают на разрешение часов раньше срока,
+# и без допуска планировщик заново засыпал бы на наносекунды, крутясь вхолостую
+_EPSILON = 1e-6
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity; block() — пауза после 429."""
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Сколько секунд ждать до следующего токена (0 — можно отправлять)."""
+        self._refill(now)
+        wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+        return wait if wait > _EPSILON else 0.0
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens = max(self.tokens - 1, 0.0)
+
+    def block(self, now: float, seconds: float):
+        self.blocked_until = now + seconds
+        self.tokens = 0
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.blocked_until
+
+
+@dataclass(order=True)
+class _Item:
+    priority: int
+    seq: int
+    chat_id: int = field(compare=False)
+    text: str = field(compare=False)
+    kwargs: dict = field(compare=False)
+    futures: list = field(compare=False)
+
+    def mergeable(self) -> bool:
+        """
+        Склеивать можно только простой текст: без разметки и инлайн-кнопок,
+        привязанных к конкретному сообщению. Обычная клавиатура (главное меню) — можно, берётся последняя.
+        """
+        markup = self.kwargs.get("reply_markup")
+        if markup is not None and not isinstance(markup, types.ReplyKeyboardMarkup):
+            return False
+        return self.kwargs.keys() <= {"reply_markup", "reply_to_message_id"}
+
+
+class SendScheduler:
+    """
+    Планировщик исходящих сообщений с учётом лимитов Telegram:
+    общий token bucket (~30 сообщений/с, запас global_burst) и bucket на каждый чат
+    (~1 сообщение/с с небольшим запасом). Сообщения с меньшим priority уходят раньше,
+    RetryAfter обрабатывается повторной постановкой с паузой для чата, подряд идущие тексты
+    в один чат склеиваются в одно сообщение.
+    Порядок сообщений внутри чата сохраняется (в полёте не больше одного на чат).
+
+    Чаты с сообщениями лежат в одной из двух куч: _ready — можно отправлять сейчас (по приоритету),
+    _timers — ждут токена своего bucket (по времени готовности). Выбор следующего сообщения —
+    O(log n), сколько бы чатов ни ждало своего лимита.
+    """
+
+    def __init__(
+        self,
+        send,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        global_burst: float = 1,
+        clock=time.monotonic,
+    ):
+        self._send = send
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._clock = clock
+        # запас общего bucket — единицы сообщений: 30 разом после паузы Telegram отвечает 429
+        self._global = TokenBucket(global_rate, global_burst, clock())
+        self._buckets: dict[int, TokenBucket] = {}
+        self._queues: dict[int, list] = {}   # chat_id -> heap из _Item
+        self._ready: list = []               # (priority, seq, chat_id) — головы очередей готовых чатов
+        self._timers: list = []              # (ready_at, chat_id) — чаты, ждущие токена
+        self._waiting: set[int] = set()      # чаты в _timers
+        self._busy: set[int] = set()         # чаты, у которых сообщение сейчас в полёте
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def submit(self, chat_id: int, text: str, priority: int = INTERACTIVE, **kwargs):
+        """Ставит сообщение в очередь и ждёт отправки. Возвращает types.Message."""
+        future = asyncio.get_running_loop().create_future()
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        self._push(_Item(priority, next(self._seq), chat_id, text, kwargs, [future]))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await future
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def stop(self, timeout: float = 5.0):
+        """Даёт отправить накопившиеся сообщения (не дольше timeout) и останавливает планировщик."""
+        deadline = self._clock() + timeout
+        while (self.pending() or self._busy) and self._clock() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _push(self, item: _Item):
+        queue = self._queues.setdefault(item.chat_id, [])
+        heapq.heappush(queue, item)
+        if queue[0] is item:
+            self._schedule(item.chat_id, self._clock())
+        self._wakeup.set()
+
+    def _bucket(self, chat_id: int, now: float) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst, now)
+        return bucket
+
+    def _schedule(self, chat_id: int, now: float):
+        """Кладёт голову очереди чата в _ready или, пока у чата нет токена, — в _timers."""
+        queue = self._queues.get(chat_id)
+        if not queue or chat_id in self._busy or chat_id in self._waiting:
+            return
+        wait = self._bucket(chat_id, now).wait_time(now)
+        if wait > 0:
+            heapq.heappush(self._timers, (now + wait, chat_id))
+            self._waiting.add(chat_id)
+        else:
+            heapq.heappush(self._ready, (queue[0].priority, queue[0].seq, chat_id))
+
+    def _release_timers(self, now: float):
+        """Переносит в _ready чаты, дождавшиеся токена."""
+        while self._timers and self._timers[0][0] <= now + _EPSILON:
+            _, chat_id = heapq.heappop(self._timers)
+            self._waiting.discard(chat_id)
+            self._schedule(chat_id, now)
+
+    def _next_ready(self, now: float):
+        """Чат с самым приоритетным готовым сообщением или None."""
+        while self._ready:
+            priority, seq, chat_id = heapq.heappop(self._ready)
+            queue = self._queues.get(chat_id)
+            if not queue or (queue[0].priority, queue[0].seq) != (priority, seq) or chat_id in self._busy:
+                # устаревшая запись: голова очереди сменилась или чат занят — после отправки
+                # _deliver поставит его заново
+                continue
+            if self._bucket(chat_id, now).wait_time(now) > 0:
+                self._schedule(chat_id, now)  # токен ушёл (RetryAfter) — обратно в таймеры
+                continue
+            return chat_id
+        return None
+
+    def _take(self, chat_id: int) -> _Item:
+        """Забирает голову очереди чата, приклеивая к ней следующие тексты того же приоритета."""
+        queue = self._queues[chat_id]
+        item = heapq.heappop(queue)
+        if item.mergeable():
+            while queue and queue[0].priority == item.priority and queue[0].mergeable():
+                nxt = queue[0]
+                text = item.text + "\n\n" + nxt.text
+                if len(text) > MAX_MESSAGE_LENGTH:
+                    break
+                heapq.heappop(queue)
+                kwargs = dict(item.kwargs)
+                if "reply_markup" in nxt.kwargs:
+                    kwargs["reply_markup"] = nxt.kwargs["reply_markup"]
+                item = _Item(item.priority, item.seq, chat_id, text, kwargs, item.futures + nxt.futures)
+        if not queue:
+            del self._queues[chat_id]
+        return item
+
+    async def _run(self):
+        while True:
+            now = self._clock()
+            self._release_timers(now)
+            if self._ready:
+                global_wait = self._global.wait_time(now)
+                if global_wait > 0:
+                    await asyncio.sleep(global_wait)
+                    continue
+                chat_id = self._next_ready(now)
+                if chat_id is not None:
+                    self._global.consume(now)
+                    self._bucket(chat_id, now).consume(now)
+                    item = self._take(chat_id)
+                    self._busy.add(chat_id)
+                    asyncio.create_task(self._deliver(item))
+                    if len(self._buckets) > 10_000:
+                        self._buckets = {
+                            c: b for c, b in self._buckets.items() if c in self._queues or not b.idle(now)
+                        }
+                    continue
+
+            self._wakeup.clear()
+            wait = self._timers[0][0] - now if self._timers else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, item: _Item):
+        try:
+            with TG_SEND_SECONDS.time():
+                message = await self._send(item.chat_id, item.text, **item.kwargs)
+        except RetryAfter as e:
+            TG_SENDS.inc(result="retry_after")
+            logging.warning("Telegram просит подождать %s с перед отправкой в чат %s", e.timeout, item.chat_id)
+            self._bucket(item.chat_id, self._clock()).block(self._clock(), e.timeout)
+            self._push(item)
+        except Exception as e:
+            TG_SENDS.inc(result="error")
+            for future in item.futures:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            TG_SENDS.inc(result="ok")
+            for future in item.futures:
+                if not future.done():
+                    future.set_result(message)
+        finally:
+            self._busy.discard(item.chat_id)
+            self._schedule(item.chat_id, self._clock())
+            self._wakeup.set()
+
+
+class ScheduledBot(Bot):
+    """Bot, у которого send_message (а значит и message.reply / message.answer) идёт через SendScheduler."""
+
+    def __init__(
+        self, *args, global_rate: float = 30, chat_rate: float = 1, chat_burst: float = 3, global_burst: float = 1,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.scheduler = SendScheduler(
+            self._send_now, global_rate=global_rate, chat_rate=chat_rate, chat_burst=chat_burst,
+            global_burst=global_burst,
+        )
+
+    async def _send_now(self, chat_id, text, **kwargs):
+        return await super().send_message(chat_id, text, **kwargs)
+
+    async def send_message(self, chat_id, text, priority: int = INTERACTIVE, **kwargs):
+        return await self.scheduler.submit(chat_id, text, priority=priority, **kwargs)
@@ -0,0 +1,70 @@
+import logging
+import time
+
+import gspread
+
+from db import DB
+from google_sheets import (
+    apply_sheet_changes,
+    export_tasks_to_sheet,
+    plan_incremental_sync,
+    tab_name_for,
+    task_to_row,
+)
+
+
+async def sync_user_sheet(
+    db: DB,
+    run_blocking,
+    sa_file: str,
+    sheet_id: str,
+    user_id: int,
+    username: str,
+    chunk_size: int,
+    date_format: str,
+    incremental: bool = True,
+    full_resync_ratio: float = 0.5,
+):
+    """
+    Синхронизирует вкладку пользователя с его задачами.
+    Инкрементально — только новые, изменённые (updated_at >= watermark) и удалённые задачи
+    одним batch_update. Полная перезапись — если синхронизации ещё не было, сменилась вкладка
+    или формат даты, вкладку удалили или изменений слишком много (> full_resync_ratio задач).
+    run_blocking(func, *args) — выполняет blocking-IO код (пул экспорта).
+    Возвращает {"url": ссылка на таблицу, "tab": имя вкладки, "cells": записано ячеек}.
+    """
+    tab = tab_name_for(username)
+    # фиксируем момент до чтения задач: всё, что изменится после, попадёт в следующую синхронизацию
+    watermark = int(time.time())
+    state = await db.get_sheet_sync(user_id) if incremental else None
+
+    if state and state[0] == tab and state[1] == date_format:
+        _, _, since, row_map = state
+        current_ids = await db.get_task_ids(user_id)
+        changed = {r[0]: r for r in await db.get_tasks_updated_since(user_id, since)}
+        new_map, writes, total_rows = plan_incremental_sync(row_map, current_ids, changed.keys())
+
+        if len(writes) <= full_resync_ratio * max(len(current_ids), 1):
+            # задачи, переехавшие на место удалённых, не менялись — дочитываем их
+            moved = [t for t in writes.values() if t not in changed]
+            tasks = {**changed, **{r[0]: r for r in await db.get_tasks_by_ids(user_id, moved)}}
+            if all(t in tasks for t in writes.values()):
+                values = [(row, task_to_row(tasks[t], date_format)) for row, t in sorted(writes.items())]
+                try:
+                    result = await run_blocking(apply_sheet_changes, sa_file, sheet_id, tab, values, total_rows)
+                except gspread.WorksheetNotFound:
+                    logging.info("Вкладка %s не найдена, полная синхронизация", tab)
+                else:
+                    await db.save_sheet_sync(
+                        user_id, tab, date_format, watermark,
+                        {t: r for t, r in new_map.items() if row_map.get(t) != r},
+                        removed=row_map.keys() - new_map.keys(),
+                    )
+                    return result
+
+    tasks = await db.get_all_tasks_for_user(user_id)
+    result = await run_blocking(export_tasks_to_sheet, sa_file, sheet_id, tasks, username, chunk_size, date_format)
+    await db.save_sheet_sync(
+        user_id, tab, date_format, watermark, {t[0]: i + 2 for i, t in enumerate(tasks)}, full=True
+    )
+    return result
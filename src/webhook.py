@@ -0,0 +1,62 @@
+import asyncio
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import types
+from aiogram.dispatcher.webhook import WebhookRequestHandler
+from aiogram.utils import json
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def check_secret(request: web.Request, secret: str):
+    """
+    401, если заголовок с секретом не совпал с secret. Сравнение — за постоянное время;
+    пустой secret не пропускает ничего: вебхук без секрета не запускается.
+    """
+    received = request.headers.get(SECRET_HEADER, "").encode()
+    if not secret or not hmac.compare_digest(received, secret.encode()):
+        raise web.HTTPUnauthorized()
+
+
+class BotWebhookHandler(WebhookRequestHandler):
+    """
+    Обработчик вебхука Telegram:
+    - проверяет секрет из заголовка X-Telegram-Bot-Api-Secret-Token (задаётся в set_webhook);
+    - разбирает тело через aiogram.utils.json (ujson/rapidjson, если установлены);
+    - учитывает обрабатываемые апдейты, чтобы при остановке дождаться их (drain).
+    """
+
+    secret_token: str = ""
+    _inflight: set = set()
+    _idle = asyncio.Event()
+
+    async def parse_update(self, bot):
+        data = json.loads(await self.request.read())
+        return types.Update(**data)
+
+    async def post(self):
+        check_secret(self.request, self.secret_token)
+
+        task = asyncio.current_task()
+        cls = type(self)
+        cls._inflight.add(task)
+        cls._idle.clear()
+        try:
+            return await super().post()
+        finally:
+            cls._inflight.discard(task)
+            if not cls._inflight:
+                cls._idle.set()
+
+    @classmethod
+    async def drain(cls, timeout: float):
+        """Ждёт завершения обработки уже принятых апдейтов, но не дольше timeout секунд."""
+        if not cls._inflight:
+            return
+        logging.info("Дожидаемся обработки %s апдейтов", len(cls._inflight))
+        try:
+            await asyncio.wait_for(cls._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Не дождались %s апдейтов за %s с", len(cls._inflight), timeout)
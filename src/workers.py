@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+
+from aiohttp import web
+from aiogram.utils import json
+
+from webhook import check_secret
+
+# Типы апдейтов, в которых есть from.id; остальные (channel_post и т.п.) идут в шард 0
+USER_UPDATE_TYPES = (
+    "message", "edited_message", "callback_query", "inline_query", "chosen_inline_result",
+    "shipping_query", "pre_checkout_query", "poll_answer", "my_chat_member", "chat_member", "chat_join_request",
+)
+
+
+def update_user_id(update: dict) -> int | None:
+    for kind in USER_UPDATE_TYPES:
+        body = update.get(kind)
+        if body:
+            user = body.get("from") or body.get("user")
+            return user.get("id") if user else None
+    return None
+
+
+def shard_for(update: dict, workers: int) -> int:
+    """Все апдейты одного пользователя попадают в один и тот же воркер."""
+    user_id = update_user_id(update)
+    return 0 if user_id is None else user_id % workers
+
+
+class UserOrderedRunner:
+    """
+    Обрабатывает апдейты параллельно, но апдейты одного пользователя — строго по очереди:
+    каждый следующий ждёт предыдущий (цепочка задач на пользователя).
+    """
+
+    def __init__(self, process):
+        self._process = process
+        self._tails: dict = {}
+
+    def submit(self, user_id, update):
+        prev = self._tails.get(user_id)
+        task = asyncio.create_task(self._run(prev, update))
+        self._tails[user_id] = task
+        task.add_done_callback(lambda t: self._forget(user_id, t))
+
+    def _forget(self, user_id, task):
+        if self._tails.get(user_id) is task:
+            del self._tails[user_id]
+
+    async def _run(self, prev, update):
+        if prev is not None:
+            await asyncio.wait([prev])
+        try:
+            await self._process(update)
+        except Exception:
+            logging.exception("Ошибка обработки апдейта %s", update.update_id)
+
+    async def drain(self, timeout: float):
+        tails = list(self._tails.values())
+        if tails:
+            await asyncio.wait(tails, timeout=timeout)
+
+
+# ====== Воркер ======
+def worker_env(index: int, workers: int) -> dict:
+    """
+    Переменные окружения воркера: свой порт метрик и своя доля общего лимита отправки Telegram.
+    Делится и скорость, и запас после паузы: иначе после простоя все воркеры разом отправили бы
+    по полному TG_GLOBAL_BURST. Меньше одного сообщения запас не бывает — с ним нельзя отправить ничего.
+    """
+    metrics_port = int(os.getenv("METRICS_PORT", "9090"))
+    return {
+        "METRICS_PORT": str(metrics_port + 1 + index) if metrics_port else "0",
+        "TG_GLOBAL_RATE": str(float(os.getenv("TG_GLOBAL_RATE", "30")) / workers),
+        "TG_GLOBAL_BURST": str(max(1.0, float(os.getenv("TG_GLOBAL_BURST", "1")) / workers)),
+    }
+
+
+def worker_main(index: int, workers: int, queue):
+    """Точка входа процесса-воркера."""
+    logging.basicConfig(level=logging.INFO, format=f"[worker {index}] %(levelname)s:%(name)s:%(message)s", force=True)
+    # Ctrl+C приходит всей группе процессов; останавливает воркеров фронт, дослав им None
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_serve(queue))
+
+
+async def _serve(queue):
+    import bot as app
+    from aiogram import Bot, Dispatcher, types
+    from config import SHUTDOWN_TIMEOUT
+
+    Bot.set_current(app.bot)
+    Dispatcher.set_current(app.dp)
+    await app.on_startup(app.dp)
+    runner = UserOrderedRunner(app.dp.process_update)
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            runner.submit(update_user_id(data), types.Update(**data))
+    finally:
+        await runner.drain(SHUTDOWN_TIMEOUT)
+        await app.on_shutdown(app.dp)
+        await app.dp.storage.wait_closed()
+        await (await app.bot.get_session()).close()
+
+
+# ====== Фронт ======
+class ShardRouter:
+    """
+    Фронт-процесс: принимает апдейты (polling или webhook) и раздаёт их N процессам-воркерам
+    по from_user.id. Каждый воркер — полноценный бот со своим циклом событий, соединениями
+    с БД и планировщиком отправки; общее состояние — в БД (WAL) или Redis.
+    """
+
+    def __init__(self, workers: int, shutdown_timeout: float = 30):
+        self.workers = workers
+        self.shutdown_timeout = shutdown_timeout
+        # spawn: воркер импортирует bot заново, а не наследует объекты фронта
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queues = [self._ctx.Queue() for _ in range(workers)]
+        self._procs: list = [None] * workers
+
+    def start(self):
+        for i in range(self.workers):
+            self._spawn(i)
+
+    def _spawn(self, index: int):
+        proc = self._ctx.Process(
+            target=worker_main, args=(index, self.workers, self._queues[index]), name=f"bot-worker-{index}"
+        )
+        # у Process нет параметра env: дочерний процесс получает os.environ на момент start().
+        # Окружение нужно до любого импорта config — spawn импортирует главный модуль (bot.py) раньше worker_main.
+        saved = dict(os.environ)
+        os.environ.update(worker_env(index, self.workers))
+        try:
+            proc.start()
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+        self._procs[index] = proc
+        logging.info("Запущен воркер %s (pid %s)", index, proc.pid)
+
+    def check(self):
+        """Перезапускает упавших воркеров; апдейты, ждущие в их очередях, не теряются."""
+        for i, proc in enumerate(self._procs):
+            if proc is not None and not proc.is_alive():
+                logging.error("Воркер %s завершился с кодом %s, перезапуск", i, proc.exitcode)
+                self._spawn(i)
+
+    def dispatch(self, update: dict):
+        self._queues[shard_for(update, self.workers)].put(update)
+
+    async def stop(self):
+        for queue in self._queues:
+            queue.put(None)
+        loop = asyncio.get_running_loop()
+        for proc in self._procs:
+            if proc is None:
+                continue
+            # воркер сам ждёт свои апдейты до SHUTDOWN_TIMEOUT, даём немного сверху
+            await loop.run_in_executor(None, proc.join, self.shutdown_timeout + 10)
+            if proc.is_alive():
+                logging.warning("Воркер %s не остановился, завершаем принудительно", proc.name)
+                proc.terminate()
+
+
+async def run_polling_front(bot, router: ShardRouter, timeout: int = 20):
+    """Long polling во фронте: апдейты не обрабатываются, а раздаются воркерам."""
+    await bot.delete_webhook(drop_pending_updates=True)
+    offset = None
+    while True:
+        router.check()
+        try:
+            updates = await bot.get_updates(offset=offset, timeout=timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logging.exception("Ошибка getUpdates")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            router.dispatch(update.to_python())
+            offset = update.update_id + 1
+
+
+def webhook_front_app(router: ShardRouter, path: str, secret: str) -> web.Application:
+    """aiohttp-приложение фронта для режима webhook: проверяет секрет и раздаёт апдейты воркерам."""
+    if not secret:
+        raise ValueError("webhook front requires a secret")
+
+    async def handle(request: web.Request):
+        check_secret(request, secret)
+        router.dispatch(json.loads(await request.read()))
+        return web.Response()
+
+    async def watchdog(_app):
+        async def loop():
+            while True:
+                router.check()
+                await asyncio.sleep(5)
+        task = asyncio.create_task(loop())
+        yield
+        task.cancel()
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    app.cleanup_ctx.append(watchdog)
+    return app
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+# config читает окружение при импорте: задаём его до того, как тесты импортируют bot / config
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("DB_PATH", os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "tasks.db"))
+os.environ.setdefault("ADMIN_IDS", "1")
+os.environ["METRICS_PORT"] = "0"
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    Модуль bot на свежей базе в tmp_path: db и FSM-хранилище подменены, отправка сообщений
+    перехвачена — app.sent собирает (chat_id, text, kwargs). Базу открывает helpers.running(app).
+    """
+    import bot
+    from aiogram import types
+    from db import DB
+    from fsm_storage import SQLiteStorage
+
+    db = DB(str(tmp_path / "tasks.db"), commit_delay=0.001)
+    storage = SQLiteStorage(db)
+    for target, name, value in [
+        (bot, "db", db), (bot, "storage", storage), (bot.dp, "storage", storage),
+        (bot.reminders, "db", db), (bot.export_queue, "db", db),
+    ]:
+        monkeypatch.setattr(target, name, value)
+
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text, kwargs))
+        return types.Message(message_id=len(sent), chat=types.Chat(id=chat_id, type="private"), text=text)
+
+    monkeypatch.setattr(bot.bot, "send_message", send_message)
+    monkeypatch.setattr(bot, "sent", sent, raising=False)
+    return bot
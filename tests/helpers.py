@@ -0,0 +1,81 @@
+"""Общие помощники тестов. pytest-asyncio не используется: асинхронные сценарии запускаются через asyncio.run."""
+import asyncio
+import contextlib
+
+from db import DB
+
+
+@contextlib.asynccontextmanager
+async def open_db(path, **kwargs):
+    """Инициализированная DB на файле path; закрывается по выходу из блока."""
+    kwargs.setdefault("commit_delay", 0.001)
+    db = DB(str(path), **kwargs)
+    await db.init()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+@contextlib.asynccontextmanager
+async def running(app):
+    """Открывает базу бота из фикстуры app и делает его бот и диспетчер текущими для апдейтов."""
+    from aiogram import Bot, Dispatcher
+
+    Bot.set_current(app.bot)
+    Dispatcher.set_current(app.dp)
+    await app.db.init()
+    try:
+        yield app
+    finally:
+        await app.storage.close()
+        await app.db.close()
+
+
+def message_update(update_id: int, user_id: int, text: str):
+    """Апдейт с текстовым сообщением пользователя user_id в личном чате."""
+    from aiogram import types
+
+    return types.Update(
+        update_id=update_id,
+        message={
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "u", "username": f"user{user_id}"},
+            "text": text,
+            **({"entities": [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]}
+               if text.startswith("/") else {}),
+        },
+    )
+
+
+async def feed(app, *updates):
+    """
+    Обрабатывает апдейты по очереди, каждый в своей задаче, как при polling: StateFilter aiogram
+    запоминает состояние в contextvar, и в одной задаче второй апдейт увидел бы состояние первого.
+    """
+    for update in updates:
+        await asyncio.create_task(app.dp.process_update(update))
+
+
+def callback_update(update_id: int, user_id: int, data: str):
+    """Апдейт с нажатием инлайн-кнопки data под сообщением бота в личном чате user_id."""
+    from aiogram import types
+
+    return types.Update(
+        update_id=update_id,
+        callback_query={
+            "id": str(update_id),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": "u"},
+            "message": {
+                "message_id": 1,
+                "date": 0,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": 1, "is_bot": True, "first_name": "bot"},
+                "text": "...",
+            },
+            "data": data,
+        },
+    )
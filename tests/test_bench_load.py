@@ -0,0 +1,78 @@
+"""
+Нагрузочный прогон benchmarks/bench_load.py: маленький прогон против заглушек проходит без ошибок
+и даёт полный отчёт, регрессионный порог ловит ухудшения и пропускает шум.
+"""
+import copy
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import common
+from bench_load import regressions
+
+
+def test_small_run_reports_every_metric(tmp_path):
+    report_path = tmp_path / "report.json"
+    env = {k: v for k, v in os.environ.items() if k not in ("BOT_TOKEN", "DB_PATH", "ADMIN_IDS")}
+    subprocess.run(
+        [
+            sys.executable, os.path.join(common.ROOT, "benchmarks", "bench_load.py"),
+            "--users", "4", "--tasks", "30", "--actions", "8", "--mode", "webhook",
+            "--output", str(report_path),
+        ],
+        env=env, check=True, timeout=120, capture_output=True,
+    )
+    report = json.loads(report_path.read_text())
+
+    assert report["errors"] == 0
+    assert sum(report["actions"].values()) == 4 * 8
+    assert report["throughput"]["actions_per_s"] > 0
+    assert set(report["latency_ms"]) >= {"all", "start", *report["actions"]}
+    assert report["latency_ms"]["all"]["p99_ms"] >= report["latency_ms"]["all"]["p50_ms"] > 0
+    assert report["peak_rss_mb"] >= report["rss_before_run_mb"] > 0
+    assert report["sql"]["statements"] == sum(report["sql"]["by_kind"].values()) > 0
+    assert report["telegram"]["calls"]["sendMessage"] >= 4 * 8
+    assert regressions(report, report, 0.25) == []
+
+
+BASELINE = {
+    "config": {"users": 10, "tasks": 10, "actions": 5, "mode": "polling", "seed": 1},
+    "errors": 0,
+    "throughput": {"actions_per_s": 100.0, "updates_per_s": 250.0},
+    "latency_ms": {"all": {"p95_ms": 40.0}, "add": {"p95_ms": 50.0}, "search": {"p95_ms": 2.0}},
+    "peak_rss_mb": 80.0,
+    "sql": {"per_action": 5.0},
+}
+
+
+def changed(path: str, value):
+    report = copy.deepcopy(BASELINE)
+    *parents, key = path.split(".")
+    target = report
+    for name in parents:
+        target = target[name]
+    target[key] = value
+    return report
+
+
+@pytest.mark.parametrize("path, value, problem", [
+    ("throughput.actions_per_s", 90.0, None),
+    ("throughput.actions_per_s", 70.0, "actions_per_s"),
+    ("latency_ms.add.p95_ms", 62.0, None),
+    ("latency_ms.add.p95_ms", 70.0, "add p95_ms"),
+    ("latency_ms.search.p95_ms", 6.0, None),  # рост в единицы миллисекунд — шум
+    ("peak_rss_mb", 120.0, "peak_rss_mb"),
+    ("sql.per_action", 7.0, "sql per_action"),
+    ("errors", 1, "errors"),
+    ("config.seed", 2, "конфигурация"),
+])
+def test_regression_gate(path, value, problem):
+    problems = regressions(changed(path, value), BASELINE, 0.25)
+
+    if problem is None:
+        assert problems == []
+    else:
+        assert len(problems) == 1 and problems[0].startswith(problem)
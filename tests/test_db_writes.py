@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from helpers import open_db
+
+
+def test_failed_operation_is_rolled_back_without_touching_others(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db", commit_delay=0.05) as db:
+            async def broken():
+                async with db._write() as conn:
+                    await conn.execute(
+                        "INSERT INTO sheet_sync (user_telegram_id, tab, date_format, watermark) VALUES (1, 't', 'f', 0)"
+                    )
+                    await asyncio.sleep(0)
+                    raise RuntimeError("boom")
+
+            # обе операции попадают в одно окно group commit
+            results = await asyncio.gather(broken(), db.add_task(1, "задача", "other"), return_exceptions=True)
+            return results, await db.get_sheet_sync(1), await db.count_tasks(1)
+
+    results, sync, count = asyncio.run(scenario())
+    assert isinstance(results[0], RuntimeError)
+    assert sync is None
+    assert count == 1
+
+
+def test_commit_never_splits_a_multi_statement_operation(tmp_path):
+    """Коммит по таймеру посреди save_sheet_sync не должен зафиксировать половину операции."""
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db", commit_delay=0) as db:
+            started = asyncio.Event()
+
+            async def slow_write():
+                async with db._write() as conn:
+                    await conn.execute("INSERT INTO settings (key, value) VALUES ('a', '1')")
+                    started.set()
+                    await asyncio.sleep(0.05)
+                    raise RuntimeError("boom")
+
+            async def concurrent_commit():
+                await started.wait()
+                await db.set_setting("b", 2)
+
+            results = await asyncio.gather(slow_write(), concurrent_commit(), return_exceptions=True)
+            return results, await db._fetchall("SELECT key FROM settings WHERE key IN ('a', 'b')")
+
+    results, keys = asyncio.run(scenario())
+    assert isinstance(results[0], RuntimeError)
+    assert keys == [("b",)]
+
+
+def test_write_error_propagates_and_connection_stays_usable(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            with pytest.raises(Exception):
+                async with db._write() as conn:
+                    await conn.execute("INSERT INTO no_such_table VALUES (1)")
+            await db.add_task(1, "после ошибки", "other")
+            return await db.count_tasks(1)
+
+    assert asyncio.run(scenario()) == 1
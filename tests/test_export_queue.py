@@ -0,0 +1,231 @@
+import asyncio
+import time
+
+from bench_export_queue import run_load
+from export_queue import ExportQueue
+from helpers import open_db
+
+
+class QuotaError(Exception):
+    pass
+
+
+def test_load_runs_every_job_once(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            return await run_load(db, jobs=500, concurrency=4, work=0)
+
+    result = asyncio.run(scenario())
+    assert result["max_runs_per_user"] == 1
+    assert result["jobs_per_s"] > 0
+
+
+def test_repeated_presses_merge_into_one_job(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            calls = []
+
+            async def handler(user_id, username):
+                calls.append((user_id, username))
+
+            queue = ExportQueue(db, handler, poll_interval=0.05)
+            queue.pause()
+            await queue.start()
+            created = [await queue.submit(7, name) for name in ("a", "b", "c")]
+            queue.resume()
+            await asyncio.sleep(0.2)
+            await queue.stop()
+            return created, calls
+
+    created, calls = asyncio.run(scenario())
+    assert created == [True, False, False]
+    assert calls == [(7, "c")]  # username берётся из последнего нажатия
+
+
+def test_export_pressed_while_running_waits_for_it(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            started, release = asyncio.Event(), asyncio.Event()
+            calls, running, peak = [], {}, {}
+
+            async def handler(user_id, username):
+                calls.append((user_id, username))
+                running[user_id] = running.get(user_id, 0) + 1
+                peak[user_id] = max(peak.get(user_id, 0), running[user_id])
+                started.set()
+                try:
+                    if user_id == 7:
+                        await release.wait()
+                finally:
+                    running[user_id] -= 1
+
+            # два воркера: свободный не должен взять второе задание того же пользователя
+            queue = ExportQueue(db, handler, concurrency=2, poll_interval=0.02)
+            await queue.start()
+            await queue.submit(7, "first")
+            await asyncio.wait_for(started.wait(), timeout=5)
+            created = await queue.submit(7, "second")
+            await queue.submit(8, "other")
+            await asyncio.sleep(0.2)
+            during = list(calls)
+            release.set()
+            await asyncio.sleep(0.2)
+            await queue.stop()
+            statuses = await db._fetchall("SELECT user_telegram_id, status FROM export_jobs ORDER BY id")
+            return created, during, calls, peak, statuses
+
+    created, during, calls, peak, statuses = asyncio.run(scenario())
+    assert created  # задание в статусе running не сливается с новым нажатием
+    assert during == [(7, "first"), (8, "other")]  # другие пользователи не ждут
+    assert calls == [(7, "first"), (8, "other"), (7, "second")]
+    assert peak == {7: 1, 8: 1}
+    assert [tuple(r) for r in statuses] == [(7, "done"), (7, "done"), (8, "done")]
+
+
+def test_retryable_error_is_retried_with_backoff(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            attempts = []
+            succeeded = asyncio.Event()
+
+            async def handler(user_id, username):
+                # run_after в export_jobs — по часам time.time()
+                attempts.append(time.time())
+                if len(attempts) < 3:
+                    raise QuotaError()
+                succeeded.set()
+
+            queue = ExportQueue(
+                db, handler, is_retryable=lambda e: isinstance(e, QuotaError),
+                max_attempts=5, backoff=0.05, poll_interval=0.02,
+            )
+            await queue.start()
+            await queue.submit(1, "u")
+            await asyncio.wait_for(succeeded.wait(), timeout=5)
+            await asyncio.sleep(0.05)  # finish_export_job после возврата из handler
+            await queue.stop()
+            row = await db._fetchone("SELECT status, attempts FROM export_jobs")
+            return attempts, row
+
+    attempts, row = asyncio.run(scenario())
+    assert len(attempts) == 3
+    # задержка удваивается: 0.05, затем 0.1
+    assert attempts[1] - attempts[0] >= 0.05
+    assert attempts[2] - attempts[1] >= 0.1
+    assert tuple(row) == ("done", 3)
+
+
+def test_permanent_error_fails_job_and_notifies(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            failures = []
+
+            async def handler(user_id, username):
+                raise ValueError("broken")
+
+            async def on_failure(user_id, exc):
+                failures.append((user_id, str(exc)))
+
+            queue = ExportQueue(db, handler, on_failure=on_failure, poll_interval=0.02)
+            await queue.start()
+            await queue.submit(5, "u")
+            await asyncio.sleep(0.2)
+            await queue.stop()
+            row = await db._fetchone("SELECT status, error FROM export_jobs")
+            return failures, row
+
+    failures, row = asyncio.run(scenario())
+    assert failures == [(5, "broken")]
+    assert tuple(row) == ("failed", "broken")
+
+
+def test_start_does_not_requeue_live_lease(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.enqueue_export(1, "u")
+            # задание выполняется соседним воркером, аренда действующая
+            job = await db.claim_export_job("other", 60)
+
+            calls = []
+
+            async def handler(user_id, username):
+                calls.append(user_id)
+
+            queue = ExportQueue(db, handler, poll_interval=0.02)
+            await queue.start()
+            await asyncio.sleep(0.1)
+            await queue.stop()
+            row = await db._fetchone("SELECT status, worker FROM export_jobs WHERE id=?", (job[0],))
+            return calls, row
+
+    calls, row = asyncio.run(scenario())
+    assert calls == []
+    assert tuple(row) == ("running", "other")
+
+
+def test_expired_lease_is_requeued_and_finished_by_another_worker(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.enqueue_export(1, "u")
+            job = await db.claim_export_job("dead", 0.05)  # воркер упал и аренду не продлевает
+
+            done = asyncio.Event()
+
+            async def handler(user_id, username):
+                done.set()
+
+            queue = ExportQueue(db, handler, poll_interval=0.02, lease=0.2)
+            await queue.start()
+            await asyncio.wait_for(done.wait(), timeout=5)
+            await asyncio.sleep(0.05)
+            await queue.stop()
+            # завершение от упавшего воркера задание, которое уже выполнил другой, не меняет
+            await db.fail_export_job(job[0], "dead", "поздно")
+            return await db._fetchone("SELECT status, attempts, worker FROM export_jobs"), queue.worker_id
+
+    row, worker_id = asyncio.run(scenario())
+    assert tuple(row) == ("done", 2, worker_id)
+
+
+def test_heartbeat_keeps_long_job_leased(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            calls = []
+
+            async def handler(user_id, username):
+                calls.append(user_id)
+                await asyncio.sleep(0.5)  # в несколько раз дольше аренды
+
+            first = ExportQueue(db, handler, poll_interval=0.02, lease=0.15)
+            second = ExportQueue(db, handler, poll_interval=0.02, lease=0.15)
+            await first.start()
+            await first.submit(1, "u")
+            await asyncio.sleep(0.05)
+            await second.start()
+            await asyncio.sleep(0.6)
+            await first.stop()
+            await second.stop()
+            return calls, await db._fetchone("SELECT status, attempts FROM export_jobs")
+
+    calls, row = asyncio.run(scenario())
+    assert calls == [1]
+    assert tuple(row) == ("done", 1)
+
+
+def test_stop_returns_running_job_to_queue(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            started = asyncio.Event()
+
+            async def handler(user_id, username):
+                started.set()
+                await asyncio.sleep(10)
+
+            queue = ExportQueue(db, handler, poll_interval=0.02)
+            await queue.start()
+            await queue.submit(1, "u")
+            await asyncio.wait_for(started.wait(), timeout=5)
+            await queue.stop()
+            return await db._fetchone("SELECT status FROM export_jobs")
+
+    assert tuple(asyncio.run(scenario())) == ("queued",)
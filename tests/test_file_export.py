@@ -0,0 +1,94 @@
+"""
+Экспорт файлом (EXPORT_BACKEND=csv / xlsx): export_worker против заглушки bot.send_document —
+файл уходит документом с нужным содержимым, после отправки (и после ошибки отправки)
+закрывается и удаляется.
+"""
+import asyncio
+import csv
+import io
+import os
+import zipfile
+
+import pytest
+
+from helpers import running
+
+USER = 42
+
+
+@pytest.fixture
+def documents(app, monkeypatch):
+    """Заглушка send_document: запоминает файл, имя, подпись и содержимое на момент отправки."""
+    sent = []
+
+    async def send_document(chat_id, document, caption=None, **kwargs):
+        sent.append({
+            "chat_id": chat_id,
+            "file": document.file,
+            "filename": document.filename,
+            "caption": caption,
+            "content": document.file.read(),
+        })
+
+    monkeypatch.setattr(app.bot, "send_document", send_document)
+    return sent
+
+
+def export(app, monkeypatch, backend: str, titles=()):
+    monkeypatch.setattr(app, "EXPORT_BACKEND", backend)
+
+    async def scenario():
+        async with running(app):
+            await app.db.add_tasks(USER, "testing", [(t, "описание") for t in titles])
+            await app.export_worker(USER, "alice")
+
+    asyncio.run(scenario())
+
+
+def test_csv_export_sends_document_and_cleans_up(app, monkeypatch, documents):
+    export(app, monkeypatch, "csv", titles=["Первая", "Вторая"])
+
+    [doc] = documents
+    rows = list(csv.reader(io.StringIO(doc["content"].decode("utf-8-sig"))))
+    assert doc["chat_id"] == USER
+    assert doc["filename"].endswith(".csv")
+    assert doc["caption"] == "✅ Экспорт завершён: 2 задач."
+    assert sorted(r[1] for r in rows[1:]) == ["Вторая", "Первая"]
+    assert doc["file"].closed
+    assert not os.path.exists(doc["file"].name)
+
+
+def test_xlsx_export_sends_valid_workbook(app, monkeypatch, documents):
+    export(app, monkeypatch, "xlsx", titles=["A & B <c>"])
+
+    [doc] = documents
+    with zipfile.ZipFile(io.BytesIO(doc["content"])) as book:
+        sheet = book.read("xl/worksheets/sheet1.xml").decode()
+    assert doc["filename"].endswith(".xlsx")
+    assert "A &amp; B &lt;c&gt;" in sheet
+    assert doc["file"].closed
+    assert not os.path.exists(doc["file"].name)
+
+
+def test_send_failure_propagates_and_removes_file(app, monkeypatch):
+    opened = []
+
+    async def send_document(chat_id, document, **kwargs):
+        opened.append(document.file)
+        raise ConnectionError("network down")
+
+    monkeypatch.setattr(app.bot, "send_document", send_document)
+
+    # ошибка уходит в очередь экспорта — она решает, повторять ли задание
+    with pytest.raises(ConnectionError):
+        export(app, monkeypatch, "csv", titles=["Задача"])
+
+    assert opened[0].closed
+    assert not os.path.exists(opened[0].name)
+
+
+def test_export_without_tasks_sends_nothing(app, monkeypatch, documents):
+    export(app, monkeypatch, "csv")
+
+    assert documents == []
+    assert app.sent[-1][1] == "Нет задач для экспорта."
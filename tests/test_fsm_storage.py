@@ -0,0 +1,109 @@
+"""
+SQLiteStorage: незавершённый диалог переживает перезапуск бота, а листание списка задач
+без выбора не пишет в FSM. FSM_STORAGE=redis — против заглушки Redis из benchmarks.
+"""
+import asyncio
+
+from db import DB
+from fake_redis import FakeRedis
+from fsm_storage import SQLiteStorage, create_storage
+from helpers import feed, message_update, open_db, running
+
+USER = 42
+
+
+def restart(app, monkeypatch, path):
+    """Новый процесс бота: свежие DB и SQLiteStorage на том же файле базы, кэши пусты."""
+    db = DB(str(path), commit_delay=0.001)
+    storage = SQLiteStorage(db)
+    for target, name, value in [
+        (app, "db", db), (app, "storage", storage), (app.dp, "storage", storage),
+        (app.reminders, "db", db), (app.export_queue, "db", db),
+    ]:
+        monkeypatch.setattr(target, name, value)
+
+
+def test_storage_restores_state_and_data_after_reopen(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            storage = SQLiteStorage(db)
+            await storage.set_state(chat=1, user=1, state="AddTaskStates:waiting_for_title")
+            await storage.update_data(chat=1, user=1, category="testing")
+            await storage.close()  # при остановке несохранённое сбрасывается в базу
+
+        async with open_db(tmp_path / "tasks.db") as db:
+            storage = SQLiteStorage(db)
+            return (
+                await storage.get_state(chat=1, user=1),
+                await storage.get_data(chat=1, user=1),
+                await storage.get_state(chat=2, user=2),
+            )
+
+    assert asyncio.run(scenario()) == ("AddTaskStates:waiting_for_title", {"category": "testing"}, None)
+
+
+def test_add_task_dialog_resumes_after_restart(app, monkeypatch, tmp_path):
+    async def before():
+        async with running(app):
+            await feed(app, message_update(1, USER, "➕ Добавить задачу"), message_update(2, USER, "Тестирование"))
+
+    async def after():
+        async with running(app):
+            # несколько строк — задачи создаются сразу из категории, выбранной до перезапуска
+            await feed(app, message_update(3, USER, "Первая\nВторая"))
+            return await app.db.get_all_tasks_for_user(USER), await app.storage.get_state(chat=USER, user=USER)
+
+    asyncio.run(before())
+    restart(app, monkeypatch, tmp_path / "tasks.db")
+    tasks, state = asyncio.run(after())
+
+    assert app.sent[-1][1].startswith("Добавлено задач: 2 в категорию 'Тестирование'")
+    assert sorted((t[1], t[3]) for t in tasks) == [("Вторая", "testing"), ("Первая", "testing")]
+    assert state is None
+
+
+def test_listing_without_selection_does_not_write_fsm(app, monkeypatch):
+    saved = []
+
+    async def scenario():
+        async with running(app):
+            real_save = app.db.save_fsm_states
+
+            async def counting_save(rows, removed):
+                saved.append((rows, removed))
+                await real_save(rows, removed)
+
+            monkeypatch.setattr(app.db, "save_fsm_states", counting_save)
+            await app.db.add_tasks(USER, "development", [(f"Задача {i}", "") for i in range(30)])
+            await feed(app, *(message_update(i, USER, "📋 Мои задачи") for i in range(1, 6)))
+            dirty = dict(app.storage._dirty)
+            await app.storage.flush()
+            return dirty
+
+    dirty = asyncio.run(scenario())
+
+    assert len(app.sent) == 5
+    assert dirty == {}
+    assert saved == []
+
+
+def test_redis_storage_handles_more_concurrent_users_than_pool():
+    async def scenario():
+        server = FakeRedis()
+        url = await server.start()
+        try:
+            storage = create_storage("redis", None, url, redis_pool_size=4, ttl=3600)
+            users = range(1, 51)
+            await asyncio.gather(*(
+                storage.set_state(chat=u, user=u, state="SearchStates:waiting_for_query") for u in users
+            ))
+            await asyncio.gather(*(storage.update_data(chat=u, user=u, page=u) for u in users))
+            states = await storage.get_states_list()
+            data = await storage.get_data(chat=7, user=7)
+            await storage.close()
+            await storage.wait_closed()
+            return len(states), data
+        finally:
+            await server.stop()
+
+    assert asyncio.run(scenario()) == (50, {"page": 7})
@@ -0,0 +1,46 @@
+import asyncio
+import sqlite3
+
+from db import CREATE_SETTINGS, CREATE_TASKS, CREATE_USERS, MIGRATIONS
+from helpers import open_db
+
+
+def test_baseline_database_is_migrated_to_latest(tmp_path):
+    path = tmp_path / "tasks.db"
+    conn = sqlite3.connect(path)
+    conn.executescript(CREATE_USERS + CREATE_TASKS + CREATE_SETTINGS)
+    conn.executemany(
+        "INSERT INTO tasks (user_telegram_id, title, description, category, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (1, "Купить молоко", "", "other", "open", "2024-03-01T10:00:00"),
+            (1, "Отчёт", "за март", "analytics", "done", "2024-03-02T12:30:00"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        async with open_db(path) as db:
+            version = (await db._fetchone("PRAGMA user_version"))[0]
+            rows = await db.list_tasks(1)
+            exact = await db.find_exact_task(1, "купить МОЛОКО")
+            stats = sorted(await db.stats_by_category_status(1))
+            found = await db.search_tasks(1, "отчет", scan_max=0)
+        return version, rows, exact, stats, found
+
+    version, rows, exact, stats, found = asyncio.run(scenario())
+    assert version == len(MIGRATIONS)
+    assert [(r[1], r[5]) for r in rows] == [("Отчёт", 1709382600), ("Купить молоко", 1709287200)]
+    assert exact[1] == "Купить молоко"
+    assert stats == [("analytics", "done", 1), ("other", "open", 1)]
+    assert [r[1] for r in found] == ["Отчёт"]
+
+
+def test_init_is_idempotent(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_task(1, "задача", "other")
+        async with open_db(tmp_path / "tasks.db") as db:
+            return await db.count_tasks(1)
+
+    assert asyncio.run(scenario()) == 1
@@ -0,0 +1,131 @@
+"""
+Регрессия планов запросов: прогоняем методы DB, перехватываем каждый выполненный SQL
+(set_trace_callback отдаёт его с подставленными параметрами) и проверяем EXPLAIN QUERY PLAN:
+ни один запрос горячего пути не должен перебирать таблицу целиком или сортировать во временном B-tree.
+"""
+import asyncio
+import re
+import sqlite3
+import time
+
+from helpers import open_db
+
+# Ожидаемые SCAN: виртуальные таблицы (FTS и её служебные, json_each) и INSERT ... SELECT без FROM
+ALLOWED_SCANS = re.compile(r"SCAN ((main\.)?(tasks_fts\w*|json_each)\b|CONSTANT ROW)")
+# сортировка по bm25 делается после MATCH — временный B-tree неизбежен
+TEMP_BTREE_ALLOWED = ("bm25(",)
+SKIP = re.compile(r"^\s*(--|PRAGMA|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE|CREATE)", re.IGNORECASE)
+
+
+async def exercise(db):
+    """Вызывает методы DB, которые выполняются на обработке апдейтов и в фоновых задачах."""
+    user = 42
+    now = int(time.time())
+    await db.ensure_user(user, "alice")
+    await db.add_task(user, "купить молоко", "other", "", due_at=now - 10)
+    await db.add_tasks(user, "development", [(f"задача {i}", "") for i in range(20)])
+    await db.add_tasks(7, "testing", [("чужая задача", "")])
+
+    page = await db.list_tasks(user, 10)
+    cursor = (page[-1][5], page[-1][0])
+    await db.list_tasks(user, 10, before=cursor)
+    await db.list_tasks(user, 10, after=cursor)
+    await db.list_tasks(user, 10, status="open")
+    await db.list_tasks(user, 10, category="development")
+    await db.list_tasks(user, 10, before=cursor, status="done")
+    await db.list_tasks(user, 10, after=cursor, category="other")
+
+    await db.stats_by_category(user)
+    await db.stats_by_category_status(user)
+    await db.daily_stats(user, now // 86400 - 56)
+    await db.find_exact_task(user, "Купить молоко")
+    await db.count_tasks(user)
+    await db.search_tasks(user, "зад")
+    await db.search_tasks(user, "за")
+    await db.search_tasks(user, "зад", scan_max=0)
+
+    ids = sorted(await db.get_task_ids(user))
+    await db.get_tasks_updated_since(user, now - 60)
+    await db.get_tasks_by_ids(user, ids[:5])
+    async for _ in db.iter_tasks_for_user(user, 5):
+        pass
+    await db.close_task(ids[0], user)
+    await db.delete_task(ids[1], user)
+    await db.close_tasks(user, ids=ids[2:5])
+    await db.close_tasks(user, category="development")
+    await db.delete_tasks(user, ids=ids[5:7])
+    await db.delete_tasks(user, status="done")
+
+    await db.next_reminder_at()
+    reminded = await db.claim_due_reminders(now, 100)
+    await db.release_reminders([row[0] for row in reminded])
+
+    await db.save_sheet_sync(user, "alice", "%d.%m.%Y", now, {ids[8]: 2}, removed={ids[9]})
+    await db.get_sheet_sync(user)
+
+    await db.set_user_setting(user, "page_size", 5)
+    await db.get_user_setting(user, "page_size")
+
+    await db.enqueue_export(user, "alice")
+    await db.enqueue_export(user, "alice")
+    job = await db.claim_export_job("w", 60)
+    await db.renew_export_lease(job[0], "w", 60)
+    await db.retry_export_job(job[0], "w", 0, "quota")
+    job = await db.claim_export_job("w", 60)
+    await db.finish_export_job(job[0], "w")
+    await db.requeue_expired_exports()
+
+    await db.save_fsm_states([(user, user, "s", None, None, now)], [])
+    await db.get_fsm_state(user, user)
+    await db.save_fsm_states([], [(user, user)])
+    await db.expire_fsm_states(now - 3600)
+
+
+def collect_statements(path) -> list[str]:
+    async def scenario():
+        statements = []
+        async with open_db(path) as db:
+            for conn in [db.conn, *db._read_conns]:
+                await conn.set_trace_callback(statements.append)
+            await exercise(db)
+        return statements
+
+    return asyncio.run(scenario())
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    path = tmp_path / "tasks.db"
+    statements = list(dict.fromkeys(s for s in collect_statements(path) if not SKIP.match(s)))
+    assert len(statements) > 30
+
+    conn = sqlite3.connect(path)
+    problems = []
+    try:
+        for sql in statements:
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            for step in plan:
+                if step.startswith("SCAN ") and not ALLOWED_SCANS.match(step):
+                    problems.append((sql, step))
+                if "TEMP B-TREE" in step and not any(m in sql for m in TEMP_BTREE_ALLOWED):
+                    problems.append((sql, step))
+    finally:
+        conn.close()
+    assert not problems, "\n".join(f"{step}: {sql}" for sql, step in problems)
+
+
+def test_id_lists_are_not_bound_by_parameter_limit(tmp_path):
+    """Списки id передаются одним параметром через json_each: лимит числа параметров SQLite не мешает."""
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            for conn in [db.conn, *db._read_conns]:
+                # sqlite3-соединение aiosqlite живёт в своём потоке — лимит ставится там же
+                await conn._execute(conn._conn.setlimit, sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 10)
+            await db.add_tasks(1, "development", [(f"задача {i}", "") for i in range(30)])
+            await db.add_tasks(2, "testing", [("чужая задача", "")])
+            ids = sorted(await db.get_task_ids(1) | await db.get_task_ids(2))
+            fetched = await db.get_tasks_by_ids(1, ids + list(range(10**6, 10**6 + 100)))
+            closed = await db.close_tasks(1, ids=ids)
+            deleted = await db.delete_tasks(1, ids=ids[:10])
+            return len(fetched), closed, deleted, len(await db.get_task_ids(2))
+
+    assert asyncio.run(scenario()) == (30, 30, 10, 1)
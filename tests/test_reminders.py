@@ -0,0 +1,215 @@
+"""
+Напоминания о сроках: разбор срока без года (29.02 — ближайший високосный год) и отказ от сроков
+дальше MAX_DUE_YEARS, разбиение длинных списков на сообщения в пределах лимита Telegram, возврат
+в очередь напоминаний, которые не удалось отправить, и выход из диалога добавления кнопкой меню
+на шаге срока.
+"""
+import asyncio
+import datetime
+
+import pytest
+from aiogram.utils.exceptions import BotBlocked, NetworkError
+
+from helpers import feed, message_update, open_db, running
+from reminders import REMINDER_HEADER, ReminderScheduler, parse_due, reminder_messages
+from sender import MAX_MESSAGE_LENGTH
+
+USER = 42
+NOW = datetime.datetime(2026, 10, 17, 12, 0, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def utc(*args) -> int:
+    return int(datetime.datetime(*args, tzinfo=datetime.timezone.utc).timestamp())
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("29.02", utc(2028, 2, 29, 9)),
+    ("29.02 18:30", utc(2028, 2, 29, 18, 30)),
+    ("17.10 13:00", utc(2026, 10, 17, 13)),
+    ("17.10 11:00", utc(2027, 10, 17, 11)),  # сегодня уже прошло — следующий год
+    ("01.01", utc(2027, 1, 1, 9)),
+    ("29.02.2028", utc(2028, 2, 29, 9)),
+    ("20.10.2026 08:15", utc(2026, 10, 20, 8, 15)),
+    ("+2ч", int(NOW) + 7200),
+    ("31.04", None),
+    ("29.02.2027", None),
+    ("завтра", None),
+    ("+9999999д", None),  # за datetime.max
+    ("+3660д", int(NOW) + 3660 * 86400),
+    ("+3700д", None),  # дальше MAX_DUE_YEARS
+    ("01.01.2037", None),
+])
+def test_parse_due(text, expected):
+    assert parse_due(text, NOW) == expected
+
+
+def test_long_reminder_list_is_split_under_telegram_limit():
+    rows = [(i, "Очень длинное название задачи " * 5, utc(2026, 10, 17)) for i in range(300)]
+    rows.append((300, "x" * 5000, utc(2026, 10, 17)))
+
+    messages = reminder_messages(rows)
+
+    assert len(messages) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH and text.startswith(REMINDER_HEADER) for text, _ in messages)
+    assert [task_id for _, ids in messages for task_id in ids] == list(range(301))
+
+
+async def add_due_tasks(db, count: int, title: str = "Задача", due_at: int = utc(2026, 10, 17, 11)):
+    for i in range(count):
+        await db.add_task(USER, f"{title} {i}", "development", "", due_at)
+
+
+def scheduler(db, send, **kwargs):
+    return ReminderScheduler(db, send, clock=lambda: NOW, **kwargs)
+
+
+def test_failed_send_returns_reminders_to_queue(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await add_due_tasks(db, 3)
+            sent = []
+
+            async def send(user_id, text):
+                if not sent:
+                    sent.append(None)
+                    raise NetworkError("connection reset")
+                sent.append(text)
+
+            reminders = scheduler(db, send)
+            first = await reminders.fire_due()
+            pending = await db.next_reminder_at()
+            second = await reminders.fire_due()
+            return first, pending, second, sent, await db.next_reminder_at()
+
+    first, pending, second, sent, left = asyncio.run(scenario())
+    assert (first, second) == (3, 3)
+    assert pending == utc(2026, 10, 17, 11)  # после ошибки напоминания снова в очереди
+    assert len(sent) == 2 and sent[1].count("#") == 3
+    assert left is None
+
+
+def test_only_unsent_chunks_are_returned(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await add_due_tasks(db, 60, title="Длинное название задачи " * 4)
+            delivered = []
+
+            async def send(user_id, text):
+                if delivered:
+                    raise NetworkError("timeout")
+                delivered.append(text)
+
+            await scheduler(db, send).fire_due()
+            released = await db.claim_due_reminders(int(NOW), 1000)
+            return delivered, released
+
+    delivered, released = asyncio.run(scenario())
+    assert delivered
+    assert 0 < len(released) < 60
+    assert len(released) + delivered[0].count("\n") == 60
+
+
+def test_permanent_error_is_not_retried(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await add_due_tasks(db, 2)
+
+            async def send(user_id, text):
+                raise BotBlocked("Forbidden: bot was blocked by the user")
+
+            reminders = scheduler(db, send, is_retryable=lambda e: not isinstance(e, BotBlocked))
+            await reminders.fire_due()
+            return await db.next_reminder_at()
+
+    assert asyncio.run(scenario()) is None
+
+
+def test_menu_button_leaves_due_step(app):
+    async def scenario():
+        async with running(app):
+            await app.storage.set_state(chat=USER, user=USER, state=app.AddTaskStates.waiting_for_due.state)
+            await app.storage.set_data(chat=USER, user=USER, data={"title": "Черновик", "category": "testing"})
+            await feed(app, message_update(1, USER, "📋 Мои задачи"))
+            return await app.storage.get_state(chat=USER, user=USER), await app.db.get_all_tasks_for_user(USER)
+
+    state, tasks = asyncio.run(scenario())
+
+    assert state is None
+    assert tasks == []
+    assert app.sent[-1][1] == "У вас пока нет задач."
+
+
+def test_due_beyond_horizon_is_rejected_without_adding_task(app):
+    async def scenario():
+        async with running(app):
+            await app.storage.set_state(chat=USER, user=USER, state=app.AddTaskStates.waiting_for_due.state)
+            await app.storage.set_data(chat=USER, user=USER, data={"title": "Черновик", "category": "testing"})
+            await feed(app, message_update(1, USER, "+9999999д"))
+            return await app.storage.get_state(chat=USER, user=USER), await app.db.get_all_tasks_for_user(USER)
+
+    state, tasks = asyncio.run(scenario())
+
+    assert state == app.AddTaskStates.waiting_for_due.state  # можно ввести срок ещё раз
+    assert tasks == []
+    assert app.sent[-1][1].startswith("Не удалось разобрать срок.")
+
+
+class FakeTime:
+    """Часы и сон планировщика: сон сразу переводит часы вперёд, после stop_after снов цикл останавливается."""
+
+    def __init__(self, stop_after: int):
+        self.now = NOW
+        self.sleeps = []
+        self.stop_after = stop_after
+
+    def clock(self) -> float:
+        return self.now
+
+    async def sleep(self, event, timeout):
+        self.sleeps.append(timeout)
+        if len(self.sleeps) >= self.stop_after:
+            raise asyncio.CancelledError
+        self.now += timeout
+
+
+def test_scheduler_waits_retry_delay_after_failure(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await add_due_tasks(db, 1)
+            fake = FakeTime(stop_after=4)
+            attempts = []
+
+            async def send(user_id, text):
+                attempts.append(fake.now)
+                raise NetworkError("connection reset")
+
+            # без паузы возвращённое напоминание забиралось бы снова на каждом круге цикла
+            reminders = ReminderScheduler(db, send, max_sleep=600, retry_delay=60, clock=fake.clock, sleep=fake.sleep)
+            with pytest.raises(asyncio.CancelledError):
+                await reminders._run()
+            return attempts, fake.sleeps, await db.next_reminder_at()
+
+    attempts, sleeps, pending = asyncio.run(scenario())
+    assert attempts == [NOW, NOW + 60, NOW + 120, NOW + 180]
+    assert sleeps == [60, 60, 60, 60]
+    assert pending == utc(2026, 10, 17, 11)
+
+
+def test_scheduler_sleeps_until_next_due(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await add_due_tasks(db, 1, due_at=int(NOW) + 90)
+            fake = FakeTime(stop_after=3)
+            sent = []
+
+            async def send(user_id, text):
+                sent.append((fake.now, text))
+
+            reminders = ReminderScheduler(db, send, max_sleep=60, clock=fake.clock, sleep=fake.sleep)
+            with pytest.raises(asyncio.CancelledError):
+                await reminders._run()
+            return sent, fake.sleeps
+
+    sent, sleeps = asyncio.run(scenario())
+    assert sleeps == [60, 30, 60]  # сон не дольше max_sleep, затем ровно до срока; очередь пуста — max_sleep
+    assert [at for at, _ in sent] == [NOW + 90]
@@ -0,0 +1,103 @@
+"""
+Маршрутизация по таблицам MENU_ROUTES и CALLBACK_ROUTES: каждая кнопка меню и каждый префикс
+callback_data попадают в свой обработчик, неизвестные — в ответ по умолчанию.
+"""
+import asyncio
+
+import pytest
+
+from helpers import callback_update, feed, message_update, running
+
+USER = 7
+
+# тексты кнопок меню, включая кнопки со старых клавиатур и админки
+MENU = [
+    "➕ Добавить задачу", "📋 Мои задачи", "📊 Статистика", "🔍 Поиск", "📤 Экспорт",
+    "📤 Экспорт в Google Sheets", "⚙️ Настройки", "⚙️ Админка", "Отключить экспорт", "Включить экспорт",
+    "Включить профилирование", "Выключить профилирование", "⬅️ Назад",
+]
+
+# callback_data, как их строят клавиатуры бота, -> ключ CALLBACK_ROUTES
+CALLBACKS = [
+    ("list:n:open:-:5:1700000000", "list"),
+    ("list:p:all:development:5:1700000000", "list"),
+    ("close_5:open:-:0:0", "close"),
+    ("delete_5:open:-:0:0", "delete"),
+    ("uset:page_size:10", "uset"),
+    ("pick_5:open:-:0:0", "pick"),
+    ("bulk:select:open:-:0:0", "bulk"),
+    ("bulk:purge_ok:open:-:0:0", "bulk"),
+]
+
+
+def record_calls(monkeypatch, routes: dict, key: str) -> list:
+    calls = []
+
+    async def handler(obj):
+        calls.append(obj)
+
+    monkeypatch.setitem(routes, key, handler)
+    return calls
+
+
+def run(app, *updates):
+    async def scenario():
+        async with running(app):
+            await feed(app, *updates)
+
+    asyncio.run(scenario())
+
+
+def test_tables_cover_every_route(app):
+    assert set(MENU) == set(app.MENU_ROUTES)
+    assert {key for _, key in CALLBACKS} == set(app.CALLBACK_ROUTES)
+
+
+@pytest.mark.parametrize("text", MENU)
+def test_menu_button_reaches_its_handler(app, monkeypatch, text):
+    calls = record_calls(monkeypatch, app.MENU_ROUTES, text)
+
+    run(app, message_update(1, USER, text))
+
+    assert [m.text for m in calls] == [text]
+    assert app.sent == []
+
+
+def test_unknown_text_gets_menu_hint(app):
+    run(app, message_update(1, USER, "привет"))
+
+    assert [text for _, text, _ in app.sent] == ["Выберите действие в меню. Для поиска нажмите «🔍 Поиск»."]
+
+
+@pytest.mark.parametrize("data, key", CALLBACKS)
+def test_callback_reaches_its_handler(app, monkeypatch, data, key):
+    calls = record_calls(monkeypatch, app.CALLBACK_ROUTES, key)
+
+    run(app, callback_update(1, USER, data))
+
+    assert [c.data for c in calls] == [data]
+
+
+def test_callback_routes_inside_dialog(app, monkeypatch):
+    """Инлайн-кнопки работают и посреди диалога добавления задачи."""
+    calls = record_calls(monkeypatch, app.CALLBACK_ROUTES, "list")
+
+    run(app, message_update(1, USER, "➕ Добавить задачу"), callback_update(2, USER, "list:n:open:-:5:1"))
+
+    assert [c.data for c in calls] == ["list:n:open:-:5:1"]
+
+
+@pytest.mark.parametrize("data", ["unknown:1", "", "42"])
+def test_unknown_callback_is_only_answered(app, monkeypatch, data):
+    answered = []
+
+    async def answer_callback_query(callback_query_id, *args, **kwargs):
+        answered.append(callback_query_id)
+        return True
+
+    monkeypatch.setattr(app.bot, "answer_callback_query", answer_callback_query)
+
+    run(app, callback_update(1, USER, data))
+
+    assert answered == ["1"]
+    assert app.sent == []
@@ -0,0 +1,101 @@
+import asyncio
+
+from helpers import open_db
+from search import find_similar_titles
+
+
+def search(tmp_path, tasks: dict, user: int, q: str, **kwargs):
+    """tasks — {user_id: [title, ...]}; возвращает заголовки кандидатов search_tasks."""
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            for tg_id, titles in tasks.items():
+                await db.add_tasks(tg_id, "other", [(t, "") for t in titles])
+            return [r[1] for r in await db.search_tasks(user, q, **kwargs)]
+
+    return asyncio.run(scenario())
+
+
+def test_short_query_matches_like_wildcards_literally(tmp_path):
+    tasks = {1: ["100% готово", "1000 строк", "a_b", "axb"]}
+    assert search(tmp_path, tasks, 1, "0%") == ["100% готово"]
+
+
+def test_short_query_escapes_underscore(tmp_path):
+    tasks = {1: ["a_b", "axb", "a\\b"]}
+    assert search(tmp_path, tasks, 1, "a_") == ["a_b"]
+
+
+def test_small_list_returns_all_own_tasks(tmp_path):
+    tasks = {1: ["купить молоко", "починить кран"], 2: ["купить хлеб"]}
+    assert sorted(search(tmp_path, tasks, 1, "купить")) == ["купить молоко", "починить кран"]
+
+
+def test_large_list_uses_trigram_shortlist(tmp_path):
+    tasks = {1: ["купить молоко", "полить цветы", "отчёт за май"], 2: ["купить хлеб"]}
+    found = search(tmp_path, tasks, 1, "купить", scan_max=2)
+    # OR по триграммам: «полить» делит с запросом «ить», но bm25 ставит его ниже
+    assert found == ["купить молоко", "полить цветы"]
+
+
+def test_fuzzy_ranking_finds_typo_in_small_list(tmp_path):
+    tasks = {1: ["подготовить отчёт", "созвон с командой", "обновить зависимости"]}
+
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_tasks(1, "other", [(t, "") for t in tasks[1]])
+            return find_similar_titles("подготовит очёт", await db.search_tasks(1, "подготовит очёт"))
+
+    matches = asyncio.run(scenario())
+    assert matches[0][0][1] == "подготовить отчёт"
+
+
+def test_duplicate_titles_are_ranked_separately():
+    rows = [(1, "отчёт", "", "other", "open", 0), (2, "отчёт", "", "other", "open", 0), (3, "макет", "", "other", "open", 0)]
+    assert [(r[0], s) for r, s in find_similar_titles("отчёт", rows)] == [(1, 100.0), (2, 100.0)]
+
+
+def test_batches_give_same_result_as_one_call(monkeypatch):
+    import search
+
+    rows = [(i, f"задача номер {i}", "", "other", "open", 0) for i in range(250)]
+    expected = find_similar_titles("задача номер 17", rows, limit=10)
+    monkeypatch.setattr(search, "BATCH_SIZE", 7)
+    assert find_similar_titles("задача номер 17", rows, limit=10) == expected
+
+
+def test_search_index_is_cached_until_tasks_change(tmp_path):
+    async def titles(db):
+        return sorted(r[1] for r in await db.search_tasks(1, "задача"))
+
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_tasks(1, "other", [("задача один", ""), ("задача два", "")])
+            first = await db.search_tasks(1, "задача")
+            again = await db.search_tasks(1, "другой запрос")
+            await db.add_task(1, "задача три", "other")
+            added = await titles(db)
+            [task_id] = [r[0] for r in await db.search_tasks(1, "задача") if r[1] == "задача один"]
+            await db.close_task(task_id, 1)
+            closed = [r[4] for r in await db.search_tasks(1, "задача") if r[0] == task_id]
+            await db.delete_task(task_id, 1)
+            deleted = await titles(db)
+            await db.delete_tasks(1)
+            return first, again, added, closed, deleted, await titles(db)
+
+    first, again, added, closed, deleted, emptied = asyncio.run(scenario())
+    assert again is first  # тот же TitleIndex: заголовки не перечитываются и не нормализуются
+    assert first.titles == ["задача один", "задача два"]
+    assert added == ["задача два", "задача один", "задача три"]
+    assert closed == ["done"]
+    assert deleted == ["задача два", "задача три"]
+    assert emptied == []
+
+
+def test_cached_index_respects_scan_max(tmp_path):
+    async def scenario():
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_tasks(1, "other", [("купить молоко", ""), ("полить цветы", ""), ("отчёт", "")])
+            await db.search_tasks(1, "купить")
+            return [r[1] for r in await db.search_tasks(1, "купить", scan_max=2)]
+
+    assert asyncio.run(scenario()) == ["купить молоко", "полить цветы"]
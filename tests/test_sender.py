@@ -0,0 +1,135 @@
+"""SendScheduler на виртуальных часах: лимиты, приоритеты, RetryAfter и склейка — без реального ожидания."""
+import asyncio
+
+import pytest
+import virtual_time
+from aiogram import types
+from aiogram.utils.exceptions import RetryAfter
+
+from sender import BACKGROUND, MAX_MESSAGE_LENGTH, SendScheduler
+
+INLINE = types.InlineKeyboardMarkup()  # с инлайн-кнопками сообщения не склеиваются
+
+
+def run(scenario, fail=None, **limits):
+    """
+    Прогоняет scenario(scheduler) на виртуальных часах. Возвращает [(время, chat_id, text)] отправок;
+    fail(chat_id, text, attempt) может вернуть исключение для этой попытки.
+    """
+    async def main():
+        loop = asyncio.get_running_loop()
+        sent, attempts = [], {}
+
+        async def send(chat_id, text, **kwargs):
+            attempts[text] = attempts.get(text, 0) + 1
+            error = fail and fail(chat_id, text, attempts[text])
+            if error:
+                raise error
+            sent.append((round(loop.time(), 6), chat_id, text))
+            return text
+
+        scheduler = SendScheduler(send, clock=loop.time, **limits)
+        await scenario(scheduler)
+        await scheduler.stop(0)
+        return sent
+
+    return virtual_time.run(main())
+
+
+def test_global_rate_is_smooth_with_small_burst():
+    async def scenario(scheduler):
+        await asyncio.gather(*(scheduler.submit(chat, f"m{chat}") for chat in range(60)))
+
+    times = [t for t, _, _ in run(scenario, global_rate=30, global_burst=1)]
+    assert len(times) == 60
+    assert times[0] == 0
+    # не больше одного сообщения на 1/30 с: без пачки из 30 штук в первый момент
+    assert min(b - a for a, b in zip(times, times[1:])) == pytest.approx(1 / 30, abs=1e-5)
+    assert times[-1] == pytest.approx(59 / 30, abs=1e-5)
+
+
+def test_global_burst_allows_a_few_at_once():
+    async def scenario(scheduler):
+        await asyncio.gather(*(scheduler.submit(chat, f"m{chat}") for chat in range(10)))
+
+    times = [t for t, _, _ in run(scenario, global_rate=30, global_burst=3)]
+    assert times[:3] == [0, 0, 0]
+    assert times[3] == pytest.approx(1 / 30, abs=1e-5)
+
+
+def test_chat_rate_and_order_within_chat():
+    async def scenario(scheduler):
+        await asyncio.gather(*(scheduler.submit(1, f"m{i}", reply_markup=INLINE) for i in range(6)))
+
+    sent = run(scenario, global_rate=30, chat_rate=1, chat_burst=3)
+    assert [text for _, _, text in sent] == [f"m{i}" for i in range(6)]
+    assert [t for t, _, _ in sent] == pytest.approx([0, 1 / 30, 2 / 30, 1, 2, 3], abs=1e-5)
+
+
+def test_many_waiting_chats_do_not_block_ready_ones():
+    """Тысяча чатов, ждущих свой лимит, не задерживает чат, у которого токен есть."""
+    async def scenario(scheduler):
+        pending = [
+            asyncio.ensure_future(scheduler.submit(chat, text, reply_markup=INLINE))
+            for chat in range(1000) for text in ("a", "b")
+        ]
+        await asyncio.sleep(0.5)  # все «a» ушли, все «b» ждут токена своего чата до t=1
+        await scheduler.submit(5000, "fresh")
+        await asyncio.gather(*pending)
+
+    sent = run(scenario, global_rate=1_000_000, global_burst=1, chat_rate=1, chat_burst=1)
+    assert len(sent) == 2001
+    fresh = next(t for t, chat, _ in sent if chat == 5000)
+    assert fresh == pytest.approx(0.5)
+    assert min(t for t, _, text in sent if text == "b") >= 1.0 - 1e-5
+
+
+def test_interactive_goes_before_background():
+    async def scenario(scheduler):
+        await asyncio.gather(
+            *(scheduler.submit(chat, f"bg{chat}", priority=BACKGROUND) for chat in range(1, 5)),
+            scheduler.submit(10, "reply"),
+        )
+
+    sent = run(scenario, global_rate=30, global_burst=1)
+    assert [text for _, _, text in sent] == ["reply", "bg1", "bg2", "bg3", "bg4"]
+
+
+def test_retry_after_pauses_the_chat_and_resends():
+    def fail(chat_id, text, attempt):
+        if text == "x" and attempt == 1:
+            return RetryAfter(5)
+
+    async def scenario(scheduler):
+        await asyncio.gather(scheduler.submit(1, "x"), scheduler.submit(2, "y"))
+
+    sent = run(scenario, fail=fail, global_rate=30, global_burst=1)
+    assert [(chat, text) for _, chat, text in sent] == [(2, "y"), (1, "x")]
+    assert sent[-1][0] == pytest.approx(5, abs=0.1)
+
+
+def test_error_is_raised_to_the_caller():
+    def fail(chat_id, text, attempt):
+        return ValueError("bad request")
+
+    async def scenario(scheduler):
+        with pytest.raises(ValueError):
+            await scheduler.submit(1, "x")
+
+    assert run(scenario, fail=fail) == []
+
+
+def test_consecutive_texts_are_merged_up_to_the_limit():
+    async def scenario(scheduler):
+        results = await asyncio.gather(
+            scheduler.submit(1, "first"),
+            scheduler.submit(1, "second"),
+            scheduler.submit(1, "third"),
+            scheduler.submit(1, "y" * (MAX_MESSAGE_LENGTH - 5)),
+        )
+        # все, чьи тексты ушли одним сообщением, получают одно и то же сообщение
+        assert results[0] == results[1] == results[2] != results[3]
+
+    sent = run(scenario, chat_rate=1, chat_burst=1)
+    # короткие склеиваются, длинное в то же сообщение не влезает и уходит следующим
+    assert [text for _, _, text in sent] == ["first\n\nsecond\n\nthird", "y" * (MAX_MESSAGE_LENGTH - 5)]
@@ -0,0 +1,151 @@
+"""
+Инкрементальная синхронизация вкладки против полной перезаписи на заглушке gspread:
+вставка, изменение, удаление, продолжение с watermark и число записанных ячеек; сообщение
+со ссылкой на таблицу после экспорта.
+"""
+import asyncio
+import time
+
+import pytest
+from fake_gspread import FakeClient
+
+from google_sheets import HEADER, plan_incremental_sync
+from helpers import open_db, running
+from sheet_sync import sync_user_sheet
+
+USER = 7
+DATE_FORMAT = "%d.%m.%Y"
+
+
+@pytest.mark.parametrize("row_map, current, changed, expected_map, expected_writes, total", [
+    # вставка: новые задачи дописываются в конец
+    ({1: 2, 2: 3}, {1, 2, 3}, {3}, {1: 2, 2: 3, 3: 4}, {4: 3}, 4),
+    # изменение: перезаписывается только строка задачи
+    ({1: 2, 2: 3}, {1, 2}, {1}, {1: 2, 2: 3}, {2: 1}, 3),
+    # удаление из середины: последняя строка переезжает в дыру
+    ({1: 2, 2: 3, 3: 4}, {1, 3}, set(), {1: 2, 3: 3}, {3: 3}, 3),
+    # удаление последней строки: писать нечего, только уменьшить лист
+    ({1: 2, 2: 3}, {1}, set(), {1: 2}, {}, 2),
+    # изменённая и удалённая одновременно — не пишется
+    ({1: 2, 2: 3}, {1}, {2}, {1: 2}, {}, 2),
+])
+def test_plan_incremental_sync(row_map, current, changed, expected_map, expected_writes, total):
+    assert plan_incremental_sync(row_map, current, changed) == (expected_map, expected_writes, total)
+
+
+class Clock:
+    """time.time, который двигается только вручную: watermark и updated_at становятся предсказуемыми."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds: float = 10):
+        self.now += seconds
+
+
+async def run_blocking(func, *args):
+    return func(*args)
+
+
+async def sync(db, client: FakeClient, incremental: bool = True) -> int:
+    """Синхронизирует вкладку и возвращает число записанных ячеек."""
+    client.reset_counters()
+    with client.installed():
+        await sync_user_sheet(
+            db, run_blocking, "sa.json", "sheet", USER, "alice", 1000, DATE_FORMAT, incremental=incremental,
+        )
+    return client.cells_written
+
+
+def sheet_rows(client: FakeClient) -> tuple[list, list]:
+    """(заголовок, строки задач по порядку id) вкладки; порядок строк после удалений не важен."""
+    header, *rows = client.spreadsheet.worksheets["alice"].get_all_values()
+    return header, sorted(rows, key=lambda r: int(r[0]))
+
+
+def test_incremental_sync_matches_full_rewrite(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+
+    async def scenario():
+        incremental, full = FakeClient(), FakeClient()
+        cells = {}
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_tasks(USER, "development", [(f"задача {i}", f"описание {i}") for i in range(20)])
+            # изменения в ту же секунду, что и watermark, уходят и в следующую синхронизацию (updated_at >= watermark)
+            clock.tick()
+            cells["first"] = await sync(db, incremental)
+            ids = sorted(await db.get_task_ids(USER))
+
+            clock.tick()
+            await db.add_task(USER, "новая", "testing")
+            await db.close_task(ids[3], USER)
+            await db.delete_task(ids[5], USER)
+            clock.tick()
+            cells["incremental"] = await sync(db, incremental)
+            cells["full"] = await sync(db, full, incremental=False)
+            assert sheet_rows(incremental) == sheet_rows(full)
+
+            # следующая синхронизация продолжает с watermark: без изменений ничего не пишется
+            clock.tick()
+            cells["idle"] = await sync(db, incremental)
+
+            # изменение после watermark — переписывается одна строка
+            clock.tick()
+            await db.close_task(ids[0], USER)
+            clock.tick()
+            cells["resume"] = await sync(db, incremental)
+            await sync(db, full, incremental=False)
+            assert sheet_rows(incremental) == sheet_rows(full)
+        return cells
+
+    cells = asyncio.run(scenario())
+    row = len(HEADER)
+    assert cells["first"] == 21 * row
+    # новая задача, закрытая и строка, переехавшая на место удалённой
+    assert cells["incremental"] == 3 * row
+    assert cells["full"] == 21 * row
+    assert cells["idle"] == 0
+    assert cells["resume"] == row
+
+
+def test_missing_tab_falls_back_to_full_rewrite(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, "time", clock)
+
+    async def scenario():
+        client = FakeClient()
+        async with open_db(tmp_path / "tasks.db") as db:
+            await db.add_tasks(USER, "other", [("a", ""), ("b", "")])
+            await sync(db, client)
+            # вкладку удалили руками в таблице
+            del client.spreadsheet.worksheets["alice"]
+            clock.tick()
+            await db.add_task(USER, "c", "other")
+            clock.tick()
+            cells = await sync(db, client)
+            return cells, sheet_rows(client)
+
+    cells, (header, rows) = asyncio.run(scenario())
+    assert cells == 4 * len(HEADER)
+    assert header == HEADER
+    assert [r[1] for r in rows] == ["a", "b", "c"]
+
+
+def test_export_worker_sends_sheet_link(app, monkeypatch):
+    monkeypatch.setattr(app, "EXPORT_BACKEND", "sheets")
+    monkeypatch.setattr(app, "SHEET_ID", "sheet")
+    client = FakeClient()
+
+    async def scenario():
+        async with running(app):
+            await app.db.add_task(USER, "Задача", "testing")
+            with client.installed():
+                await app.export_worker(USER, "alice")
+
+    asyncio.run(scenario())
+
+    assert app.sent[-1][1] == "✅ Экспорт завершён. Открыть таблицу: https://docs.google.com/spreadsheets/d/sheet/edit\nВкладка: alice"
@@ -0,0 +1,49 @@
+"""
+/start под нагрузкой: 10k сообщений от 1000 пользователей. База открывается один раз при старте,
+а повторный /start известного пользователя не пишет в базу (кэш known_users).
+"""
+import asyncio
+import re
+
+import aiosqlite
+
+from helpers import message_update, running
+
+USERS = 1000
+MESSAGES = 10_000
+
+
+def test_start_reuses_connections_and_skips_known_users(app, monkeypatch):
+    connects = []
+    real_connect = aiosqlite.connect
+
+    def counting_connect(*args, **kwargs):
+        connects.append(args[0])
+        return real_connect(*args, **kwargs)
+
+    monkeypatch.setattr(aiosqlite, "connect", counting_connect)
+
+    async def scenario():
+        statements = []
+        async with running(app):
+            opened_at_init = len(connects)
+            for conn in [app.db.conn, *app.db._read_conns]:
+                await conn.set_trace_callback(statements.append)
+            await asyncio.gather(*(
+                app.dp.process_update(message_update(i, i % USERS + 1, "/start"))
+                for i in range(MESSAGES)
+            ))
+        return opened_at_init, statements
+
+    opened_at_init, statements = asyncio.run(scenario())
+
+    assert len(app.sent) == MESSAGES
+    assert len(connects) == opened_at_init == 1 + app.db.readers
+    # на пользователя — одна запись в users и одно чтение состояния FSM, сколько бы /start он ни прислал
+    writes = [s for s in statements if re.match(r"\s*INSERT INTO users", s)]
+    fsm_reads = [s for s in statements if re.match(r"\s*SELECT .* FROM fsm_states", s)]
+    assert len(writes) == USERS
+    assert len(fsm_reads) == USERS
+    # остальное — только служебные BEGIN / COMMIT group commit
+    other = [s for s in statements if s not in writes and s not in fsm_reads and not re.match(r"\s*(BEGIN|COMMIT)", s)]
+    assert other == []
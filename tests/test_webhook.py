@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from helpers import message_update, running
+from webhook import SECRET_HEADER, BotWebhookHandler
+from workers import webhook_front_app, worker_env
+
+SECRET = "s3cret"
+HEADERS = [
+    ({}, 401),
+    ({SECRET_HEADER: "wrong"}, 401),
+    ({SECRET_HEADER: "секрет"}, 401),  # не-ASCII заголовок — отказ, а не TypeError из compare_digest
+    ({SECRET_HEADER: SECRET}, 200),
+]
+
+
+class StubRouter:
+    def __init__(self):
+        self.dispatched = []
+
+    def dispatch(self, update: dict):
+        self.dispatched.append(update)
+
+    def check(self):
+        pass
+
+
+async def post_all(app: web.Application, body: dict) -> list[int]:
+    async with TestClient(TestServer(app)) as client:
+        statuses = []
+        for headers, _ in HEADERS:
+            response = await client.post("/webhook", json=body, headers=headers)
+            statuses.append(response.status)
+        return statuses
+
+
+def test_front_checks_secret():
+    router = StubRouter()
+    statuses = asyncio.run(post_all(webhook_front_app(router, "/webhook", SECRET), {"update_id": 1}))
+    assert statuses == [status for _, status in HEADERS]
+    assert router.dispatched == [{"update_id": 1}]
+
+
+def test_front_refuses_to_start_without_secret():
+    with pytest.raises(ValueError):
+        webhook_front_app(StubRouter(), "/webhook", "")
+
+
+@pytest.mark.parametrize("secret, expected", [(SECRET, [s for _, s in HEADERS]), ("", [401] * len(HEADERS))])
+def test_bot_webhook_handler_checks_secret(app, monkeypatch, secret, expected):
+    monkeypatch.setattr(BotWebhookHandler, "secret_token", secret)
+
+    async def scenario():
+        async with running(app):
+            web_app = web.Application()
+            web_app["BOT_DISPATCHER"] = app.dp
+            web_app.router.add_route("*", "/webhook", BotWebhookHandler)
+            return await post_all(web_app, message_update(1, 5, "/start").to_python())
+
+    assert asyncio.run(scenario()) == expected
+    assert len(app.sent) == expected.count(200)
+
+
+@pytest.mark.parametrize("burst, workers, expected", [("1", 4, "1.0"), ("8", 4, "2.0"), ("30", 8, "3.75")])
+def test_worker_env_splits_global_rate_and_burst(monkeypatch, burst, workers, expected):
+    monkeypatch.setenv("METRICS_PORT", "9090")
+    monkeypatch.setenv("TG_GLOBAL_RATE", "30")
+    monkeypatch.setenv("TG_GLOBAL_BURST", burst)
+
+    env = worker_env(2, workers)
+
+    assert env == {"METRICS_PORT": "9093", "TG_GLOBAL_RATE": str(30 / workers), "TG_GLOBAL_BURST": expected}